@@ -0,0 +1,72 @@
+# bench/__main__.py
+"""
+Run the benchmark suite (from the provider-validator directory):
+
+    python -m bench                              # all, results → bench/results/<timestamp>.json
+    python -m bench -k fuzzy -k db.              # only names containing these
+    python -m bench --save-baseline              # also write bench/baseline.json
+    python -m bench --baseline bench/baseline.json --threshold 0.15
+
+With a baseline the run exits 1 if any median regressed by more than
+--threshold, so it can gate CI.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+# Isolate the run before src is imported: scratch DB, no SMTP/DNS checks,
+# in-process progress bus, no span export.
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="pv-bench-"), "bench.db"))
+os.environ.setdefault("OUTREACH_CHECK_DELIVERABILITY", "0")
+os.environ.setdefault("PROGRESS_BACKEND", "memory")
+os.environ.setdefault("IDEMPOTENCY_BACKEND", "memory")
+os.environ.setdefault("TRACING_EXPORTER", "none")
+os.environ.setdefault("FROM_EMAIL", "bench@example.com")
+os.environ.setdefault("SENDGRID_API_KEY", "SG.bench")
+
+from bench import runner  # noqa: E402
+import bench.benchmarks  # noqa: E402,F401  (registers the benchmarks)
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m bench", description="Validation pipeline benchmarks")
+    parser.add_argument("-k", dest="names", action="append", help="only run benchmarks whose name contains this")
+    parser.add_argument("--output", help="results file (default bench/results/<timestamp>.json)")
+    parser.add_argument("--baseline", help="compare against this results file")
+    parser.add_argument("--save-baseline", action="store_true", help=f"also write {DEFAULT_BASELINE}")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown before failing (0.10 = 10%%)")
+    parser.add_argument("--list", action="store_true", help="list benchmarks and exit")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for name, b in runner.REGISTRY.items():
+            print(f"{b.group:6} {name}")
+        return 0
+
+    results = runner.run_all(args.names)
+    output = args.output or os.path.join(BENCH_DIR, "results", datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    runner.save(results, output)
+    print(f"[bench] results written to {output}")
+    if args.save_baseline:
+        runner.save(results, DEFAULT_BASELINE)
+        print(f"[bench] baseline written to {DEFAULT_BASELINE}")
+
+    if args.baseline:
+        rows = runner.compare(results, runner.load(args.baseline), args.threshold)
+        print(runner.format_comparison(rows))
+        regressions = [r["name"] for r in rows if r["status"] == "regression"]
+        if regressions:
+            print(f"[bench] ❌ {len(regressions)} regression(s) over {args.threshold:.0%}: {', '.join(regressions)}")
+            return 1
+        print("[bench] ✅ no regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
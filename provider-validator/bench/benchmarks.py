@@ -0,0 +1,260 @@
+# bench/benchmarks.py
+"""
+Benchmarks for the validation pipeline hot paths.
+
+Import this only through `python -m bench`. __main__ points DATABASE_URL at
+a scratch SQLite file and turns off network-dependent behaviour before
+anything from src is imported.
+"""
+
+import asyncio
+import contextlib
+import csv
+import os
+import random
+import tempfile
+import uuid
+
+from bench.runner import benchmark
+
+SEED = 1234
+E2E_ROWS = int(os.getenv("BENCH_E2E_ROWS", "300"))
+
+_FIRST = ["John", "Maria", "Wei", "Aisha", "Carlos", "Priya", "Olga", "Kwame", "Sara", "Hiro"]
+_LAST = ["Smith", "Garcia", "Chen", "Khan", "Rossi", "Patel", "Ivanova", "Mensah", "Cohen", "Sato"]
+_STREETS = ["Main St", "Oak Ave", "Elm Rd", "2nd St", "Park Blvd", "Lake Dr"]
+_SPECIALTIES = ["Cardiology", "Family Medicine", "Dermatology", "Orthopedics"]
+
+
+def _name(rng):
+    return f"Dr {rng.choice(_FIRST)} {rng.choice(_LAST)}"
+
+
+def _address(rng):
+    return f"{rng.randint(1, 9999)} {rng.choice(_STREETS)}, Springfield, IL {rng.randint(60000, 62999)}"
+
+
+def _phone(rng):
+    return f"({rng.randint(201, 989)}) {rng.randint(200, 999)}-{rng.randint(0, 9999):04d}"
+
+
+def _perturb(rng, s):
+    i = rng.randrange(len(s))
+    return s[:i] + s[i + 1:] if rng.random() < 0.5 else s[:i] + rng.choice("aeiou") + s[i:]
+
+
+def provider_rows(n, seed=SEED):
+    rng = random.Random(seed)
+    return [{
+        "id": i, "name": _name(rng), "npi": str(1000000000 + i), "phone": _phone(rng),
+        "address": _address(rng), "email": f"dr{i}@clinic{i % 50}.org", "website": "",
+        "specialty": rng.choice(_SPECIALTIES), "scanned_pdf": "",
+    } for i in range(1, n + 1)]
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# src.utils
+# ─────────────────────────────────────────────────────────────────────────────
+@benchmark("utils.fuzzy_ratio")
+def bench_fuzzy_ratio():
+    from src.utils import fuzzy_ratio
+    rng = random.Random(SEED)
+    pairs = []
+    for _ in range(1000):
+        name = _name(rng)
+        pairs.append((name, _perturb(rng, name) if rng.random() < 0.7 else _name(rng)))
+
+    def run():
+        for a, b in pairs:
+            fuzzy_ratio(a, b)
+    return run, len(pairs)
+
+
+@benchmark("utils.fuzzy_scores")
+def bench_fuzzy_scores():
+    """Same pairs as utils.fuzzy_ratio, scored in one batch call."""
+    from src.utils import fuzzy_scores
+    rng = random.Random(SEED)
+    claimed, observed = [], []
+    for _ in range(1000):
+        name = _name(rng)
+        claimed.append(name)
+        observed.append(_perturb(rng, name) if rng.random() < 0.7 else _name(rng))
+
+    def run():
+        fuzzy_scores(claimed, observed)
+    return run, len(claimed)
+
+
+@benchmark("utils.normalize_phone")
+def bench_normalize_phone():
+    from src.utils import _parse_phone, normalize_phone
+    rng = random.Random(SEED)
+    phones = [_phone(rng) for _ in range(200)] + ["+1 212 555 0101", "555-0000", "n/a", ""] * 10
+
+    def run():
+        _parse_phone.cache_clear()          # cold: comparable with pre-cache baselines
+        for p in phones:
+            normalize_phone(p)
+    return run, len(phones)
+
+
+@benchmark("utils.parse_phones")
+def bench_parse_phones():
+    """A chunk where group practices share numbers (~4 rows per distinct phone), cold cache."""
+    from src.utils import _parse_phone, parse_phones
+    rng = random.Random(SEED)
+    shared = [_phone(rng) for _ in range(250)]
+    phones = [rng.choice(shared) for _ in range(1000)]
+
+    def run():
+        _parse_phone.cache_clear()
+        parse_phones(phones)
+    return run, len(phones)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# src.ocr (field extraction only — no tesseract)
+# ─────────────────────────────────────────────────────────────────────────────
+@benchmark("ocr.extract_provider_fields")
+def bench_extract_provider_fields():
+    from src.ocr import extract_provider_fields
+    rng = random.Random(SEED)
+    texts = [
+        f"Provider Credential Sheet\nName: {_name(rng)[3:]}\nPhone: {_phone(rng)} x{rng.randint(10, 99)}\n"
+        f"Address: {_address(rng)}\nSpecialty: {rng.choice(_SPECIALTIES)}\n" + "Lorem ipsum " * 40
+        for _ in range(200)
+    ]
+
+    def run():
+        for t in texts:
+            extract_provider_fields(t)
+    return run, len(texts)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# src.db
+# ─────────────────────────────────────────────────────────────────────────────
+def _db_rows(n):
+    return [{
+        "source_id": 900000 + r["id"], "name": r["name"], "npi": r["npi"], "phone": r["phone"],
+        "email": r["email"], "address": r["address"], "website": r["website"],
+        "specialty": r["specialty"], "source_json": "{}", "confidence": 0.5,
+        "flags": "[]", "status": "confirmed",
+    } for r in provider_rows(n)]
+
+
+@benchmark("db.insert_provider", rounds=5)
+def bench_insert_provider():
+    from src.db import init_db, insert_provider
+    init_db()
+    rows = _db_rows(100)
+
+    def run():
+        for row in rows:          # upserts after the first round
+            insert_provider(row)
+    return run, len(rows)
+
+
+@benchmark("db.insert_providers_bulk", rounds=5)
+def bench_insert_providers_bulk():
+    from src.db import init_db, insert_providers_bulk
+    init_db()
+    rows = _db_rows(1000)
+
+    def run():
+        insert_providers_bulk(rows)
+    return run, len(rows)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Agents
+# ─────────────────────────────────────────────────────────────────────────────
+@benchmark("agents.QAAgent.run")
+def bench_qa_agent():
+    from src.agents.qa_agent import QAAgent
+    rng = random.Random(SEED)
+    agent = QAAgent()
+    payloads = [{"id": i, "score": rng.random(),
+                 "matches": {"phone_valid": rng.random() < 0.8, "name_score": rng.random()}}
+                for i in range(500)]
+    loop = asyncio.new_event_loop()
+
+    async def many():
+        for p in payloads:
+            await agent.run(p)
+
+    def run():
+        loop.run_until_complete(many())
+    return run, len(payloads)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# src.scoring (columnar re-score vs the per-row agents above)
+# ─────────────────────────────────────────────────────────────────────────────
+@benchmark("scoring.score_and_qa_batch")
+def bench_scoring_batch():
+    from src.scoring import qa_batch, score_batch
+    import numpy as np
+    rng = np.random.default_rng(SEED)
+    n = 100_000
+    name, addr = rng.random(n), rng.random(n)
+    phone = (rng.random(n) < 0.8).astype(np.float64)
+
+    def run():
+        scores = score_batch(name, phone, addr)
+        qa_batch(scores, phone, name)
+    return run, n
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# End to end
+# ─────────────────────────────────────────────────────────────────────────────
+@benchmark("e2e.run_batch", group="e2e", rounds=3, number=1)
+def bench_run_batch():
+    from src.orchestrator import run_batch
+    workdir = tempfile.mkdtemp(prefix="pv-bench-")
+    csv_path = os.path.join(workdir, "providers.csv")
+    rows = provider_rows(E2E_ROWS)
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+    def run():
+        # run_batch prints a line per row; keep the terminal out of the timing
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            asyncio.run(run_batch(csv_path, concurrency=8, job_id=f"bench-{uuid.uuid4().hex[:8]}",
+                                  freshness_hours=0, export_path=os.path.join(workdir, "export.csv")))
+    return run, len(rows)
+
+
+@benchmark("e2e.run_batch_fetch", group="e2e", rounds=3, number=1)
+def bench_run_batch_fetch():
+    """run_batch with every row fetching its website + enrichment from the stand-in farm."""
+    from bench.standin_farm import FarmConfig, FarmThread, ServiceConfig
+    from src.agents import enrichment_agent, validation_agent
+    from src.orchestrator import run_batch
+
+    farm = FarmThread(FarmConfig(
+        site=ServiceConfig(os.getenv("BENCH_SITE_LATENCY", "lognormal:30ms,0.5")),
+        enrich=ServiceConfig(os.getenv("BENCH_ENRICH_LATENCY", "uniform:5ms,20ms")),
+    ))
+    base_url = farm.__enter__()          # daemon thread; lives for the rest of the run
+    validation_agent.WEBSITE_BASE_URL = f"{base_url}/site"
+    enrichment_agent.ENRICHMENT_API_URL = f"{base_url}/enrich"
+
+    workdir = tempfile.mkdtemp(prefix="pv-bench-")
+    csv_path = os.path.join(workdir, "providers.csv")
+    rows = [dict(r, website=f"www.clinic{r['id']}.com") for r in provider_rows(E2E_ROWS)]
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    concurrency = int(os.getenv("BENCH_CONCURRENCY", "32"))
+
+    def run():
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            asyncio.run(run_batch(csv_path, concurrency=concurrency, job_id=f"bench-{uuid.uuid4().hex[:8]}",
+                                  freshness_hours=0, export_path=os.path.join(workdir, "export.csv")))
+    return run, len(rows)
@@ -0,0 +1,322 @@
+# bench/loadtest.py
+"""
+API load test: concurrent virtual users replaying a weighted request mix,
+with throughput and p50/p95/p99 latency per route.
+
+    # spawn a local API on a scratch DB seeded with 20k providers
+    python -m bench.loadtest --spawn --providers 20000 --users 32 --duration 30
+
+    # against an API that is already running (needs a user that can log in)
+    python -m bench.loadtest --base-url http://127.0.0.1:8000 --username admin --password ...
+
+    # compare with an earlier run
+    python -m bench.loadtest --spawn --compare bench/results/loadtest-20240101-120000.json
+
+Every virtual user logs in through /token, then loops: it picks a route by
+weight (--mix), sends the request and records the status and latency.
+Requests made during --warmup are not counted. The report is printed and
+saved as JSON (bench/results/loadtest-<timestamp>.json) together with the
+commit and the settings used.
+
+--spawn runs `uvicorn src.api.app:app` in a subprocess. It gets its own
+SQLite DB, user DB and working directory (so no validated_providers.csv is
+merged in), an admin user, and --providers seeded rows. The RNG is seeded,
+so the request sequence is the same on every run.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from bench.runner import _git_commit, format_time, save
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+DEFAULT_MIX = "providers=25,flags=15,provider=40,token=5,webhook=15"
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Local API
+# ─────────────────────────────────────────────────────────────────────────────
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def seed_environment(workdir: str, providers: int, username: str, password: str) -> Dict[str, str]:
+    """Create a scratch DB + user DB in `workdir`; returns the env the API needs."""
+    env = {
+        "DATABASE_URL":        "sqlite:///" + os.path.join(workdir, "providers.db"),
+        "USER_DB_PATH":        os.path.join(workdir, "users.db"),
+        "PROGRESS_BACKEND":    "memory",
+        "IDEMPOTENCY_BACKEND": "memory",
+        "TRACING_EXPORTER":    "none",
+        "FROM_EMAIL":          os.getenv("FROM_EMAIL", "loadtest@example.com"),
+        "SENDGRID_API_KEY":    os.getenv("SENDGRID_API_KEY", "SG.loadtest"),
+    }
+    # seed in a child so this process never binds src.db to the scratch URL
+    subprocess.run([sys.executable, "-m", "bench.loadtest", "--seed-only", "--providers", str(providers),
+                    "--username", username, "--password", password, "--base-url", "-"],
+                   env={**os.environ, **env}, cwd=REPO_DIR, check=True)
+    return env
+
+
+def _seed_db(providers: int, username: str, password: str):
+    """Runs inside the seeding child, with DATABASE_URL / USER_DB_PATH already set."""
+    from bench.benchmarks import provider_rows
+    from src import auth
+    from src.db import init_db, insert_providers_bulk
+
+    init_db()
+    auth.init_user_db()
+    auth.create_user_db(username, password, "admin")
+    rows = [{
+        "source_id": r["id"], "name": r["name"], "npi": r["npi"], "phone": r["phone"], "email": r["email"],
+        "address": r["address"], "website": r["website"], "specialty": r["specialty"], "source_json": "{}",
+        # 60% land in manual_review with a flag so /providers/flags has work to do
+        "confidence": (r["id"] % 10) / 10,
+        "flags": '["low_confidence"]' if r["id"] % 10 < 6 else "[]",
+        "status": "manual_review" if r["id"] % 10 < 6 else "confirmed",
+    } for r in provider_rows(providers)]
+    for i in range(0, len(rows), 5000):
+        insert_providers_bulk(rows[i:i + 5000])
+
+
+def spawn_api(env: Dict[str, str], workdir: str, workers: int) -> Tuple[subprocess.Popen, str]:
+    port = _free_port()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.api.app:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning", "--no-access-log"],
+        env={**os.environ, **env, "PYTHONPATH": REPO_DIR}, cwd=workdir,
+        stdout=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"API exited with code {proc.returncode}")
+        try:
+            if httpx.get(base_url + "/", timeout=1).status_code == 200:
+                return proc, base_url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("API did not come up within 60s")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Request mix
+# ─────────────────────────────────────────────────────────────────────────────
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in ROUTES:
+            raise ValueError(f"unknown route {name!r} (choose from {', '.join(ROUTES)})")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def _webhook_batch(rng: random.Random, n: int, providers: int) -> List[Dict[str, Any]]:
+    now = int(time.time())
+    return [{
+        "email": f"dr{rng.randint(1, providers)}@clinic{rng.randint(0, 49)}.org",
+        "event": rng.choice(["delivered", "delivered", "open", "click", "bounce"]),
+        "timestamp": now, "sg_event_id": f"lt-{rng.getrandbits(64):x}",
+        "sg_message_id": f"lt{rng.randint(1, 1000)}.filter",
+    } for _ in range(n)]
+
+
+async def _providers(client, rng, ctx):
+    return await client.get("/providers", params={"limit": ctx["page_size"]})
+
+
+async def _flags(client, rng, ctx):
+    return await client.get("/providers/flags", params={"confidence_below": 0.6})
+
+
+async def _provider(client, rng, ctx):
+    return await client.get(f"/providers/{rng.randint(1, ctx['providers'])}")
+
+
+async def _token(client, rng, ctx):
+    return await client.post("/token", data={"username": ctx["username"], "password": ctx["password"]})
+
+
+async def _webhook(client, rng, ctx):
+    return await client.post("/webhooks/sendgrid", json=_webhook_batch(rng, ctx["webhook_batch"], ctx["providers"]))
+
+
+ROUTES = {
+    "providers": ("GET /providers", _providers),
+    "flags":     ("GET /providers/flags", _flags),
+    "provider":  ("GET /providers/{id}", _provider),
+    "token":     ("POST /token", _token),
+    "webhook":   ("POST /webhooks/sendgrid", _webhook),
+}
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Load loop
+# ─────────────────────────────────────────────────────────────────────────────
+async def _user(uid: int, base_url: str, mix: Dict[str, float], ctx: Dict[str, Any],
+                warmup_end: float, end: float, samples: Dict[str, list],
+                errors: Dict[str, int], transport=None):
+    rng = random.Random(ctx["seed"] * 10_007 + uid)
+    names, weights = list(mix), list(mix.values())
+    async with httpx.AsyncClient(base_url=base_url, timeout=ctx["timeout"], transport=transport) as client:
+        login = await _token(client, rng, ctx)
+        if login.status_code == 200:
+            client.headers["Authorization"] = f"Bearer {login.json()['access_token']}"
+        while time.monotonic() < end:
+            route, call = ROUTES[rng.choices(names, weights)[0]]
+            t0 = time.monotonic()
+            try:
+                status = (await call(client, rng, ctx)).status_code
+            except httpx.HTTPError:
+                status = 0
+            t1 = time.monotonic()
+            if t0 >= warmup_end:
+                samples[route].append(t1 - t0)
+                if not 200 <= status < 300:
+                    errors[route] += 1
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(q / 100 * len(sorted_values))          # nearest-rank
+    return sorted_values[max(0, min(len(sorted_values), rank) - 1)]
+
+
+def summarize(samples: Dict[str, list], errors: Dict[str, int], seconds: float) -> Dict[str, Any]:
+    def stats(values, errs):
+        values = sorted(values)
+        return {
+            "requests": len(values), "errors": errs, "rps": len(values) / seconds if seconds else 0.0,
+            "mean": sum(values) / len(values) if values else 0.0,
+            "p50": percentile(values, 50), "p95": percentile(values, 95),
+            "p99": percentile(values, 99), "max": values[-1] if values else 0.0,
+        }
+    routes = {route: stats(v, errors.get(route, 0)) for route, v in sorted(samples.items())}
+    everything = [x for v in samples.values() for x in v]
+    return {"routes": routes, "total": stats(everything, sum(errors.values()))}
+
+
+async def run_load(base_url: str, mix: Dict[str, float], users: int, duration: float, warmup: float,
+                   ctx: Dict[str, Any], transport=None) -> Dict[str, Any]:
+    """`transport` lets tests drive an in-process app (httpx.ASGITransport)."""
+    samples: Dict[str, list] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    started = time.monotonic()
+    warmup_end, end = started + warmup, started + warmup + duration
+    await asyncio.gather(*[_user(i, base_url, mix, ctx, warmup_end, end, samples, errors,
+                                 transport)
+                           for i in range(users)])
+    return summarize(samples, errors, duration)
+
+
+def format_report(summary: Dict[str, Any]) -> str:
+    rows = list(summary["routes"].items()) + [("TOTAL", summary["total"])]
+    width = max(len(r) for r, _ in rows)
+    lines = [f"{'route':<{width}}  {'reqs':>7}  {'err':>5}  {'rps':>8}  {'p50':>9}  {'p95':>9}  {'p99':>9}  {'max':>9}"]
+    for route, s in rows:
+        lines.append(f"{route:<{width}}  {s['requests']:>7}  {s['errors']:>5}  {s['rps']:>8.1f}  "
+                     f"{format_time(s['p50']):>9}  {format_time(s['p95']):>9}  "
+                     f"{format_time(s['p99']):>9}  {format_time(s['max']):>9}")
+    return "\n".join(lines)
+
+
+def format_comparison(current: Dict[str, Any], previous: Dict[str, Any]) -> str:
+    lines = ["route                       rps (prev → now)        p95 (prev → now)"]
+    prev_routes = previous["summary"]["routes"]
+    for route, s in current["summary"]["routes"].items():
+        if route not in prev_routes:
+            continue
+        p = prev_routes[route]
+        lines.append(f"{route:<26}  {p['rps']:>8.1f} → {s['rps']:<8.1f}    "
+                     f"{format_time(p['p95']):>9} → {format_time(s['p95'])}")
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m bench.loadtest", description="API load test")
+    target = ap.add_mutually_exclusive_group(required=True)
+    target.add_argument("--spawn", action="store_true", help="start a seeded local API")
+    target.add_argument("--base-url", help="API that is already running")
+    ap.add_argument("--providers", type=int, default=5000, help="rows to seed (--spawn) / id range to hit")
+    ap.add_argument("--api-workers", type=int, default=1, help="uvicorn workers (--spawn)")
+    ap.add_argument("--users", type=int, default=16, help="concurrent virtual users")
+    ap.add_argument("--duration", type=float, default=20.0, help="measured seconds")
+    ap.add_argument("--warmup", type=float, default=3.0, help="seconds excluded from the stats")
+    ap.add_argument("--mix", default=DEFAULT_MIX, help=f"route weights (default {DEFAULT_MIX})")
+    ap.add_argument("--page-size", type=int, default=100, help="limit for GET /providers")
+    ap.add_argument("--webhook-batch", type=int, default=50, help="events per webhook POST")
+    ap.add_argument("--username", default="loadtest")
+    ap.add_argument("--password", default="loadtest-pw")
+    ap.add_argument("--timeout", type=float, default=30.0)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--output", help="report file (default bench/results/loadtest-<timestamp>.json)")
+    ap.add_argument("--compare", help="earlier report to compare against")
+    ap.add_argument("--seed-only", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+
+    if args.seed_only:
+        _seed_db(args.providers, args.username, args.password)
+        return 0
+
+    mix = parse_mix(args.mix)
+    ctx = {"providers": args.providers, "page_size": args.page_size, "webhook_batch": args.webhook_batch,
+           "username": args.username, "password": args.password, "timeout": args.timeout, "seed": args.seed}
+
+    proc: Optional[subprocess.Popen] = None
+    base_url = args.base_url
+    try:
+        if args.spawn:
+            workdir = tempfile.mkdtemp(prefix="pv-loadtest-")
+            print(f"[loadtest] seeding {args.providers:,} providers in {workdir} …")
+            env = seed_environment(workdir, args.providers, args.username, args.password)
+            proc, base_url = spawn_api(env, workdir, args.api_workers)
+            print(f"[loadtest] API up at {base_url}")
+        print(f"[loadtest] {args.users} users × {args.duration:.0f}s (+{args.warmup:.0f}s warm-up) mix={args.mix}")
+        summary = asyncio.run(run_load(base_url, mix, args.users, args.duration, args.warmup, ctx))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=15)
+
+    report = {
+        "meta": {"timestamp": datetime.now().isoformat(timespec="seconds"), "commit": _git_commit(),
+                 "base_url": base_url, "spawned": bool(args.spawn), "api_workers": args.api_workers,
+                 "users": args.users, "duration": args.duration, "warmup": args.warmup,
+                 "providers": args.providers, "mix": mix, "page_size": args.page_size,
+                 "webhook_batch": args.webhook_batch, "seed": args.seed},
+        "summary": summary,
+    }
+    print(format_report(summary))
+    output = args.output or os.path.join(BENCH_DIR, "results", f"loadtest-{datetime.now():%Y%m%d-%H%M%S}.json")
+    save(report, output)
+    print(f"[loadtest] report written to {output}")
+    if args.compare:
+        with open(args.compare) as f:
+            print(format_comparison(report, json.load(f)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+# bench/runner.py
+"""
+Minimal benchmark harness: registry, timer, JSON results, baseline compare.
+
+A benchmark is a function decorated with @benchmark that does its setup and
+returns (run, ops). `run` is a zero-argument callable. `ops` is how many
+operations one run() performs, so results are reported per operation.
+
+    @benchmark("utils.fuzzy_ratio")
+    def bench_fuzzy_ratio():
+        pairs = [...]
+        def run():
+            for a, b in pairs:
+                fuzzy_ratio(a, b)
+        return run, len(pairs)
+
+measure() calibrates how many run() calls fill one round (~`round_time`
+seconds) and then times `rounds` rounds. Reported stats are per operation;
+the median is what compare() checks against the baseline.
+"""
+
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+@dataclass
+class Benchmark:
+    name: str
+    factory: Callable[[], Tuple[Callable[[], Any], int]]
+    group: str = "micro"
+    rounds: int = 7
+    round_time: float = 0.1
+    number: Optional[int] = None     # fixed run() calls per round (skips calibration)
+
+
+REGISTRY: Dict[str, Benchmark] = {}
+
+
+def benchmark(name: str, group: str = "micro", rounds: int = 7, round_time: float = 0.1,
+              number: Optional[int] = None):
+    def register(factory):
+        REGISTRY[name] = Benchmark(name, factory, group, rounds, round_time, number)
+        return factory
+    return register
+
+
+def measure(bench: Benchmark) -> Dict[str, Any]:
+    run, ops = bench.factory()
+    ops = max(int(ops), 1)
+
+    start = time.perf_counter()
+    run()                                            # warm-up (+ calibration sample)
+    first = time.perf_counter() - start
+    number = bench.number or max(1, math.ceil(bench.round_time / max(first, 1e-9)))
+
+    per_op = []
+    for _ in range(bench.rounds):
+        start = time.perf_counter()
+        for _ in range(number):
+            run()
+        per_op.append((time.perf_counter() - start) / (number * ops))
+
+    median = statistics.median(per_op)
+    return {
+        "group":       bench.group,
+        "rounds":      bench.rounds,
+        "number":      number,
+        "ops":         ops,
+        "min":         min(per_op),
+        "median":      median,
+        "mean":        statistics.fmean(per_op),
+        "stdev":       statistics.stdev(per_op) if len(per_op) > 1 else 0.0,
+        "ops_per_sec": 1.0 / median if median else float("inf"),
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_all(names: Optional[List[str]] = None, log=print) -> Dict[str, Any]:
+    results = {}
+    for name, bench in REGISTRY.items():
+        if names and not any(pattern in name for pattern in names):
+            continue
+        log(f"[bench] {name} …")
+        results[name] = measure(bench)
+        log(f"[bench]   median {format_time(results[name]['median'])}/op "
+            f"({results[name]['ops_per_sec']:,.0f} ops/s)")
+    return {
+        "meta": {
+            "timestamp":  datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit":     _git_commit(),
+            "python":     platform.python_version(),
+            "platform":   platform.platform(),
+            "cpu_count":  os.cpu_count(),
+        },
+        "benchmarks": results,
+    }
+
+
+def save(results: Dict[str, Any], path: str):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+
+
+def load(path: str) -> Dict[str, Any]:
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float = 0.10) -> List[Dict[str, Any]]:
+    """
+    One row per benchmark present in both runs. ratio = current / baseline
+    median; above 1 + threshold is a regression, below 1 - threshold an
+    improvement.
+    """
+    rows = []
+    base = baseline.get("benchmarks", {})
+    for name, cur in current.get("benchmarks", {}).items():
+        if name not in base:
+            continue
+        ratio = cur["median"] / base[name]["median"] if base[name]["median"] else float("inf")
+        status = "regression" if ratio > 1 + threshold else "improved" if ratio < 1 - threshold else "same"
+        rows.append({"name": name, "baseline": base[name]["median"], "current": cur["median"],
+                     "ratio": ratio, "status": status})
+    return rows
+
+
+def format_time(seconds: float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("µs", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f}{unit}"
+    return f"{seconds / 1e-9:.0f}ns"
+
+
+def format_comparison(rows: List[Dict[str, Any]]) -> str:
+    width = max([len(r["name"]) for r in rows] + [9])
+    lines = [f"{'benchmark':<{width}}  {'baseline':>10}  {'current':>10}  {'ratio':>6}  status"]
+    for r in rows:
+        lines.append(f"{r['name']:<{width}}  {format_time(r['baseline']):>10}  "
+                     f"{format_time(r['current']):>10}  {r['ratio']:>6.2f}  {r['status']}")
+    return "\n".join(lines)
@@ -0,0 +1,258 @@
+# bench/standin_farm.py
+"""
+Local HTTP stand-ins for everything run_batch and outreach talk to over the
+network, so fetch-heavy benchmarks run offline and repeatably.
+
+    python -m bench.standin_farm --port 8900 \\
+        --site-latency lognormal:40ms,0.6 --site-error-rate 0.02 --page-kb 30 \\
+        --enrich-latency uniform:5ms,25ms \\
+        --sendgrid-latency fixed:15ms --sendgrid-rps 50
+
+  GET  /site/{host}          synthetic provider website (HTML, ~--page-kb)
+  GET  /enrich/{provider_id} enrichment API response (JSON)
+  POST /v3/mail/send         SendGrid-compatible: 202 + X-Message-Id
+  GET  /__stats              request / status counters per service
+
+Point the pipeline at it:
+
+    WEBSITE_BASE_URL=http://127.0.0.1:8900/site        (ValidationAgent)
+    ENRICHMENT_API_URL=http://127.0.0.1:8900/enrich    (EnrichmentAgent)
+    SENDGRID_API_URL=http://127.0.0.1:8900/v3/mail/send
+
+Each service has its own latency distribution, error rate (500s) and
+optional rate limit. Over the limit a request gets 429 with Retry-After, as
+SendGrid does. Latency specs:
+fixed:20ms | uniform:10ms,80ms | lognormal:<median>,<sigma> | exp:<mean>.
+Latencies, errors and page content all come from one seeded RNG, so a run
+with the same --seed and request order behaves the same.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Optional
+
+from aiohttp import web
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Config
+# ─────────────────────────────────────────────────────────────────────────────
+def _seconds(value: str) -> float:
+    value = value.strip()
+    for suffix, scale in (("ms", 1e-3), ("us", 1e-6), ("s", 1.0)):
+        if value.endswith(suffix):
+            return float(value[:-len(suffix)]) * scale
+    return float(value)
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """'lognormal:40ms,0.6' → function(rng) → seconds."""
+    kind, _, args = spec.partition(":")
+    parts = [a for a in args.split(",") if a]
+    if kind == "fixed":
+        d = _seconds(parts[0]) if parts else 0.0
+        return lambda rng: d
+    if kind == "uniform":
+        lo, hi = _seconds(parts[0]), _seconds(parts[1])
+        return lambda rng: rng.uniform(lo, hi)
+    if kind == "lognormal":
+        median, sigma = _seconds(parts[0]), float(parts[1]) if len(parts) > 1 else 0.5
+        mu = math.log(max(median, 1e-9))
+        return lambda rng: rng.lognormvariate(mu, sigma)
+    if kind in ("exp", "exponential"):
+        mean = _seconds(parts[0])
+        return lambda rng: rng.expovariate(1.0 / mean) if mean > 0 else 0.0
+    raise ValueError(f"unknown latency spec {spec!r}")
+
+
+@dataclass
+class ServiceConfig:
+    latency: str = "fixed:0ms"
+    error_rate: float = 0.0
+    rps: float = 0.0                      # 0 = unlimited
+    burst: Optional[float] = None
+
+    def __post_init__(self):
+        self.sample = parse_latency(self.latency)
+
+
+@dataclass
+class FarmConfig:
+    site: ServiceConfig = field(default_factory=lambda: ServiceConfig("lognormal:40ms,0.5"))
+    enrich: ServiceConfig = field(default_factory=lambda: ServiceConfig("uniform:5ms,25ms"))
+    sendgrid: ServiceConfig = field(default_factory=lambda: ServiceConfig("fixed:15ms", rps=100))
+    page_kb: float = 20.0
+    seed: int = 1
+
+
+class _Bucket:
+    """Non-blocking token bucket — take() is False when the caller should get a 429."""
+
+    def __init__(self, rate: float, burst: Optional[float]):
+        self.rate, self.burst = rate, burst if burst is not None else max(rate, 1.0)
+        self.tokens, self.updated = self.burst, time.monotonic()
+
+    def take(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# App
+# ─────────────────────────────────────────────────────────────────────────────
+_WORDS = ("board certified physician accepting new patients clinic hours monday friday "
+          "insurance accepted medicare medicaid appointments telehealth referral hospital "
+          "affiliation residency fellowship internal medicine pediatrics cardiology").split()
+
+
+def _page(rng: random.Random, host: str, kb: float) -> str:
+    name = host.split(".")[0].replace("-", " ").title()
+    words = " ".join(rng.choice(_WORDS) for _ in range(max(int(kb * 1024 / 7), 1)))
+    return (f"<html><head><title>{name}</title></head><body><h1>{name}</h1>"
+            f"<p>Phone: ({rng.randint(201, 989)}) {rng.randint(200, 999)}-{rng.randint(0, 9999):04d}</p>"
+            f"<p>{words}</p></body></html>")
+
+
+def create_app(config: Optional[FarmConfig] = None) -> web.Application:
+    config = config or FarmConfig()
+    rng = random.Random(config.seed)
+    stats: Dict[str, Counter] = {name: Counter() for name in ("site", "enrich", "sendgrid")}
+    buckets = {name: _Bucket(svc.rps, svc.burst)
+               for name, svc in (("site", config.site), ("enrich", config.enrich),
+                                 ("sendgrid", config.sendgrid)) if svc.rps > 0}
+
+    async def gate(name: str, svc: ServiceConfig) -> Optional[web.Response]:
+        """Latency, throttling and injected errors shared by every service."""
+        stats[name]["requests"] += 1
+        bucket = buckets.get(name)
+        if bucket and not bucket.take():
+            stats[name]["429"] += 1
+            return web.json_response({"errors": [{"message": "too many requests"}]}, status=429,
+                                     headers={"Retry-After": "1"})
+        delay, fail = svc.sample(rng), rng.random() < svc.error_rate
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if fail:
+            stats[name]["500"] += 1
+            return web.json_response({"errors": [{"message": "injected failure"}]}, status=500)
+        return None
+
+    async def site(request: web.Request) -> web.Response:
+        early = await gate("site", config.site)
+        if early is not None:
+            return early
+        stats["site"]["200"] += 1
+        return web.Response(text=_page(rng, request.match_info["host"], config.page_kb),
+                            content_type="text/html")
+
+    async def enrich(request: web.Request) -> web.Response:
+        early = await gate("enrich", config.enrich)
+        if early is not None:
+            return early
+        stats["enrich"]["200"] += 1
+        pid = request.match_info["provider_id"]
+        return web.json_response({
+            "provider_id": pid,
+            "education": rng.choice(["MD", "DO", "MBBS"]) + ", " + rng.choice(["Harvard", "Johns Hopkins", "UCSF"]),
+            "certifications": rng.sample(["Board Certified", "ACLS", "BLS", "FACC"], k=2),
+            "hospital_affiliations": [f"{rng.choice(['City', 'General', 'Mercy'])} Hospital"],
+        })
+
+    async def sendgrid(request: web.Request) -> web.Response:
+        early = await gate("sendgrid", config.sendgrid)
+        if early is not None:
+            return early
+        try:
+            payload = await request.json()
+        except json.JSONDecodeError:
+            stats["sendgrid"]["400"] += 1
+            return web.json_response({"errors": [{"message": "invalid JSON"}]}, status=400)
+        recipients = sum(len(p.get("to", [])) for p in payload.get("personalizations", []))
+        stats["sendgrid"]["202"] += 1
+        stats["sendgrid"]["recipients"] += recipients
+        return web.Response(status=202, headers={"X-Message-Id": uuid.UUID(int=rng.getrandbits(128)).hex})
+
+    async def get_stats(request: web.Request) -> web.Response:
+        return web.json_response({name: dict(c) for name, c in stats.items()})
+
+    app = web.Application()
+    app["stats"] = stats
+    app.router.add_get("/site/{host}", site)
+    app.router.add_get("/enrich/{provider_id}", enrich)
+    app.router.add_post("/v3/mail/send", sendgrid)
+    app.router.add_get("/__stats", get_stats)
+    return app
+
+
+async def start_farm(config: Optional[FarmConfig] = None, host: str = "127.0.0.1", port: int = 0):
+    """Start the farm on the running loop; returns (runner, base_url). Stop with runner.cleanup()."""
+    runner = web.AppRunner(create_app(config), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{bound_port}"
+
+
+class FarmThread:
+    """Run the farm on a background loop — for synchronous benchmarks:
+
+        with FarmThread(FarmConfig(...)) as base_url:
+            os.environ["WEBSITE_BASE_URL"] = base_url + "/site"
+    """
+
+    def __init__(self, config: Optional[FarmConfig] = None, port: int = 0):
+        self.config, self.port = config, port
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="standin-farm", daemon=True)
+
+    def __enter__(self) -> str:
+        self.thread.start()
+        self.runner, self.url = asyncio.run_coroutine_threadsafe(
+            start_farm(self.config, port=self.port), self.loop).result()
+        return self.url
+
+    def __exit__(self, *exc):
+        asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m bench.standin_farm", description="Local HTTP stand-in farm")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8900)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--page-kb", type=float, default=20.0)
+    for name, latency, rps in (("site", "lognormal:40ms,0.5", 0), ("enrich", "uniform:5ms,25ms", 0),
+                               ("sendgrid", "fixed:15ms", 100)):
+        ap.add_argument(f"--{name}-latency", default=latency)
+        ap.add_argument(f"--{name}-error-rate", type=float, default=0.0)
+        ap.add_argument(f"--{name}-rps", type=float, default=rps, help="0 = no throttling")
+    args = ap.parse_args(argv)
+
+    def svc(name):
+        return ServiceConfig(getattr(args, f"{name}_latency"), getattr(args, f"{name}_error_rate"),
+                             getattr(args, f"{name}_rps"))
+
+    config = FarmConfig(site=svc("site"), enrich=svc("enrich"), sendgrid=svc("sendgrid"),
+                        page_kb=args.page_kb, seed=args.seed)
+    print(f"[INFO] stand-in farm on http://{args.host}:{args.port}")
+    web.run_app(create_app(config), host=args.host, port=args.port, access_log=None, print=None)
+
+
+if __name__ == "__main__":
+    main()
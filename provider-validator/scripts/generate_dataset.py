@@ -0,0 +1,304 @@
+# scripts/generate_dataset.py
+"""
+Scalable synthetic provider dataset for load and performance tests.
+
+    python scripts/generate_dataset.py --rows 1000000 --out data/providers_1m.csv
+    python scripts/generate_dataset.py --rows 200000 --out data/providers.parquet --workers 8
+
+Rows are generated in fixed-size chunks across a process pool. Each chunk
+has its own seed derived from --seed and the chunk number, so the same
+arguments give the same file whatever --workers is. Chunks are streamed to
+the output in order: CSV is written as text, Parquet goes through pyarrow
+row groups. Memory stays at a few chunks.
+
+Faker is only used once, up front, to build pools of names, streets, cities
+and domains. Per-row generation is random.choice over those pools, which is
+what makes a million rows take seconds rather than minutes.
+
+Workload knobs (all ratios are 0..1):
+  --duplicate-rate      row re-lists an earlier provider of its chunk (same
+                        NPI / phone, name and address slightly reworded)
+  --name-perturb-rate   claimed name has a typo / dropped middle initial /
+                        different case; the scanned PDF keeps the true name
+  --invalid-phone-rate  phone is malformed or not a valid number
+  --missing-website-rate
+  --pdf-rate            row has a scanned_pdf at all
+  --pdf-reuse           of those, share of rows pointing at a small shared
+                        pool (--pdf-pool files, content unrelated to the row)
+                        rather than their own PDF rendered from the row's
+                        true values in the layout src/ocr.py parses
+--no-pdfs writes the paths without rendering any PDF files.
+"""
+
+import argparse
+import csv
+import io
+import os
+import random
+import sys
+import time
+from multiprocessing import Pool
+from typing import Any, Dict, List
+
+COLUMNS = ["id", "name", "npi", "phone", "email", "address", "website", "specialty", "scanned_pdf"]
+TRUTH_COLUMNS = ["duplicate_of", "true_name"]
+
+SPECIALTIES = ["Cardiology", "Family Medicine", "Dermatology", "Orthopedics", "Pediatrics",
+               "Neurology", "Oncology", "Psychiatry", "Radiology", "Internal Medicine"]
+# Area codes in service, so "valid" phones pass phonenumbers.is_valid_number
+AREA_CODES = [201, 202, 206, 212, 213, 214, 303, 305, 312, 313, 404, 415, 512, 602, 617,
+              702, 713, 718, 773, 808, 818, 917, 919, 949]
+STREET_TYPES = ["St", "Ave", "Rd", "Blvd", "Dr", "Ln", "Way", "Ct"]
+STREET_ABBREV = {"Street": "St", "Avenue": "Ave", "Road": "Rd", "Boulevard": "Blvd"}
+
+_pools: Dict[str, List[str]] = {}
+_opts: Dict[str, Any] = {}
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Pools (built once, shipped to workers)
+# ─────────────────────────────────────────────────────────────────────────────
+def build_pools(seed: int, size: int = 2000) -> Dict[str, List[str]]:
+    from faker import Faker
+    fake = Faker("en_US")
+    fake.seed_instance(seed)
+    return {
+        "first":   [fake.first_name() for _ in range(size)],
+        "last":    [fake.last_name() for _ in range(size)],
+        "street":  [fake.street_name().split(" ")[0] for _ in range(size)],
+        "city":    [f"{fake.city()}, {fake.state_abbr()}" for _ in range(size // 4)],
+        "domain":  [fake.domain_word() for _ in range(size)],
+    }
+
+
+def _init_worker(pools, opts):
+    _pools.update(pools)
+    _opts.update(opts)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Row generation
+# ─────────────────────────────────────────────────────────────────────────────
+def _valid_phone(rng):
+    return f"({rng.choice(AREA_CODES)}) {rng.randint(200, 999)}-{rng.randint(0, 9999):04d}"
+
+
+def _invalid_phone(rng):
+    kind = rng.randrange(4)
+    if kind == 0:
+        return f"{rng.randint(100, 999)}-{rng.randint(0, 99):02d}"              # too short
+    if kind == 1:
+        return f"(100) 000-{rng.randint(0, 9999):04d}"                          # unassigned
+    if kind == 2:
+        return "n/a"
+    return f"{rng.randint(0, 9)}{rng.randint(0, 9)}-{rng.choice(AREA_CODES)}-{rng.randint(0, 9999)}x"
+
+
+def _perturb_name(rng, name):
+    kind = rng.randrange(4)
+    if kind == 0 and len(name) > 6:                                           # typo
+        i = rng.randrange(3, len(name) - 1)
+        return name[:i] + name[i + 1] + name[i] + name[i + 2:]
+    if kind == 1:
+        return name.upper()
+    if kind == 2:
+        return name.replace("Dr ", "", 1)
+    return " ".join(p for p in name.split(" ") if not (len(p) == 2 and p.endswith(".")))
+
+
+def _reword_address(rng, address):
+    for long, short in STREET_ABBREV.items():
+        if short in address and rng.random() < 0.5:
+            return address.replace(f" {short},", f" {long},")
+    return address.replace(",", "", 1)
+
+
+def _pdf_path(row_id):
+    return os.path.join(_opts["pdf_dir"], f"{row_id // 10000:04d}", f"provider_{row_id}.pdf")
+
+
+def _shared_pdf_path(i):
+    return os.path.join(_opts["pdf_dir"], "shared", f"shared_{i:04d}.pdf")
+
+
+def _is_shared(path):
+    return os.path.basename(os.path.dirname(path)) == "shared"
+
+
+def generate_chunk(chunk_index: int) -> List[Dict[str, Any]]:
+    o, p = _opts, _pools
+    rng = random.Random(o["seed"] * 1_000_003 + chunk_index)
+    start = chunk_index * o["chunk_size"] + 1
+    end = min(start + o["chunk_size"], o["rows"] + 1)
+    rows: List[Dict[str, Any]] = []
+
+    for row_id in range(start, end):
+        if rows and rng.random() < o["duplicate_rate"]:
+            src = rng.choice(rows)
+            row = dict(src, id=row_id, duplicate_of=src["duplicate_of"] or src["id"])
+            row["name"] = _perturb_name(rng, src["true_name"])
+            row["address"] = _reword_address(rng, src["address"])
+            if row["scanned_pdf"] and not _is_shared(row["scanned_pdf"]):
+                row["scanned_pdf"] = ""     # the re-listing has no scan of its own
+            rows.append(row)
+            continue
+
+        middle = f" {rng.choice('ABCDEFGHJKLMNPRSTW')}." if rng.random() < 0.3 else ""
+        true_name = f"Dr {rng.choice(p['first'])}{middle} {rng.choice(p['last'])}"
+        name = _perturb_name(rng, true_name) if rng.random() < o["name_perturb_rate"] else true_name
+        last = true_name.rsplit(" ", 1)[-1].lower()
+        domain = rng.choice(p["domain"])
+        row = {
+            "id":           row_id,
+            "name":         name,
+            "npi":          str(1000000000 + row_id),
+            "phone":        _invalid_phone(rng) if rng.random() < o["invalid_phone_rate"] else _valid_phone(rng),
+            "email":        f"{last}.{row_id}@{domain}-health.org",
+            "address":      f"{rng.randint(1, 9999)} {rng.choice(p['street'])} {rng.choice(STREET_TYPES)}, "
+                            f"{rng.choice(p['city'])} {rng.randint(10000, 99999)}",
+            "website":      "" if rng.random() < o["missing_website_rate"] else f"www.{domain}-{last}.com",
+            "specialty":    rng.choice(SPECIALTIES),
+            "scanned_pdf":  "",
+            "duplicate_of": "",
+            "true_name":    true_name,
+        }
+        if rng.random() < o["pdf_rate"]:
+            row["scanned_pdf"] = (_shared_pdf_path(rng.randrange(o["pdf_pool"]))
+                                  if rng.random() < o["pdf_reuse"] else _pdf_path(row_id))
+        rows.append(row)
+
+    if o["render_pdfs"]:
+        for row in rows:
+            if row["scanned_pdf"] and not row["duplicate_of"] and not _is_shared(row["scanned_pdf"]):
+                render_pdf(row["scanned_pdf"], row["true_name"], row["phone"], row["address"], row["specialty"])
+    return rows
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# PDFs — the "Label: value" layout src/ocr.extract_provider_fields parses
+# ─────────────────────────────────────────────────────────────────────────────
+def render_pdf(path, name, phone, address, specialty):
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    c = canvas.Canvas(path, pagesize=letter)
+    c.setFont("Helvetica", 12)
+    y = 740
+    for label, value in (("Name", name.replace("Dr ", "", 1)), ("Phone", phone),
+                         ("Address", address), ("Specialty", specialty)):
+        c.drawString(72, y, f"{label}: {value}")
+        y -= 24
+    c.save()
+
+
+def render_shared_pool(opts, pools):
+    rng = random.Random(opts["seed"])
+    _init_worker(pools, opts)
+    for i in range(opts["pdf_pool"]):
+        render_pdf(_shared_pdf_path(i), f"{rng.choice(pools['first'])} {rng.choice(pools['last'])}",
+                   _valid_phone(rng), f"{rng.randint(1, 9999)} {rng.choice(pools['street'])} St, "
+                   f"{rng.choice(pools['city'])}", rng.choice(SPECIALTIES))
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Writers
+# ─────────────────────────────────────────────────────────────────────────────
+class CsvSink:
+    def __init__(self, path, columns):
+        self.file = open(path, "w", newline="", encoding="utf-8")
+        self.columns = columns
+        csv.writer(self.file).writerow(columns)
+
+    def write(self, rows):
+        buf = io.StringIO()
+        csv.DictWriter(buf, fieldnames=self.columns, extrasaction="ignore").writerows(rows)
+        self.file.write(buf.getvalue())
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetSink:
+    def __init__(self, path, columns):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            sys.exit("Parquet output needs pyarrow (pip install pyarrow) — or write .csv")
+        self.pa, self.columns = pa, columns
+        types = {"id": pa.int64()}
+        self.schema = pa.schema([(c, types.get(c, pa.string())) for c in columns])
+        self.writer = pq.ParquetWriter(path, self.schema, compression="zstd")
+
+    def write(self, rows):
+        table = self.pa.Table.from_pydict(
+            {c: [r[c] if c == "id" else str(r[c]) for r in rows] for c in self.columns}, schema=self.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        self.writer.close()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Main
+# ─────────────────────────────────────────────────────────────────────────────
+def generate(opts: Dict[str, Any], out: str, fmt: str, workers: int, with_truth: bool) -> int:
+    pools = build_pools(opts["seed"])
+    if opts["render_pdfs"] and opts["pdf_rate"] and opts["pdf_reuse"]:
+        render_shared_pool(opts, pools)
+
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    columns = COLUMNS + (TRUTH_COLUMNS if with_truth else [])
+    sink = ParquetSink(out, columns) if fmt == "parquet" else CsvSink(out, columns)
+    n_chunks = -(-opts["rows"] // opts["chunk_size"])
+    written = 0
+    try:
+        with Pool(workers, initializer=_init_worker, initargs=(pools, opts)) as pool:
+            for rows in pool.imap(generate_chunk, range(n_chunks)):
+                sink.write(rows)
+                written += len(rows)
+                print(f"\r[INFO] {written:,}/{opts['rows']:,} rows", end="", flush=True)
+    finally:
+        sink.close()
+    print()
+    return written
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    ap.add_argument("--out", default="data/providers_generated.csv", help=".csv or .parquet")
+    ap.add_argument("--format", choices=["csv", "parquet"], help="default: from --out extension")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    ap.add_argument("--chunk-size", type=int, default=20_000)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--duplicate-rate", type=float, default=0.05)
+    ap.add_argument("--name-perturb-rate", type=float, default=0.10)
+    ap.add_argument("--invalid-phone-rate", type=float, default=0.08)
+    ap.add_argument("--missing-website-rate", type=float, default=0.30)
+    ap.add_argument("--pdf-rate", type=float, default=0.20)
+    ap.add_argument("--pdf-reuse", type=float, default=0.80)
+    ap.add_argument("--pdf-pool", type=int, default=50)
+    ap.add_argument("--pdf-dir", default="data/scanned_pdfs/generated")
+    ap.add_argument("--no-pdfs", action="store_true", help="write scanned_pdf paths but no PDF files")
+    ap.add_argument("--with-truth", action="store_true",
+                    help="add duplicate_of / true_name columns (ground truth for dedupe tests)")
+    args = ap.parse_args(argv)
+
+    fmt = args.format or ("parquet" if args.out.endswith(".parquet") else "csv")
+    opts = {
+        "rows": args.rows, "chunk_size": args.chunk_size, "seed": args.seed,
+        "duplicate_rate": args.duplicate_rate, "name_perturb_rate": args.name_perturb_rate,
+        "invalid_phone_rate": args.invalid_phone_rate, "missing_website_rate": args.missing_website_rate,
+        "pdf_rate": args.pdf_rate, "pdf_reuse": args.pdf_reuse, "pdf_pool": max(args.pdf_pool, 1),
+        "pdf_dir": args.pdf_dir, "render_pdfs": not args.no_pdfs,
+    }
+    started = time.perf_counter()
+    n = generate(opts, args.out, fmt, args.workers, args.with_truth)
+    elapsed = time.perf_counter() - started
+    print(f"[INFO] ✅ {n:,} rows → {args.out} in {elapsed:.1f}s ({n / elapsed:,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
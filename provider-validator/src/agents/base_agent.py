@@ -2,11 +2,24 @@
 import abc
 from typing import Dict, Any
 
+from src.metrics import instrument_agent
+from src.tracing import trace_agent
+
+
 class BaseAgent(abc.ABC):
     def __init__(self, name: str, llm_client=None):
         self.name = name
         self.llm_client = llm_client
 
+    def __init_subclass__(cls, **kwargs):
+        # every concrete run() gets an agent.<name> span and reports
+        # agent_run_seconds / in-flight / errors
+        super().__init_subclass__(**kwargs)
+        run = cls.__dict__.get("run")
+        if run is not None and not getattr(run, "__isabstractmethod__", False) \
+                and not getattr(run, "__instrumented__", False):
+            cls.run = instrument_agent(trace_agent(run))
+
     @abc.abstractmethod
     async def run(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         pass
@@ -1,6 +1,10 @@
 # src/agents/enrichment_agent.py
 from .base_agent import BaseAgent
 import aiohttp
+import os
+
+# Enrichment API base URL; GET {url}/{provider_id}. Unset → built-in mock data.
+ENRICHMENT_API_URL = os.getenv("ENRICHMENT_API_URL", "").rstrip("/")
 
 class EnrichmentAgent(BaseAgent):
     async def fetch(self, session, url):
@@ -11,13 +15,17 @@ class EnrichmentAgent(BaseAgent):
             return {}
 
     async def run(self, payload):
-        # Example: enrich using mocked API
         enrichment = {"education": None, "certifications": [], "hospital_affiliations": []}
         website = payload.get("website")
-        async with aiohttp.ClientSession() as session:
-            if website:
-                # mock enrichment data
-                enrichment["education"] = "MD, Cardiology"
-                enrichment["certifications"] = ["Board Certified"]
-                enrichment["hospital_affiliations"] = ["City Hospital"]
+        if ENRICHMENT_API_URL:
+            async with aiohttp.ClientSession() as session:
+                data = await self.fetch(session, f"{ENRICHMENT_API_URL}/{payload['id']}")
+            for key in enrichment:
+                if data.get(key):
+                    enrichment[key] = data[key]
+        elif website:
+            # mock enrichment data
+            enrichment["education"] = "MD, Cardiology"
+            enrichment["certifications"] = ["Board Certified"]
+            enrichment["hospital_affiliations"] = ["City Hospital"]
         return {"id": payload["id"], "enrichment": enrichment}
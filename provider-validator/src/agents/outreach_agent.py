@@ -1,9 +1,15 @@
 # src/agents/outreach_agent.py
 from .base_agent import BaseAgent
-from jinja2 import Template
+from jinja2 import DictLoader, Environment
 from email_validator import validate_email, EmailNotValidError
+from email_validator.deliverability import validate_email_deliverability
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+import asyncio
 import os
 
+import dns.resolver
+
 # ✅ Reusable HTML Email Template (SendGrid-friendly)
 EMAIL_TEMPLATE = """
 <p>Dear {{ provider_name }},</p>
@@ -22,6 +28,69 @@ Address: {{ address }}</p>
 <p>Thank you,<br>Provider Validation Team</p>
 """
 
+# ✅ Compiled once per process — rendering is then a plain function call
+_jinja_env = Environment(loader=DictLoader({"outreach_email.html": EMAIL_TEMPLATE}), auto_reload=False)
+_email_template = _jinja_env.get_template("outreach_email.html")
+
+# Set OUTREACH_CHECK_DELIVERABILITY=0 to skip the DNS (MX) lookup per domain
+CHECK_DELIVERABILITY = os.getenv("OUTREACH_CHECK_DELIVERABILITY", "1") != "0"
+
+
+@lru_cache(maxsize=200_000)
+def _email_syntax_ok(email: str) -> Optional[str]:
+    """Normalized address if the syntax is valid, else None (memoized per address)."""
+    try:
+        return validate_email(email, check_deliverability=False).normalized
+    except EmailNotValidError:
+        return None
+
+
+class _UnsureDeliverability(Exception):
+    """Raised through the cache so lru_cache doesn't keep transient DNS answers."""
+
+    def __init__(self, deliverable: bool):
+        super().__init__(deliverable)
+        self.deliverable = deliverable
+
+
+@lru_cache(maxsize=20_000)
+def _domain_verdict(domain: str) -> bool:
+    """Definitive answers only: NXDOMAIN / no MX, A or AAAA / null MX are cached as False."""
+    try:
+        info = validate_email_deliverability(domain, domain)
+    except EmailNotValidError as e:
+        if e.__cause__ is None or isinstance(e.__cause__, (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer)):
+            return False
+        raise _UnsureDeliverability(False)      # resolver error — ask again next time
+    if "unknown-deliverability" in info:        # timeout / SERVFAIL: let it through, uncached
+        raise _UnsureDeliverability(True)
+    return True
+
+
+def _domain_deliverable(domain: str) -> bool:
+    """DNS deliverability check, memoized per domain — most providers share a handful."""
+    try:
+        return _domain_verdict(domain)
+    except _UnsureDeliverability as e:
+        return e.deliverable
+
+
+def check_email(email: Optional[str]) -> Optional[str]:
+    """Return the email if it passes validation, else None."""
+    if not email or not isinstance(email, str):
+        return None
+    if not _email_syntax_ok(email):
+        return None
+    if CHECK_DELIVERABILITY and not _domain_deliverable(email.rsplit("@", 1)[1].lower()):
+        return None
+    return email
+
+
+def _value(profile: Dict[str, Any], key: str, default):
+    field = profile.get(key, default)
+    return field.get("value") if isinstance(field, dict) else field
+
+
 class OutreachAgent(BaseAgent):
     async def run(self, payload):
         """
@@ -29,60 +98,69 @@ class OutreachAgent(BaseAgent):
         - Confidence < 0.6 OR
         - Flags exist in the profile
         """
+        return self.draft(payload)
+
+    def draft(self, payload) -> Optional[Dict[str, Any]]:
+        """Synchronous core of run(): the draft for one profile, or None."""
         profile = payload.get("profile") or payload
         provider_id = profile.get("id")
 
         # ✅ Confidence + flag check (your original logic preserved)
-        if profile.get("final_confidence", 1.0) < 0.6 or profile.get("flags"):
-            provider_name = (
-                profile.get("name", {}).get("value")
-                if isinstance(profile.get("name"), dict)
-                else profile.get("name", "Provider")
-            )
-            practice_name = profile.get("practice_name", provider_name)
-            phone = (
-                profile.get("phone", {}).get("value")
-                if isinstance(profile.get("phone"), dict)
-                else profile.get("phone", "N/A")
-            )
-            address = (
-                profile.get("address", {}).get("value")
-                if isinstance(profile.get("address"), dict)
-                else profile.get("address", "N/A")
-            )
-
-            # ✅ Get and validate email
-            email = (
-                profile.get("email")
-                or (profile.get("emails") and profile["emails"][0])
-                or None
-            )
-            if email:
-                try:
-                    validate_email(email)
-                except EmailNotValidError:
-                    email = None
-
-            # ✅ Dynamic verification link
-            base_url = os.getenv("VERIFICATION_BASE_URL", "http://localhost:8000/verify")
-            verification_link = f"{base_url}?provider_id={provider_id}"
-
-            # ✅ Render template
-            body = Template(EMAIL_TEMPLATE).render(
-                provider_name=provider_name,
-                practice_name=practice_name,
-                phone=phone,
-                address=address,
-                verification_link=verification_link,
-            )
-
-            # ✅ Final draft returned
-            return {
-                "provider_id": provider_id,
-                "subject": "Please verify your provider directory info",
-                "body": body,
-                "recipient": email,
-            }
-
-        # If no outreach needed
-        return None
+        if not (profile.get("final_confidence", 1.0) < 0.6 or profile.get("flags")):
+            # If no outreach needed
+            return None
+
+        provider_name = _value(profile, "name", "Provider")
+        practice_name = profile.get("practice_name", provider_name)
+        phone = _value(profile, "phone", "N/A")
+        address = _value(profile, "address", "N/A")
+
+        # ✅ Get and validate email
+        email = check_email(
+            profile.get("email")
+            or (profile.get("emails") and profile["emails"][0])
+            or None
+        )
+
+        # ✅ Dynamic verification link
+        base_url = os.getenv("VERIFICATION_BASE_URL", "http://localhost:8000/verify")
+        verification_link = f"{base_url}?provider_id={provider_id}"
+
+        # ✅ Render the precompiled template
+        body = _email_template.render(
+            provider_name=provider_name,
+            practice_name=practice_name,
+            phone=phone,
+            address=address,
+            verification_link=verification_link,
+        )
+
+        # ✅ Final draft returned
+        return {
+            "provider_id": provider_id,
+            "subject": "Please verify your provider directory info",
+            "body": body,
+            "recipient": email,
+        }
+
+    def iter_drafts(self, profiles: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Drafts for a stream of profiles, skipping those that need no outreach."""
+        for profile in profiles:
+            draft = self.draft(profile)
+            if draft:
+                yield draft
+
+    async def run_many(self, profiles: Iterable[Dict[str, Any]], chunk_size: int = 1000) -> List[Dict[str, Any]]:
+        """
+        Bulk version of run() for a list or generator of profiles. Renders in
+        chunks and yields to the event loop between them so a 100k-profile
+        wave doesn't stall other requests.
+        """
+        drafts: List[Dict[str, Any]] = []
+        for i, profile in enumerate(profiles, 1):
+            draft = self.draft(profile)
+            if draft:
+                drafts.append(draft)
+            if i % chunk_size == 0:
+                await asyncio.sleep(0)
+        return drafts
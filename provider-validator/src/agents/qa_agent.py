@@ -1,5 +1,6 @@
 # src/agents/qa_agent.py
 from src.agents.base_agent import BaseAgent
+from src.scoring import qa_row
 
 class QAAgent(BaseAgent):
     def __init__(self, name="qa_agent"):
@@ -18,22 +19,8 @@ class QAAgent(BaseAgent):
         score = payload.get("score", 0.0)
         matches = payload.get("matches", {})
 
-        flags = []
-
-        # Check low confidence score
-        if score < 0.5:
-            flags.append("low_confidence")
-
-        # Check phone validity
-        if matches.get("phone_valid") is False:
-            flags.append("invalid_phone")
-
-        # Check name similarity
-        if matches.get("name_score", 0.0) < 0.6:
-            flags.append("name_mismatch")
-
-        # Determine QA status
-        status = "manual_review" if flags else "confirmed"
+        # Thresholds live in src.scoring (shared with the batch re-scorer)
+        flags, status = qa_row(score, matches.get("phone_valid"), matches.get("name_score", 0.0))
 
         # Return structured QA result
         return {
@@ -1,10 +1,16 @@
 # src/agents/validation_agent.py
-import asyncio, aiohttp, json
+import asyncio, aiohttp, json, os
 from .base_agent import BaseAgent
 from bs4 import BeautifulSoup
 from src.ocr import pdf_to_text, extract_provider_fields
-from src.utils import normalize_phone, fuzzy_ratio
-import phonenumbers
+from src.utils import parse_phone, fuzzy_ratio
+from src.scoring import score_row
+from src.tracing import tracer
+
+# Serve every provider website from one base URL instead of the real host
+# (bench/standin_farm.py): http://127.0.0.1:8900/site → .../site/<host>
+WEBSITE_BASE_URL = os.getenv("WEBSITE_BASE_URL", "").rstrip("/")
+
 
 class ValidationAgent(BaseAgent):
     def __init__(self, name="validation"):
@@ -12,10 +18,14 @@ class ValidationAgent(BaseAgent):
 
     async def fetch_website(self, session, url):
         try:
-            if not url.startswith("http"):
+            if WEBSITE_BASE_URL:
+                url = f"{WEBSITE_BASE_URL}/{url.split('://', 1)[-1].split('/', 1)[0]}"
+            elif not url.startswith("http"):
                 url = "http://" + url
-            async with session.get(url, timeout=10) as r:
-                return await r.text()
+            with tracer.start_as_current_span("http.fetch", attributes={"http.url": url}) as span:
+                async with session.get(url, timeout=10) as r:
+                    span.set_attribute("http.status_code", r.status)
+                    return await r.text()
         except Exception:
             return ""
 
@@ -42,21 +52,13 @@ class ValidationAgent(BaseAgent):
                     result["sources"]["website"] = {"text_preview": text[:800]}
             # else no website
 
-        # 3) Basic phone normalization & check
+        # 3) Basic phone normalization & check — one (memoized) parse
         src_phone = payload.get("phone")
-        normalized = None
-        if src_phone:
-            normalized = normalize_phone(src_phone)
-            try:
-                pn = phonenumbers.parse(src_phone, "US")
-                phone_valid = phonenumbers.is_valid_number(pn)
-            except:
-                phone_valid = False
-        else:
-            phone_valid = False
+        normalized, phone_valid, phone_type = parse_phone(src_phone)
 
         result["matches"]["phone_valid"] = phone_valid
         result["matches"]["phone_normalized"] = normalized
+        result["matches"]["phone_type"] = phone_type
 
         # 4) simple fuzzy name match: claimed vs ocr (if exists)
         name_claimed = payload.get("name","")
@@ -70,9 +72,7 @@ class ValidationAgent(BaseAgent):
         addr_score = fuzzy_ratio(addr_claimed, addr_ocr)
         result["matches"]["address_score"] = addr_score
 
-        # 6) simple combined score
-        phone_score = 1.0 if phone_valid else 0.0
-        final_score = 0.4 * name_score + 0.3 * phone_score + 0.3 * addr_score
-        result["score"] = final_score
+        # 6) simple combined score (weights in src.scoring)
+        result["score"] = score_row(name_score, phone_valid, addr_score)
 
         return result
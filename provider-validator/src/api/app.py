@@ -1,6 +1,6 @@
 # src/api/app.py — FULLY CONVERTED: zero sqlite3 imports, all DB via src.db
 from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends, Body, Request, Response, status, Query
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 import os, csv, json, uuid, time, logging
 from typing import List, Dict, Any, Optional
@@ -11,11 +11,15 @@ from src.db import fetch_all, init_db, fetch_provider_by_id, fetch_providers_by_
 from src.orchestrator import run_batch
 from src.agents.outreach_agent import OutreachAgent
 from src.reports.pdf_generator import create_report
-from src.auth import router as auth_router, get_current_active_user
-from src.celery_app import run_batch_task
+from src.auth import router as auth_router, get_current_active_user, init_user_db
+from src.api.routes.webhooks import router as webhooks_router
+from src.celery_app import run_batch_task, run_batch_sharded_task, outreach_wave_task
+from src.outbox import SqlOutbox
+from src import outreach_events, profiler
 from src.metrics import HTTP_REQUEST_COUNT, HTTP_REQUEST_LATENCY, metrics_response
 from src.logging_config import configure_logging
 from src.tracing import init_tracing
+from src.progress import get_bus, TERMINAL_STATES
 from sqlalchemy import text   # for review/history/verify endpoints
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -26,6 +30,7 @@ init_tracing(app)
 configure_logging()
 logger = logging.getLogger(__name__)
 app.include_router(auth_router)
+app.include_router(webhooks_router)
 
 app.add_middleware(
     CORSMiddleware,
@@ -155,6 +160,7 @@ def startup_event():
     SQLite and PostgreSQL using the shared SQLAlchemy engine.
     """
     init_db()   # creates providers, provider_reviews, outreach_logs if missing
+    init_user_db()   # users table once here, not on every authenticated request
 
     try:
         count = fetch_all("SELECT COUNT(*) as cnt FROM providers")
@@ -182,13 +188,63 @@ async def api_run_batch(
     background_tasks: BackgroundTasks,
     limit: int = 50,
     concurrency: int = 6,
+    resume: bool = False,
+    freshness_hours: Optional[float] = Query(default=None, description=(
+        "Skip unchanged rows validated within this many hours "
+        "(default REVALIDATE_FRESHNESS_HOURS; 0 = re-validate everything)"
+    )),
+    shards: int = Query(default=1, ge=1, le=256, description=(
+        "Split the batch into this many row-range shards, one Celery task each"
+    )),
     current_user=Depends(get_current_active_user)
 ):
     if current_user.role not in ("admin", "runner"):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Insufficient privileges")
-    task = run_batch_task.delay(limit=limit, concurrency=concurrency)
+    if shards > 1:
+        # limit caps the rows before they are split into shard ranges
+        task = run_batch_sharded_task.delay(shards=shards, concurrency=concurrency, limit=limit,
+                                            resume=resume, freshness_hours=freshness_hours)
+    else:
+        task = run_batch_task.delay(limit=limit, concurrency=concurrency, resume=resume,
+                                    freshness_hours=freshness_hours)
     return {"status": "queued", "task_id": task.id, "limit": limit,
-            "concurrency": concurrency, "started_by": current_user.username}
+            "concurrency": concurrency, "resume": resume, "shards": shards,
+            "started_by": current_user.username}
+
+
+@app.get("/batches/{task_id}")
+async def batch_job_status(task_id: str, current_user=Depends(get_current_active_user)):
+    """Registry entry for a batch job: params, status, checkpoint and stats."""
+    from src.jobs import get_job
+    job = get_job(task_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Batch job {task_id} not found")
+    return job
+
+
+@app.get("/batches/{task_id}/events")
+async def batch_events(task_id: str, request: Request, current_user=Depends(get_current_active_user)):
+    """
+    Server-Sent Events stream of batch progress (rows read/validated/written/
+    failed, rows_per_sec, eta_seconds). The current snapshot is sent first;
+    the stream ends when the batch completes or fails.
+    """
+    async def event_stream():
+        async for event in get_bus().subscribe(task_id):
+            if await request.is_disconnected():
+                break
+            if event is None:
+                yield ": keepalive\n\n"
+                continue
+            yield f"event: progress\ndata: {json.dumps(event, default=str)}\n\n"
+            if event.get("state") in TERMINAL_STATES:
+                break
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -372,24 +428,63 @@ async def provider_history(id: int):
 # ─────────────────────────────────────────────────────────────────────────────
 # Outreach
 # ─────────────────────────────────────────────────────────────────────────────
-@app.post("/send-outreach")
-async def send_outreach():
-    results = []
-    for p in get_all_providers_merged(500):
-        try:    fc = float(p.get("final_confidence", p.get("confidence", 0) or 0))
-        except: fc = 0.0
-        flags = p.get("flags")
-        if isinstance(flags, str):
-            try:    flags = json.loads(flags)
-            except: flags = []
-        if not isinstance(flags, list):
-            flags = []
-        if fc < 0.6 or flags:
-            try:    email = await outreach_agent.run(p)
-            except TypeError: email = outreach_agent.run(p)
-            if email:
-                results.append({"id": p.get("id"), **email})
-    return {"emails_generated": len(results), "details": results}
+@app.post("/send-outreach", status_code=status.HTTP_202_ACCEPTED)
+async def send_outreach(
+    campaign_id: Optional[str] = Query(None, description="Outbox campaign; a provider is queued at most once per campaign (default: today's wave)"),
+    dispatch: bool = Query(False, description="Start draining the campaign via the outreach workers when drafting finishes"),
+    workers: int = Query(4, ge=1, le=32, description="Pages of providers drafted in parallel"),
+    resume: bool = Query(False, description="Continue this campaign's last unfinished wave from its checkpoint"),
+    current_user=Depends(get_current_active_user),
+):
+    """
+    Start a background outreach wave: every low-confidence / flagged provider
+    is drafted and queued in outreach_outbox. Follow it via
+    GET /outreach/jobs/{job_id} (or the SSE stream at /batches/{job_id}/events).
+    Admin only — with dispatch=true this emails real providers.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Insufficient privileges")
+    campaign_id = campaign_id or f"wave-{time.strftime('%Y%m%d')}"
+    task = outreach_wave_task.delay(campaign_id=campaign_id, workers=workers, resume=resume,
+                                    dispatch=dispatch)
+    return {"status": "queued", "job_id": task.id, "campaign_id": campaign_id,
+            "status_url": f"/outreach/jobs/{task.id}", "started_by": current_user.username}
+
+
+@app.get("/outreach/jobs/{job_id}")
+async def outreach_job_status(job_id: str, current_user=Depends(get_current_active_user)):
+    """Outreach wave progress (scanned / queued / skipped) plus its campaign's outbox counts."""
+    from src.jobs import get_job
+    job = get_job(job_id)
+    if not job or job.get("kind") != "outreach":
+        raise HTTPException(status_code=404, detail=f"Outreach job {job_id} not found")
+    campaign_id = job["params"].get("campaign_id")
+    live = get_bus().last(job_id) if job["status"] == "running" else None
+    return {**job, "progress": live or job["stats"], "campaign_id": campaign_id,
+            "outbox": SqlOutbox(campaign_id).counts() if campaign_id else {}}
+
+
+@app.get("/outreach/outbox")
+async def outreach_outbox_status(campaign_id: Optional[str] = None,
+                                 current_user=Depends(get_current_active_user)):
+    """Outbox row counts by state (pending / sending / sent / failed)."""
+    return {"campaign_id": campaign_id, "counts": SqlOutbox(campaign_id).counts()}
+
+
+@app.get("/outreach/funnel")
+async def outreach_funnel(campaign_id: Optional[str] = None, current_user=Depends(get_current_active_user)):
+    """sent → delivered → opened → clicked counts and rates from outreach_message_state."""
+    return outreach_events.funnel(campaign_id)
+
+
+@app.get("/outreach/messages/{message_id}/events")
+async def outreach_message_events(message_id: str, email: Optional[str] = None,
+                                  current_user=Depends(get_current_active_user)):
+    """Full SendGrid event history of one message (optionally one recipient)."""
+    events = outreach_events.message_history(message_id, email)
+    if not events:
+        raise HTTPException(status_code=404, detail="No events for this message")
+    return {"message_id": message_id, "events": events}
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -437,4 +532,29 @@ async def observability_middleware(request: Request, call_next):
 @app.get("/metrics")
 async def metrics():
     data, content_type = metrics_response()
-    return Response(content=data, media_type=content_type)
\ No newline at end of file
+    return Response(content=data, media_type=content_type)
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Debug — sampling profiler (admin only)
+# ─────────────────────────────────────────────────────────────────────────────
+@app.get("/debug/profile")
+def debug_profile(
+    seconds: float = Query(10.0, gt=0, le=profiler.PROFILER_MAX_SECONDS),
+    interval_ms: float = Query(profiler.PROFILER_INTERVAL * 1000, ge=1, le=1000),
+    current_user=Depends(get_current_active_user),
+):
+    """
+    Sample this API process for `seconds` and return a collapsed-stack file
+    (flamegraph.pl / speedscope). Runs in the threadpool, so the event loop
+    keeps serving requests while it samples.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Insufficient privileges")
+    if not profiler.PROFILER_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiler disabled (PROFILER_ENABLED=0)")
+    try:
+        collapsed = profiler.profile(seconds, interval_ms / 1000)
+    except profiler.ProfilerBusy as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    return Response(content=collapsed, media_type="text/plain", headers={
+        "Content-Disposition": f'attachment; filename="api-{int(time.time())}.collapsed"'})
@@ -1,7 +1,12 @@
 # src/auth.py
 import os
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 
 from fastapi import Depends, HTTPException, status, APIRouter
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
@@ -24,6 +29,25 @@ router = APIRouter()
 
 USER_DB_PATH = os.getenv("USER_DB_PATH", "data/users.db")
 
+# User lookups are cached for a short TTL so authenticated requests don't
+# open users.db every time. Entries are dropped when a user is created or
+# disabled, so the TTL only bounds staleness for edits made outside this process.
+# Only existing users are cached (/token accepts any username), and the cache
+# keeps at most USER_CACHE_SIZE of them, least recently used dropped first.
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "2048"))
+
+# bcrypt is deliberately slow (~250ms). Run it on a small dedicated pool so a
+# burst of logins can't block the event loop or starve FastAPI's threadpool.
+_hash_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("AUTH_HASH_WORKERS", "4")),
+    thread_name_prefix="auth-bcrypt",
+)
+
+_user_cache: "OrderedDict[str, Tuple[float, UserInDB]]" = OrderedDict()
+_user_cache_lock = threading.Lock()
+_schema_ready = False
+
 # Pydantic models
 class Token(BaseModel):
     access_token: str
@@ -43,10 +67,32 @@ class UserInDB(BaseModel):
 def get_db_conn():
     return sqlite3.connect(USER_DB_PATH)
 
-def get_user_from_db(username: str) -> Optional[UserInDB]:
+def init_user_db():
+    """Create the users table. Called once at API startup."""
+    global _schema_ready
+    conn = get_db_conn()
+    conn.execute("""CREATE TABLE IF NOT EXISTS users (username TEXT PRIMARY KEY, hashed_password TEXT NOT NULL, role TEXT NOT NULL, disabled INTEGER DEFAULT 0)""")
+    conn.commit()
+    conn.close()
+    _schema_ready = True
+
+def _ensure_schema():
+    # scripts (create_user.py) don't go through API startup
+    if not _schema_ready:
+        init_user_db()
+
+def invalidate_user_cache(username: Optional[str] = None):
+    """Drop one cached user, or the whole cache when username is None."""
+    with _user_cache_lock:
+        if username is None:
+            _user_cache.clear()
+        else:
+            _user_cache.pop(username, None)
+
+def _load_user(username: str) -> Optional[UserInDB]:
+    _ensure_schema()
     conn = get_db_conn()
     cur = conn.cursor()
-    cur.execute("""CREATE TABLE IF NOT EXISTS users (username TEXT PRIMARY KEY, hashed_password TEXT NOT NULL, role TEXT NOT NULL, disabled INTEGER DEFAULT 0)""")
     cur.execute("""SELECT username, hashed_password, role, disabled FROM users WHERE username = ?""", (username,))
     row = cur.fetchone()
     conn.close()
@@ -54,15 +100,31 @@ def get_user_from_db(username: str) -> Optional[UserInDB]:
         return None
     return UserInDB(username=row[0], hashed_password=row[1], role=row[2], disabled=bool(row[3]))
 
+def get_user_from_db(username: str) -> Optional[UserInDB]:
+    now = time.monotonic()
+    with _user_cache_lock:
+        hit = _user_cache.get(username)
+        if hit and hit[0] > now:
+            _user_cache.move_to_end(username)
+            return hit[1]
+    user = _load_user(username)
+    if user is not None:
+        with _user_cache_lock:
+            _user_cache[username] = (now + USER_CACHE_TTL, user)
+            _user_cache.move_to_end(username)
+            while len(_user_cache) > USER_CACHE_SIZE:
+                _user_cache.popitem(last=False)
+    return user
+
 def create_user_db(username: str, password: str, role: str = "reviewer"):
     """Create a new user in the database"""
     # ✅ FIX 4: Limit password length to 72 bytes for bcrypt
     if len(password) > 72:
         password = password[:72]
     hashed = pwd_context.hash(password)
+    _ensure_schema()
     conn = get_db_conn()
     cur = conn.cursor()
-    cur.execute("CREATE TABLE IF NOT EXISTS users (username TEXT PRIMARY KEY, hashed_password TEXT NOT NULL, role TEXT NOT NULL, disabled INTEGER DEFAULT 0)")
     try:
         cur.execute("INSERT INTO users (username, hashed_password, role) VALUES (?, ?, ?)",
                     (username, hashed, role))
@@ -71,6 +133,19 @@ def create_user_db(username: str, password: str, role: str = "reviewer"):
         conn.close()
         raise
     conn.close()
+    invalidate_user_cache(username)
+
+def set_user_disabled(username: str, disabled: bool = True) -> bool:
+    """Enable/disable a user. Returns False if the user doesn't exist."""
+    _ensure_schema()
+    conn = get_db_conn()
+    cur = conn.cursor()
+    cur.execute("UPDATE users SET disabled = ? WHERE username = ?", (int(disabled), username))
+    conn.commit()
+    updated = cur.rowcount > 0
+    conn.close()
+    invalidate_user_cache(username)
+    return updated
 
 # --- Auth helpers
 def verify_password(plain_password, hashed_password):
@@ -85,6 +160,11 @@ def verify_password(plain_password, hashed_password):
         return False
   
 
+async def verify_password_async(plain_password, hashed_password):
+    """verify_password on the bcrypt pool, so the event loop keeps serving."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hash_executor, verify_password, plain_password, hashed_password)
+
 def authenticate_user(username: str, password: str):
     user = get_user_from_db(username)
     if not user:
@@ -93,6 +173,14 @@ def authenticate_user(username: str, password: str):
         return False
     return user
 
+async def authenticate_user_async(username: str, password: str):
+    user = get_user_from_db(username)
+    if not user:
+        return False
+    if not await verify_password_async(password, user.hashed_password):
+        return False
+    return user
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] |None= None):
     to_encode = data.copy()
     if expires_delta:
@@ -133,13 +221,7 @@ async def get_current_active_user(current_user: UserInDB = Depends(get_current_u
 # --- Token endpoint
 @router.post("/token", response_model=Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
-     
-    
-    print("Username received:", form_data.username)
-    print("Password received:", form_data.password)
-
-    user = authenticate_user(form_data.username, form_data.password)
-    print("Auth result:", user)
+    user = await authenticate_user_async(form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -1,18 +1,33 @@
-from celery import Celery
+from celery import Celery, chord
+from kombu import Queue
+import os
 import logging
 import asyncio
-from prometheus_client import start_http_server
+from celery.worker.control import control_command
+from celery.signals import worker_init, worker_ready, worker_process_shutdown
+from prometheus_client import start_http_server, multiprocess
+from src.metrics import metrics_registry
 from src.logging_config import configure_logging
 from opentelemetry import trace
 
 # --- Setup Tracer ---
 tracer = trace.get_tracer(__name__)
 
+
+@worker_init.connect
+def _init_worker_tracing(**_):
+    # BatchSpanProcessor restarts its export thread in forked pool children
+    from src.tracing import setup_tracing
+    setup_tracing("provider-validator-worker")
+
 # --- Configure Celery ---
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
 celery_app = Celery(
     "provider_validator",
-    broker="redis://localhost:6379/0",     # Redis message broker
-    backend="redis://localhost:6379/0"     # optional result backend
+    broker=os.getenv("CELERY_BROKER_URL", REDIS_URL),        # Redis message broker
+    backend=os.getenv("CELERY_RESULT_BACKEND", REDIS_URL),   # result backend (needed for chords)
+    include=["src.tasks"],
 )
 
 celery_app.conf.update(
@@ -23,6 +38,63 @@ celery_app.conf.update(
     enable_utc=True,
 )
 
+# --- Queues & routing ---
+# CPU-bound OCR batches and latency-sensitive I/O run on separate queues so a
+# long batch can't hold the worker slots that outreach sends need:
+#   ocr       batch / shard validation (pdf2image + tesseract)  → prefork pool
+#   fetch     single-provider validation, mostly HTTP waits      → threads pool
+#   db        coordinators, chord callbacks, bulk DB jobs        → small prefork pool
+#   outreach  email sends                                        → threads pool
+# Pool type and concurrency are chosen per worker on the command line — see
+# the worker-* services in docker-compose.yml.
+CELERY_QUEUES = ("ocr", "fetch", "db", "outreach")
+
+celery_app.conf.update(
+    task_queues=[Queue(name) for name in CELERY_QUEUES],
+    task_default_queue="db",
+    task_routes={
+        "src.celery_app.run_batch_task":               {"queue": "ocr"},
+        "src.celery_app.run_batch_shard_task":         {"queue": "ocr"},
+        "src.celery_app.run_batch_sharded_task":       {"queue": "db"},
+        "src.celery_app.finalize_sharded_batch_task":  {"queue": "db"},
+        "src.celery_app.validate_provider_task":       {"queue": "fetch"},
+        "src.celery_app.send_outreach_task":           {"queue": "outreach"},
+        "src.celery_app.dispatch_outreach_task":       {"queue": "outreach"},
+        "src.celery_app.drain_outreach_outbox_task":   {"queue": "outreach"},
+        "src.celery_app.outreach_wave_task":           {"queue": "db"},
+        "src.celery_app.consume_webhook_inbox_task":   {"queue": "db"},
+        "src.celery_app.prune_webhook_tables_task":    {"queue": "db"},
+        "src.tasks.run_batch_task":                    {"queue": "ocr"},
+        "send_outreach_task":                          {"queue": "outreach"},   # src/tasks.py
+    },
+    # Batches are long and uneven: take one message at a time and ack only
+    # after it finishes, so a crashed worker's task is redelivered rather
+    # than lost. The redelivery keeps the task id, and jobs.create_job
+    # reopens that job so the run continues from its own checkpoint; if the
+    # first delivery is in fact still running (a batch outlived the
+    # visibility timeout) the copy gets JobBusy and retries after the lease.
+    worker_prefetch_multiplier=int(os.getenv("CELERY_PREFETCH_MULTIPLIER", "1")),
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
+    broker_transport_options={"visibility_timeout": 6 * 3600},
+)
+
+# --- Periodic tasks (run `celery -A src.celery_app beat`) ---
+# The webhook route only stores SendGrid POSTs; the inbox is drained here.
+WEBHOOK_CONSUME_INTERVAL = float(os.getenv("WEBHOOK_CONSUME_INTERVAL", "5"))
+
+celery_app.conf.beat_schedule = {
+    "consume-webhook-inbox": {
+        "task": "src.celery_app.consume_webhook_inbox_task",
+        "schedule": WEBHOOK_CONSUME_INTERVAL,
+        "options": {"expires": WEBHOOK_CONSUME_INTERVAL * 2},
+    },
+    "prune-webhook-tables": {
+        "task": "src.celery_app.prune_webhook_tables_task",
+        "schedule": 3600.0,
+    },
+}
+
 # --- Configure Logging ---
 configure_logging()
 logger = logging.getLogger("celery")
@@ -33,9 +105,15 @@ logger.setLevel(logging.INFO)
 #  TASK 1 — Batch Validation Task with Tracing + Logging
 # -----------------------------------------------------------------------------
 @celery_app.task(bind=True)
-def run_batch_task(self, limit=50, concurrency=6, request_id=None):
-    """Run provider validation batch job with OpenTelemetry tracing."""
+def run_batch_task(self, limit=50, concurrency=6, request_id=None, resume=False,
+                   freshness_hours=None):
+    """
+    Run provider validation batch job with OpenTelemetry tracing.
+    resume=True continues from the checkpoint of the last unfinished job.
+    freshness_hours=0 forces re-validation of unchanged rows.
+    """
     from src.orchestrator import run_batch
+    from src.jobs import JobBusy, JOB_LEASE_SECONDS
 
     adapter = logging.LoggerAdapter(
         logger, {"request_id": request_id or self.request.id}
@@ -51,12 +129,181 @@ def run_batch_task(self, limit=50, concurrency=6, request_id=None):
             "request.id": request_id,
             "limit": limit,
             "concurrency": concurrency,
+            "resume": resume,
         },
     ):
-        asyncio.run(run_batch("data/providers_sample.csv", concurrency))
+        try:
+            stats = asyncio.run(run_batch("data/providers_sample.csv", concurrency, limit=limit,
+                                          job_id=self.request.id, resume=resume,
+                                          freshness_hours=freshness_hours))
+        except JobBusy as exc:
+            raise self.retry(exc=exc, countdown=JOB_LEASE_SECONDS)
 
     adapter.info("batch_task_complete", extra={"task_id": self.request.id})
-    return {"status": "completed", "limit": limit, "concurrency": concurrency}
+    return {"status": "completed", "limit": limit, "concurrency": concurrency,
+            "resume": resume, "stats": stats}
+
+
+# -----------------------------------------------------------------------------
+#  TASK 1b — Sharded Batch: fan out row ranges, aggregate in a chord callback
+# -----------------------------------------------------------------------------
+BATCH_CSV_PATH = "data/providers_sample.csv"
+SHARD_EXPORT_DIR = "data/shards"
+
+
+@celery_app.task(bind=True)
+def run_batch_sharded_task(self, shards=4, concurrency=6, limit=None, request_id=None,
+                           resume=False, freshness_hours=None, csv_path=BATCH_CSV_PATH):
+    """
+    Split one batch into `shards` row ranges and run them as separate tasks,
+    so a single large CSV uses every worker instead of one process.
+
+    Shard i runs as job "<task_id>:<i>" (so resume works per shard) and
+    exports to data/shards/<task_id>/part-<i>.csv; finalize_sharded_batch_task
+    merges the parts and aggregates the stats once all shards finish. If a
+    shard fails the chord callback doesn't run — re-dispatch with resume=True
+    and finished shards skip straight past their checkpoints.
+    """
+    from src.orchestrator import plan_shards
+    from src import jobs
+    from src.db import init_db
+
+    parent_id = self.request.id
+    adapter = logging.LoggerAdapter(logger, {"request_id": request_id or parent_id})
+
+    init_db()
+    ranges = plan_shards(csv_path, shards, limit)
+    try:
+        parent = jobs.create_job(
+            parent_id, csv_path, jobs.file_sha256(csv_path),
+            params={"shards": len(ranges), "concurrency": concurrency, "limit": limit,
+                    "resume": resume, "freshness_hours": freshness_hours},
+            kind="batch-sharded",
+        )
+    except jobs.JobBusy as exc:
+        raise self.retry(exc=exc, countdown=jobs.JOB_LEASE_SECONDS)
+    if parent["status"] != "running":
+        return {"status": parent["status"], "job_id": parent_id, "shards": len(ranges),
+                "ranges": ranges}
+
+    header = [
+        run_batch_shard_task.s(
+            csv_path, start, end, f"{parent_id}:{i}",
+            os.path.join(SHARD_EXPORT_DIR, parent_id, f"part-{i:04d}.csv"),
+            concurrency=concurrency, resume=resume, freshness_hours=freshness_hours,
+        )
+        for i, (start, end) in enumerate(ranges)
+    ]
+    chord(header)(finalize_sharded_batch_task.s(parent_id))
+
+    adapter.info("batch_sharded_dispatched", extra={"task_id": parent_id})
+    return {"status": "dispatched", "job_id": parent_id, "shards": len(ranges),
+            "ranges": ranges}
+
+
+@celery_app.task(bind=True)
+def run_batch_shard_task(self, csv_path, start, end, job_id, export_path,
+                         concurrency=6, resume=False, freshness_hours=None):
+    """Validate data rows [start, end) of csv_path as its own batch job."""
+    from src.orchestrator import run_batch
+    from src.jobs import JobBusy, JOB_LEASE_SECONDS
+
+    with tracer.start_as_current_span(
+        "run_batch_shard_task",
+        attributes={"task.id": self.request.id, "job.id": job_id,
+                    "shard.start": start, "shard.end": end},
+    ):
+        try:
+            stats = asyncio.run(run_batch(
+                csv_path, concurrency, job_id=job_id, resume=resume,
+                freshness_hours=freshness_hours, row_range=(start, end),
+                export_path=export_path, kind="batch-shard",
+            ))
+        except JobBusy as exc:
+            raise self.retry(exc=exc, countdown=JOB_LEASE_SECONDS)
+    return {"job_id": job_id, "range": [start, end], "export_path": export_path, "stats": stats}
+
+
+@celery_app.task(bind=True)
+def finalize_sharded_batch_task(self, shard_results, parent_id):
+    """Chord callback: merge shard exports, sum counters, close the parent job."""
+    from src.orchestrator import merge_exports
+    from src.progress import BatchProgress
+    from src import jobs
+
+    shard_results = sorted(shard_results, key=lambda r: r["range"][0])
+    merge_exports([r["export_path"] for r in shard_results])
+
+    progress = BatchProgress(parent_id, total=sum(r["range"][1] - r["range"][0] for r in shard_results))
+    # shards run in parallel, so the batch took as long as its slowest shard
+    progress.started_at -= max((r["stats"].get("elapsed_seconds", 0) for r in shard_results), default=0)
+    for r in shard_results:
+        progress.incr(**{k: r["stats"].get(k, 0) for k in BatchProgress.COUNTERS})
+    progress.finish("completed")
+
+    stats = {**progress.snapshot(), "shards": len(shard_results)}
+    jobs.finish_job(parent_id, "completed", stats)
+    logger.info("batch_sharded_complete", extra={"task_id": parent_id})
+    return stats
+
+
+# -----------------------------------------------------------------------------
+#  TASK 1c — Single-provider validation (edits, webhooks)
+# -----------------------------------------------------------------------------
+# Repeated triggers for the same unchanged provider within this window run once
+VALIDATE_DEDUPE_SECONDS = float(os.getenv("VALIDATE_DEDUPE_SECONDS", "300"))
+
+
+@celery_app.task(bind=True)
+def validate_provider_task(self, provider, request_id=None, dedupe_seconds=None, force=False):
+    """
+    Run the agent chain for one provider record (same shape as a CSV row;
+    `id` is the source id) and upsert the result.
+
+    The idempotency key is the row fingerprint, so while one run for this
+    exact content is in flight or finished within `dedupe_seconds`, further
+    triggers return {"status": "duplicate"} without doing any work. A failed
+    run releases its key so a retry isn't swallowed. force=True skips the check.
+    """
+    from src.orchestrator import build_agents, validate_row
+    from src.fingerprint import row_fingerprint
+    from src.db import init_db, insert_providers_bulk
+    from src import idempotency
+
+    task_id = self.request.id
+    adapter = logging.LoggerAdapter(logger, {"request_id": request_id or task_id})
+
+    row = dict(provider)
+    if row.get("id") is None:
+        raise ValueError("provider payload needs an 'id' (source id)")
+    row["_fingerprint"] = row_fingerprint(row)
+    key = f"validate-provider:{row['id']}:{row['_fingerprint']}"
+    window = VALIDATE_DEDUPE_SECONDS if dedupe_seconds is None else dedupe_seconds
+
+    if not force and not idempotency.claim(key, window):
+        adapter.info("validate_provider_duplicate", extra={"task_id": task_id, "provider_id": row["id"]})
+        return {"status": "duplicate", "provider_id": row["id"], "fingerprint": row["_fingerprint"]}
+
+    with tracer.start_as_current_span(
+        "validate_provider_task",
+        attributes={"task.id": task_id, "request.id": request_id, "provider.id": str(row["id"])},
+    ):
+        try:
+            init_db()
+            insert_row, profile = asyncio.run(validate_row(build_agents(), row))
+            insert_providers_bulk([insert_row])
+        except Exception:
+            idempotency.release(key)
+            raise
+
+    adapter.info("validate_provider_complete", extra={"task_id": task_id, "provider_id": row["id"]})
+    return {
+        "status":      "validated",
+        "provider_id": row["id"],
+        "fingerprint": row["_fingerprint"],
+        "confidence":  insert_row["confidence"],
+        "db_status":   insert_row["status"],
+    }
 
 
 # -----------------------------------------------------------------------------
@@ -89,10 +336,192 @@ def send_outreach_task(self, provider_payload, request_id=None):
         )
 
 
+# -----------------------------------------------------------------------------
+#  TASK 3 — Outreach wave: drafts → outbox → async rate-limited dispatcher
+# -----------------------------------------------------------------------------
+@celery_app.task(bind=True)
+def dispatch_outreach_task(self, providers, campaign_id=None, request_id=None, rate=None,
+                           concurrency=None):
+    """
+    Draft outreach for `providers`, queue the drafts in outreach_outbox under
+    `campaign_id` (default: this task's id) and drain that campaign.
+
+    Drafts are persisted before anything is sent, so a crashed wave can be
+    finished by drain_outreach_outbox_task, and a provider already queued
+    in the campaign is not queued again.
+    """
+    from src.agents.outreach_agent import OutreachAgent
+    from src.email_sender import draft_to_message
+    from src.outbox import SqlOutbox
+    from src.db import init_db
+
+    task_id = self.request.id
+    campaign_id = campaign_id or task_id
+    init_db()
+
+    with tracer.start_as_current_span(
+        "dispatch_outreach_task",
+        attributes={"task.id": task_id, "request.id": request_id, "providers": len(providers),
+                    "campaign.id": campaign_id},
+    ):
+        drafts = OutreachAgent(name="outreach_agent").iter_drafts(providers)
+        messages = [m for m in map(draft_to_message, drafts) if m]
+        queued = SqlOutbox(campaign_id).add(messages)
+
+    stats = drain_outreach_outbox_task.run(campaign_id, request_id=request_id, rate=rate,
+                                           concurrency=concurrency)
+    return {**stats, "drafted": len(messages), "queued": queued}
+
+
+@celery_app.task(bind=True)
+def outreach_wave_task(self, campaign_id=None, workers=4, resume=False, dispatch=False,
+                       request_id=None):
+    """
+    Draft + queue outreach for the full flagged provider set (see
+    src/outreach_wave.py), then optionally hand the campaign to the senders.
+    Progress: GET /outreach/jobs/<task_id> or /batches/<task_id>/events.
+    """
+    from src.outreach_wave import run_outreach_wave
+    from src.jobs import JobBusy, JOB_LEASE_SECONDS
+
+    task_id = self.request.id
+    adapter = logging.LoggerAdapter(logger, {"request_id": request_id or task_id})
+
+    with tracer.start_as_current_span(
+        "outreach_wave_task",
+        attributes={"task.id": task_id, "campaign.id": campaign_id or task_id, "workers": workers},
+    ):
+        try:
+            stats = asyncio.run(run_outreach_wave(task_id, campaign_id, workers=workers, resume=resume))
+        except JobBusy as exc:
+            raise self.retry(exc=exc, countdown=JOB_LEASE_SECONDS)
+
+    if dispatch and stats["written"]:
+        stats["dispatch_task_id"] = drain_outreach_outbox_task.delay(stats["campaign_id"]).id
+    adapter.info("outreach_wave_complete", extra={"task_id": task_id, "queued": stats["written"]})
+    return stats
+
+
+@celery_app.task(bind=True)
+def drain_outreach_outbox_task(self, campaign_id=None, request_id=None, rate=None,
+                               concurrency=None, stale_after_seconds=900):
+    """
+    Send everything pending in outreach_outbox (one campaign, or all of them).
+    Safe to run on several workers at once — rows are claimed with SKIP LOCKED.
+    """
+    from src.outbox import SqlOutbox
+    from src.outreach_dispatcher import OutreachDispatcher
+
+    task_id = self.request.id
+    adapter = logging.LoggerAdapter(logger, {"request_id": request_id or task_id})
+
+    outbox = SqlOutbox(campaign_id, worker_id=task_id)
+    outbox.requeue_stale(stale_after_seconds)
+    kwargs = {k: v for k, v in (("rate", rate), ("concurrency", concurrency)) if v is not None}
+
+    with tracer.start_as_current_span(
+        "drain_outreach_outbox_task",
+        attributes={"task.id": task_id, "campaign.id": campaign_id or "*"},
+    ):
+        stats = asyncio.run(OutreachDispatcher(outbox, task_id=campaign_id or task_id, **kwargs).run())
+
+    stats = {**stats, "campaign_id": campaign_id, "outbox": outbox.counts()}
+    adapter.info("drain_outreach_complete", extra={"task_id": task_id, **{
+        k: stats[k] for k in ("sent", "failed", "requests")}})
+    return stats
+
+
+# -----------------------------------------------------------------------------
+#  TASK 4 — SendGrid webhook inbox
+# -----------------------------------------------------------------------------
+@celery_app.task(bind=True)
+def consume_webhook_inbox_task(self, max_rows=50, max_rounds=20):
+    """
+    Drain pending webhook batches, `max_rows` per transaction, until the
+    inbox is empty or `max_rounds` is reached (beat fires again shortly).
+    """
+    from src.webhook_events import consume_inbox, requeue_stale_inbox
+
+    requeue_stale_inbox()
+    totals = {"batches": 0, "events": 0, "duplicates": 0, "applied": 0, "retried": 0, "failed": 0}
+    for _ in range(max_rounds):
+        stats = consume_inbox(max_rows, worker_id=self.request.id)
+        if not stats["batches"]:
+            break
+        for k in totals:
+            totals[k] += stats[k]
+    if totals["batches"]:
+        logger.info("webhook_inbox_consumed", extra={"task_id": self.request.id, **totals})
+    return totals
+
+
+@celery_app.task
+def prune_webhook_tables_task():
+    from src.webhook_events import prune_webhook_tables
+    return prune_webhook_tables()
+
+
+# -----------------------------------------------------------------------------
+#  REMOTE CONTROL — sampling profiler
+# -----------------------------------------------------------------------------
+@control_command(
+    args=[("seconds", float), ("interval", float)],
+    signature="[seconds=10] [interval=0.01]",
+)
+def profile(state, seconds=10.0, interval=None):
+    """
+    Sample the worker's main process and reply with a collapsed-stack profile:
+
+        celery -A src.celery_app control profile seconds=10 -d fetch@host
+
+    Threads-pool workers run their tasks in this process. Prefork children are
+    separate processes, so for those workers this shows the consumer only.
+    The consumer doesn't fetch new messages while it samples, but tasks that
+    are already running keep going. `seconds` is capped at
+    PROFILER_MAX_SECONDS.
+    """
+    from src import profiler
+    if not profiler.PROFILER_ENABLED:
+        return {"error": "profiler disabled (PROFILER_ENABLED=0)"}
+    try:
+        return {"ok": profiler.profile(float(seconds), interval and float(interval))}
+    except profiler.ProfilerBusy as e:
+        return {"error": str(e)}
+
+
+def profile_workers(seconds=10.0, destination=None, interval=None):
+    """Broadcast `profile` and return {worker name: collapsed stacks or error}."""
+    replies = celery_app.control.broadcast(
+        "profile", arguments={"seconds": seconds, "interval": interval},
+        destination=destination, reply=True, timeout=seconds + 10,
+    )
+    return {name: body.get("ok", body.get("error")) for reply in replies for name, body in reply.items()}
+
+
 # -----------------------------------------------------------------------------
 #  METRICS SERVER (Prometheus)
 # -----------------------------------------------------------------------------
 def start_metrics_server(port=8001):
     """Run Prometheus metrics server for Celery worker."""
-    start_http_server(port)
+    registry = metrics_registry()
+    if registry:
+        start_http_server(port, registry=registry)
+    else:
+        start_http_server(port)
     logger.info(f"Prometheus metrics available on port {port}")
+
+
+@worker_ready.connect
+def _serve_worker_metrics(**_):
+    # Agent / batch metrics recorded by tasks are served from the worker's main
+    # process. Prefork pools need PROMETHEUS_MULTIPROC_DIR for the children's
+    # samples to be visible here.
+    port = os.getenv("CELERY_METRICS_PORT")
+    if port:
+        start_metrics_server(int(port))
+
+
+@worker_process_shutdown.connect
+def _mark_metrics_process_dead(pid=None, **_):
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(pid or os.getpid())
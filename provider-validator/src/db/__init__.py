@@ -21,9 +21,10 @@ FILES THAT IMPORT FROM HERE:
 import os
 import json
 import logging
+from datetime import datetime, timedelta, timezone
 from typing import Any, Dict, List, Optional
 
-from sqlalchemy import create_engine, text
+from sqlalchemy import bindparam, create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -104,6 +105,25 @@ def get_engine():
     return engine
 
 
+def db_now(offset_seconds: float = 0.0):
+    """
+    Current UTC time (plus an offset) as a bind parameter for timestamp
+    columns: aware datetime for TIMESTAMPTZ on Postgres, and on SQLite a
+    string that sorts correctly against CURRENT_TIMESTAMP.
+    """
+    ts = datetime.now(timezone.utc) + timedelta(seconds=offset_seconds)
+    return ts if IS_POSTGRES else ts.replace(tzinfo=None).isoformat(sep=" ")
+
+
+# Providers that need outreach: low confidence or any flags. Queries must use
+# this exact text for the planner to match ix_providers_needs_outreach.
+OUTREACH_CONFIDENCE_THRESHOLD = 0.6
+NEEDS_OUTREACH_SQL = (
+    f"(COALESCE(final_confidence, confidence, 0) < {OUTREACH_CONFIDENCE_THRESHOLD} "
+    "OR (flags IS NOT NULL AND flags NOT IN ('', '[]')))"
+)
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # 3. INIT DB — creates all tables if they don't exist
 # ─────────────────────────────────────────────────────────────────────────────
@@ -131,6 +151,8 @@ def init_db():
                     final_confidence FLOAT   DEFAULT 0.0,
                     flags            TEXT    DEFAULT '[]',
                     status           VARCHAR(50) DEFAULT 'pending',
+                    fingerprint      VARCHAR(64),
+                    validated_at     TIMESTAMPTZ,
                     created_at       TIMESTAMPTZ DEFAULT NOW(),
                     updated_at       TIMESTAMPTZ
                 )
@@ -159,6 +181,101 @@ def init_db():
                     created_at           TIMESTAMPTZ DEFAULT NOW()
                 )
             """))
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS batch_jobs (
+                    id               VARCHAR(64) PRIMARY KEY,
+                    kind             VARCHAR(50) DEFAULT 'batch',
+                    input_path       TEXT,
+                    input_hash       VARCHAR(64),
+                    params           TEXT    DEFAULT '{}',
+                    status           VARCHAR(50) DEFAULT 'running',
+                    committed_offset INTEGER DEFAULT 0,
+                    stats            TEXT    DEFAULT '{}',
+                    error            TEXT,
+                    resumed_from     VARCHAR(64),
+                    created_at       TIMESTAMPTZ DEFAULT NOW(),
+                    updated_at       TIMESTAMPTZ DEFAULT NOW()
+                )
+            """))
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS outreach_outbox (
+                    id            SERIAL PRIMARY KEY,
+                    campaign_id   VARCHAR(64) NOT NULL,
+                    provider_id   INTEGER,
+                    recipient     VARCHAR(255) NOT NULL,
+                    subject       TEXT,
+                    body          TEXT,
+                    substitutions TEXT    DEFAULT '{}',
+                    state         VARCHAR(20) DEFAULT 'pending',
+                    attempts      INTEGER DEFAULT 0,
+                    available_at  TIMESTAMPTZ DEFAULT NOW(),
+                    claimed_by    VARCHAR(64),
+                    claimed_at    TIMESTAMPTZ,
+                    message_id    TEXT,
+                    error         TEXT,
+                    created_at    TIMESTAMPTZ DEFAULT NOW(),
+                    updated_at    TIMESTAMPTZ DEFAULT NOW(),
+                    UNIQUE (campaign_id, provider_id)
+                )
+            """))
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS webhook_inbox (
+                    id           BIGSERIAL PRIMARY KEY,
+                    source       VARCHAR(50) DEFAULT 'sendgrid',
+                    payload      TEXT    NOT NULL,
+                    event_count  INTEGER DEFAULT 0,
+                    state        VARCHAR(20) DEFAULT 'pending',
+                    claimed_by   VARCHAR(64),
+                    claimed_at   TIMESTAMPTZ,
+                    processed_at TIMESTAMPTZ,
+                    error        TEXT,
+                    attempts     INTEGER DEFAULT 0,
+                    available_at TIMESTAMPTZ,
+                    received_at  TIMESTAMPTZ DEFAULT NOW()
+                )
+            """))
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS webhook_event_ids (
+                    sg_event_id VARCHAR(100) PRIMARY KEY,
+                    seen_at     TIMESTAMPTZ DEFAULT NOW()
+                )
+            """))
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS outreach_events (
+                    id              BIGSERIAL,
+                    message_id      VARCHAR(100),
+                    recipient_email VARCHAR(255),
+                    provider_id     INTEGER,
+                    campaign_id     VARCHAR(64),
+                    event           VARCHAR(30) NOT NULL,
+                    event_time      TIMESTAMPTZ NOT NULL,
+                    sg_event_id     VARCHAR(100),
+                    url             TEXT,
+                    received_at     TIMESTAMPTZ DEFAULT NOW(),
+                    PRIMARY KEY (id, event_time)
+                )
+            """))
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS outreach_message_state (
+                    message_id      VARCHAR(100) NOT NULL,
+                    recipient_email VARCHAR(255) NOT NULL,
+                    provider_id     INTEGER,
+                    campaign_id     VARCHAR(64),
+                    state           VARCHAR(20) NOT NULL,
+                    state_rank      SMALLINT DEFAULT 0,
+                    sent_at         TIMESTAMPTZ,
+                    delivered_at    TIMESTAMPTZ,
+                    opened_at       TIMESTAMPTZ,
+                    clicked_at      TIMESTAMPTZ,
+                    bounced_at      TIMESTAMPTZ,
+                    complained_at   TIMESTAMPTZ,
+                    unsubscribed_at TIMESTAMPTZ,
+                    last_event      VARCHAR(30),
+                    last_event_time TIMESTAMPTZ,
+                    event_count     INTEGER DEFAULT 0,
+                    PRIMARY KEY (message_id, recipient_email)
+                )
+            """))
         else:
             # SQLite DDL
             conn.execute(text("""
@@ -177,6 +294,8 @@ def init_db():
                     final_confidence REAL    DEFAULT 0.0,
                     flags            TEXT    DEFAULT '[]',
                     status           TEXT    DEFAULT 'pending',
+                    fingerprint      TEXT,
+                    validated_at     DATETIME,
                     created_at       DATETIME DEFAULT CURRENT_TIMESTAMP,
                     updated_at       DATETIME
                 )
@@ -205,10 +324,170 @@ def init_db():
                     created_at           DATETIME DEFAULT CURRENT_TIMESTAMP
                 )
             """))
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS batch_jobs (
+                    id               TEXT PRIMARY KEY,
+                    kind             TEXT    DEFAULT 'batch',
+                    input_path       TEXT,
+                    input_hash       TEXT,
+                    params           TEXT    DEFAULT '{}',
+                    status           TEXT    DEFAULT 'running',
+                    committed_offset INTEGER DEFAULT 0,
+                    stats            TEXT    DEFAULT '{}',
+                    error            TEXT,
+                    resumed_from     TEXT,
+                    created_at       DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    updated_at       DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            """))
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS outreach_outbox (
+                    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+                    campaign_id   TEXT    NOT NULL,
+                    provider_id   INTEGER,
+                    recipient     TEXT    NOT NULL,
+                    subject       TEXT,
+                    body          TEXT,
+                    substitutions TEXT    DEFAULT '{}',
+                    state         TEXT    DEFAULT 'pending',
+                    attempts      INTEGER DEFAULT 0,
+                    available_at  DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    claimed_by    TEXT,
+                    claimed_at    DATETIME,
+                    message_id    TEXT,
+                    error         TEXT,
+                    created_at    DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    updated_at    DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE (campaign_id, provider_id)
+                )
+            """))
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS webhook_inbox (
+                    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+                    source       TEXT    DEFAULT 'sendgrid',
+                    payload      TEXT    NOT NULL,
+                    event_count  INTEGER DEFAULT 0,
+                    state        TEXT    DEFAULT 'pending',
+                    claimed_by   TEXT,
+                    claimed_at   DATETIME,
+                    processed_at DATETIME,
+                    error        TEXT,
+                    attempts     INTEGER DEFAULT 0,
+                    available_at DATETIME,
+                    received_at  DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            """))
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS webhook_event_ids (
+                    sg_event_id TEXT PRIMARY KEY,
+                    seen_at     DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            """))
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS outreach_events (
+                    id              INTEGER PRIMARY KEY AUTOINCREMENT,
+                    message_id      TEXT,
+                    recipient_email TEXT,
+                    provider_id     INTEGER,
+                    campaign_id     TEXT,
+                    event           TEXT NOT NULL,
+                    event_time      DATETIME NOT NULL,
+                    sg_event_id     TEXT,
+                    url             TEXT,
+                    received_at     DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            """))
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS outreach_message_state (
+                    message_id      TEXT NOT NULL,
+                    recipient_email TEXT NOT NULL,
+                    provider_id     INTEGER,
+                    campaign_id     TEXT,
+                    state           TEXT NOT NULL,
+                    state_rank      INTEGER DEFAULT 0,
+                    sent_at         DATETIME,
+                    delivered_at    DATETIME,
+                    opened_at       DATETIME,
+                    clicked_at      DATETIME,
+                    bounced_at      DATETIME,
+                    complained_at   DATETIME,
+                    unsubscribed_at DATETIME,
+                    last_event      TEXT,
+                    last_event_time DATETIME,
+                    event_count     INTEGER DEFAULT 0,
+                    PRIMARY KEY (message_id, recipient_email)
+                )
+            """))
+
+        # Partial index over just the providers an outreach wave targets, so
+        # the wave can page through them by id without scanning the table
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_providers_needs_outreach "
+            f"ON providers (id) WHERE {NEEDS_OUTREACH_SQL}"
+        ))
+
+        # Webhook events are matched to log rows by recipient (+ message id);
+        # verification marks the newest row per provider
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_outreach_logs_recipient "
+            "ON outreach_logs (recipient_email, provider_response_id, id)"
+        ))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_outreach_logs_provider "
+            "ON outreach_logs (provider_id, id)"
+        ))
+
+        # Webhook consumer drains pending inbox batches in arrival order;
+        # pruning walks the dedupe table by age
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_webhook_inbox_state ON webhook_inbox (state, id)"
+        ))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_webhook_event_ids_seen ON webhook_event_ids (seen_at)"
+        ))
+
+        # Event history is read per message and pruned / partitioned by time;
+        # the funnel aggregates the state table per campaign
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_outreach_events_message "
+            "ON outreach_events (message_id, event_time)"
+        ))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_outreach_events_time ON outreach_events (event_time)"
+        ))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_outreach_message_state_campaign "
+            "ON outreach_message_state (campaign_id, state)"
+        ))
+
+        # Senders claim pending rows in id order, filtered by readiness
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_outreach_outbox_claim "
+            "ON outreach_outbox (state, available_at, id)"
+        ))
+
+        # Tables created by older versions miss columns added since —
+        # CREATE TABLE IF NOT EXISTS won't touch them, so add them here.
+        _add_missing_columns(conn, "providers", {
+            "fingerprint":  "VARCHAR(64)" if IS_POSTGRES else "TEXT",
+            "validated_at": "TIMESTAMPTZ" if IS_POSTGRES else "DATETIME",
+        })
+        _add_missing_columns(conn, "webhook_inbox", {
+            "attempts":     "INTEGER DEFAULT 0",
+            "available_at": "TIMESTAMPTZ" if IS_POSTGRES else "DATETIME",
+        })
 
     print(f"[db] ✅ Tables verified OK  ({'PostgreSQL' if IS_POSTGRES else 'SQLite'})")
 
 
+def _add_missing_columns(conn, table: str, columns: Dict[str, str]):
+    existing = {c["name"] for c in inspect(conn).get_columns(table)}
+    for name, ddl_type in columns.items():
+        if name not in existing:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl_type}"))
+            logger.info(f"[db] added column {table}.{name}")
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # 4. fetch_all — raw SQL query → list of dicts
 # ─────────────────────────────────────────────────────────────────────────────
@@ -251,22 +530,40 @@ def fetch_all(query: str, *params) -> List[Dict[str, Any]]:
 # ─────────────────────────────────────────────────────────────────────────────
 # 5. insert_provider — UPSERT a provider record
 # ─────────────────────────────────────────────────────────────────────────────
-def insert_provider(row: Dict[str, Any]) -> Optional[int]:
-    """
-    Insert or UPDATE a provider record.
+_PROVIDER_UPSERT_SQL = """
+    INSERT INTO providers
+        (source_id, name, npi, phone, address, website, email,
+         specialty, source_json, confidence, final_confidence, flags, status,
+         fingerprint, validated_at)
+    VALUES
+        (:source_id, :name, :npi, :phone, :address, :website, :email,
+         :specialty, :source_json, :confidence, :final_confidence, :flags, :status,
+         :fingerprint, :validated_at)
+    ON CONFLICT (source_id) DO UPDATE SET
+        name             = excluded.name,
+        npi              = excluded.npi,
+        phone            = excluded.phone,
+        address          = excluded.address,
+        website          = excluded.website,
+        email            = excluded.email,
+        specialty        = excluded.specialty,
+        source_json      = excluded.source_json,
+        confidence       = excluded.confidence,
+        final_confidence = excluded.final_confidence,
+        flags            = excluded.flags,
+        status           = excluded.status,
+        fingerprint      = excluded.fingerprint,
+        validated_at     = excluded.validated_at
+"""
+# Postgres also stamps updated_at (the SQLite column has no trigger either way)
+_PROVIDER_UPSERT_PG_SQL = _PROVIDER_UPSERT_SQL + ",\n        updated_at       = NOW()\n"
 
-    KEY FEATURE — UPSERT on source_id:
-      If a record with the same source_id already exists, it is UPDATED
-      rather than creating a duplicate. This means re-running the
-      orchestrator is safe — it refreshes data instead of duplicating it.
 
-    This is the function called by src/orchestrator.py after processing
-    each row through the agent pipeline.
-    """
+def _provider_params(row: Dict[str, Any]) -> Dict[str, Any]:
     flags_raw = row.get("flags", "[]")
     flags_str = flags_raw if isinstance(flags_raw, str) else json.dumps(flags_raw)
 
-    params = {
+    return {
         "source_id":        row.get("source_id"),
         "name":             str(row.get("name") or ""),
         "npi":              str(row.get("npi") or ""),
@@ -280,63 +577,103 @@ def insert_provider(row: Dict[str, Any]) -> Optional[int]:
         "final_confidence": float(row.get("final_confidence") or row.get("confidence") or 0.0),
         "flags":            flags_str,
         "status":           str(row.get("status") or "pending"),
+        "fingerprint":      row.get("fingerprint"),
+        "validated_at":     row.get("validated_at") or datetime.now(timezone.utc).isoformat(),
     }
 
+
+def insert_provider(row: Dict[str, Any]) -> Optional[int]:
+    """
+    Insert or UPDATE a provider record.
+
+    KEY FEATURE — UPSERT on source_id:
+      If a record with the same source_id already exists, it is UPDATED
+      rather than creating a duplicate. This means re-running the
+      orchestrator is safe — it refreshes data instead of duplicating it.
+
+    For many rows at once use insert_providers_bulk() — one transaction
+    and one executemany instead of a commit per row.
+    """
+    params = _provider_params(row)
+
     try:
         with engine.begin() as conn:
             if IS_POSTGRES:
-                result = conn.execute(text("""
-                    INSERT INTO providers
-                        (source_id, name, npi, phone, address, website, email,
-                         specialty, source_json, confidence, final_confidence, flags, status)
-                    VALUES
-                        (:source_id, :name, :npi, :phone, :address, :website, :email,
-                         :specialty, :source_json, :confidence, :final_confidence, :flags, :status)
-                    ON CONFLICT (source_id) DO UPDATE SET
-                        name             = EXCLUDED.name,
-                        npi              = EXCLUDED.npi,
-                        phone            = EXCLUDED.phone,
-                        address          = EXCLUDED.address,
-                        website          = EXCLUDED.website,
-                        email            = EXCLUDED.email,
-                        specialty        = EXCLUDED.specialty,
-                        source_json      = EXCLUDED.source_json,
-                        confidence       = EXCLUDED.confidence,
-                        final_confidence = EXCLUDED.final_confidence,
-                        flags            = EXCLUDED.flags,
-                        status           = EXCLUDED.status,
-                        updated_at       = NOW()
-                    RETURNING id
-                """), params)
+                result = conn.execute(text(_PROVIDER_UPSERT_PG_SQL + " RETURNING id"), params)
                 return result.scalar()
             else:
-                result = conn.execute(text("""
-                    INSERT INTO providers
-                        (source_id, name, npi, phone, address, website, email,
-                         specialty, source_json, confidence, final_confidence, flags, status)
-                    VALUES
-                        (:source_id, :name, :npi, :phone, :address, :website, :email,
-                         :specialty, :source_json, :confidence, :final_confidence, :flags, :status)
-                    ON CONFLICT(source_id) DO UPDATE SET
-                        name             = excluded.name,
-                        npi              = excluded.npi,
-                        phone            = excluded.phone,
-                        address          = excluded.address,
-                        website          = excluded.website,
-                        email            = excluded.email,
-                        specialty        = excluded.specialty,
-                        source_json      = excluded.source_json,
-                        confidence       = excluded.confidence,
-                        final_confidence = excluded.final_confidence,
-                        flags            = excluded.flags,
-                        status           = excluded.status
-                """), params)
+                result = conn.execute(text(_PROVIDER_UPSERT_SQL), params)
                 return result.lastrowid
     except Exception as e:
         logger.error(f"[db] insert_provider failed source_id={params.get('source_id')}: {e}")
         raise
 
 
+def insert_providers_bulk(rows: List[Dict[str, Any]], conn=None) -> int:
+    """
+    UPSERT many provider records with a single executemany.
+
+    Pass `conn` to join an existing transaction (the orchestrator writes its
+    batch checkpoint in the same transaction as the rows it covers);
+    otherwise a transaction is opened and committed here.
+    Returns the number of rows written.
+    """
+    if not rows:
+        return 0
+    params = [_provider_params(r) for r in rows]
+    sql    = text(_PROVIDER_UPSERT_PG_SQL if IS_POSTGRES else _PROVIDER_UPSERT_SQL)
+
+    if conn is not None:
+        conn.execute(sql, params)
+        return len(params)
+    try:
+        with engine.begin() as own_conn:
+            own_conn.execute(sql, params)
+        return len(params)
+    except Exception as e:
+        logger.error(f"[db] insert_providers_bulk failed ({len(params)} rows): {e}")
+        raise
+
+
+def fetch_fingerprints(source_ids: List[Any]) -> Dict[Any, Dict[str, Any]]:
+    """
+    {source_id: {"fingerprint": ..., "validated_at": datetime|None}} for the
+    given ids — one indexed query per chunk, used to skip unchanged rows.
+    """
+    if not source_ids:
+        return {}
+    params = {f"s{i}": sid for i, sid in enumerate(source_ids)}
+    placeholders = ", ".join(f":{k}" for k in params)
+    with engine.connect() as conn:
+        rows = conn.execute(text(
+            f"SELECT source_id, fingerprint, validated_at FROM providers "
+            f"WHERE source_id IN ({placeholders})"
+        ), params).fetchall()
+    out = {}
+    for source_id, fp, validated_at in rows:
+        if isinstance(validated_at, str):
+            try:
+                validated_at = datetime.fromisoformat(validated_at)
+            except ValueError:
+                validated_at = None
+        if validated_at is not None and validated_at.tzinfo is not None:
+            # TIMESTAMPTZ → naive UTC, to compare with utcnow()
+            validated_at = validated_at.astimezone(timezone.utc).replace(tzinfo=None)
+        out[source_id] = {"fingerprint": fp, "validated_at": validated_at}
+    return out
+
+
+def fetch_source_json(source_ids: List[Any]) -> Dict[Any, str]:
+    """{source_id: source_json} — the stored agent results, for rows skipped as fresh."""
+    if not source_ids:
+        return {}
+    with engine.connect() as conn:
+        rows = conn.execute(text(
+            "SELECT source_id, source_json FROM providers WHERE source_id IN :ids"
+        ).bindparams(bindparam("ids", expanding=True)), {"ids": list(source_ids)}).fetchall()
+    return {source_id: source_json for source_id, source_json in rows}
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # 6. Convenience lookup functions
 # ─────────────────────────────────────────────────────────────────────────────
@@ -15,7 +15,7 @@ import logging
 from datetime import datetime
 from typing import Optional
 
-from sqlalchemy import text
+from sqlalchemy import bindparam, text
 from src.db import engine, IS_POSTGRES
 
 logger = logging.getLogger(__name__)
@@ -70,6 +70,44 @@ def mark_provider_verified(provider_id: int, source: str = "manual") -> bool:
         return False
 
 
+# ─────────────────────────────────────────────────────────────────────────────
+# mark_providers_verified_bulk
+# ─────────────────────────────────────────────────────────────────────────────
+def mark_providers_verified_bulk(provider_ids: list, source: str = "manual", conn=None) -> int:
+    """
+    Set-based mark_provider_verified: the most recent outreach log row of
+    every provider in provider_ids becomes 'verified' in a single UPDATE.
+    Pass `conn` to join a caller's transaction. Returns the rows updated.
+    """
+    if not provider_ids:
+        return 0
+    stmt = text("""
+        UPDATE outreach_logs
+        SET send_status          = 'verified',
+            provider_response_id = :source,
+            send_time            = :ts
+        WHERE id IN (
+            SELECT MAX(id) FROM outreach_logs
+            WHERE provider_id IN :pids
+            GROUP BY provider_id
+        )
+    """).bindparams(bindparam("pids", expanding=True))
+    params = {"source": source, "ts": datetime.utcnow().isoformat(), "pids": list(provider_ids)}
+    try:
+        if conn is not None:
+            updated = conn.execute(stmt, params).rowcount
+        else:
+            with engine.begin() as c:
+                updated = c.execute(stmt, params).rowcount
+        logger.info(f"[dbutils] {updated} providers verified via '{source}'")
+        return updated
+    except Exception as e:
+        logger.error(f"[dbutils] mark_providers_verified_bulk failed: {e}")
+        if conn is not None:
+            raise
+        return 0
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # get_provider_outreach_status
 # ─────────────────────────────────────────────────────────────────────────────
@@ -167,4 +205,47 @@ def log_outreach(data: dict) -> bool:
         return True
     except Exception as e:
         logger.error(f"[dbutils] log_outreach failed: {e}")
-        return False
\ No newline at end of file
+        return False
+
+# ─────────────────────────────────────────────────────────────────────────────
+# log_outreach_bulk
+# ─────────────────────────────────────────────────────────────────────────────
+def log_outreach_bulk(rows: list, conn=None) -> int:
+    """
+    Insert many outreach_logs rows in one executemany round trip.
+
+    Same keys as log_outreach, plus optional provider_response_id (the
+    SendGrid X-Message-Id). Pass `conn` to join a caller's transaction.
+    Returns the number of rows written (0 on failure).
+    """
+    if not rows:
+        return 0
+    now = datetime.utcnow().isoformat()
+    params = [{
+        "provider_id":          r.get("provider_id"),
+        "subject":              r.get("subject"),
+        "body":                 r.get("body"),
+        "recipient_email":      r.get("recipient_email"),
+        "send_status":          r.get("send_status"),
+        "send_time":            r.get("send_time", now),
+        "provider_response_id": r.get("provider_response_id"),
+        "task_id":              r.get("task_id"),
+    } for r in rows]
+    stmt = text("""
+        INSERT INTO outreach_logs
+            (provider_id, subject, body, recipient_email,
+             send_status, send_time, provider_response_id, task_id)
+        VALUES
+            (:provider_id, :subject, :body, :recipient_email,
+             :send_status, :send_time, :provider_response_id, :task_id)
+    """)
+    try:
+        if conn is not None:
+            conn.execute(stmt, params)
+        else:
+            with engine.begin() as c:
+                c.execute(stmt, params)
+        return len(params)
+    except Exception as e:
+        logger.error(f"[dbutils] log_outreach_bulk failed ({len(params)} rows): {e}")
+        return 0
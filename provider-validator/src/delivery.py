@@ -0,0 +1,211 @@
+# src/delivery.py
+"""
+Batched SendGrid delivery.
+
+send_email_sendgrid used to build a new SendGridAPIClient and make one
+HTTPS request per email, then open a DB connection per log row. This
+module sends outreach waves the cheap way:
+
+  • one requests.Session per process (keep-alive connection pool)
+  • recipients packed into the `personalizations` array of a single
+    /v3/mail/send request — up to SENDGRID_BATCH_SIZE (SendGrid's limit
+    is 1000) per request. Messages that share a body template go in one
+    request, and per-recipient values go in `substitutions`.
+  • a token-bucket limit of OUTREACH_SEND_RATE emails/sec across the process
+  • one executemany into outreach_logs per request, tagged with SendGrid's
+    X-Message-Id so delivery webhooks can be matched back
+
+SENDGRID_API_URL points the engine at a local stand-in in tests/benchmarks.
+
+A message is a dict:
+  provider_id, recipient, subject, body   body may contain substitution tags
+  substitutions (optional)                {"-tag-": value} for this recipient
+"""
+
+import os
+import time
+import logging
+import datetime
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from src.dbutils import log_outreach_bulk
+from src.outreach_events import record_sent
+
+logger = logging.getLogger(__name__)
+
+SENDGRID_API_URL    = os.getenv("SENDGRID_API_URL", "https://api.sendgrid.com/v3/mail/send")
+SENDGRID_BATCH_SIZE = min(int(os.getenv("SENDGRID_BATCH_SIZE", "1000")), 1000)
+OUTREACH_SEND_RATE  = float(os.getenv("OUTREACH_SEND_RATE", "100"))     # emails / second
+HTTP_POOL_SIZE      = int(os.getenv("SENDGRID_POOL_SIZE", "10"))
+
+
+class RateLimiter:
+    """Blocking token bucket: `rate` tokens/sec, bursts up to `burst` tokens."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate   = rate
+        self.burst  = burst if burst is not None else max(rate, 1.0)
+        self.tokens = self.burst
+        self._stamp = time.monotonic()
+        self._lock  = threading.Lock()
+
+    def acquire(self, n: float = 1.0):
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            # Take the tokens now (going negative) and sleep off the debt, so a
+            # batch bigger than the bucket still goes out at exactly `rate`.
+            self.tokens -= n
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+
+
+def _make_session(pool_size: int = HTTP_POOL_SIZE) -> requests.Session:
+    session = requests.Session()
+    # POST /v3/mail/send is not idempotent: only retry when SendGrid cannot
+    # have accepted anything — a 429 (Retry-After honoured) or a connection
+    # that failed before the request went out. Read errors and 5xx may follow
+    # a partial accept, so they go back to the caller and are not resent.
+    retry = Retry(total=3, connect=3, read=0, other=0, status=3, backoff_factor=1.0,
+                  status_forcelist=(429,), allowed_methods=frozenset({"POST"}),
+                  respect_retry_after_header=True, raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _render(body: str, substitutions: Optional[Dict[str, str]]) -> str:
+    for tag, value in (substitutions or {}).items():
+        body = body.replace(tag, str(value))
+    return body
+
+
+def iter_batches(messages: Iterable[Dict[str, Any]], batch_size: int = SENDGRID_BATCH_SIZE):
+    """Group messages by body template and cut each group at batch_size."""
+    batch_size = max(1, min(batch_size, 1000))
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    for msg in messages:
+        group = groups.setdefault(msg["body"], [])
+        group.append(msg)
+        if len(group) >= batch_size:
+            yield groups.pop(msg["body"])
+    yield from (g for g in groups.values() if g)
+
+
+def build_payload(batch: List[Dict[str, Any]], from_email: str,
+                  task_id: Optional[str] = None) -> Dict[str, Any]:
+    """/v3/mail/send body for one batch of messages sharing a body template."""
+    personalizations = []
+    for msg in batch:
+        p = {
+            "to":          [{"email": msg["recipient"]}],
+            "subject":     msg["subject"],
+            "custom_args": {"provider_id": str(msg.get("provider_id") or "")},
+        }
+        if task_id:
+            p["custom_args"]["task_id"] = str(task_id)
+        if msg.get("substitutions"):
+            p["substitutions"] = {k: str(v) for k, v in msg["substitutions"].items()}
+        personalizations.append(p)
+    return {
+        "personalizations": personalizations,
+        "from":             {"email": from_email},
+        # top-level subject is required even though every personalization overrides it
+        "subject":          batch[0]["subject"],
+        "content":          [{"type": "text/html", "value": batch[0]["body"]}],
+    }
+
+
+def log_batch(batch: List[Dict[str, Any]], status: str, message_id: Optional[str],
+              task_id: Optional[str] = None, conn=None) -> int:
+    """One outreach_logs row per message of a delivered (or failed) batch."""
+    sent_at = datetime.datetime.utcnow().isoformat()
+    if status == "sent":
+        record_sent(batch, message_id, sent_at, campaign_id=task_id, conn=conn)
+    return log_outreach_bulk([{
+        "provider_id":          msg.get("provider_id"),
+        "subject":              msg["subject"],
+        "body":                 _render(msg["body"], msg.get("substitutions")),
+        "recipient_email":      msg["recipient"],
+        "send_status":          status,
+        "send_time":            sent_at,
+        "provider_response_id": message_id,
+        "task_id":              task_id,
+    } for msg in batch], conn=conn)
+
+
+class SendGridDelivery:
+    """Reusable delivery engine — create once, call send() per wave."""
+
+    def __init__(self, api_key: str, from_email: str, api_url: str = SENDGRID_API_URL,
+                 batch_size: int = SENDGRID_BATCH_SIZE, rate: float = OUTREACH_SEND_RATE,
+                 session: Optional[requests.Session] = None, timeout: float = 30.0):
+        self.api_key    = api_key
+        self.from_email = from_email
+        self.api_url    = api_url
+        self.batch_size = max(1, min(batch_size, 1000))
+        self.limiter    = RateLimiter(rate)
+        self.session    = session or _make_session()
+        self.timeout    = timeout
+
+    def _post(self, payload: Dict[str, Any]):
+        """Returns (send_status, message_id)."""
+        try:
+            resp = self.session.post(
+                self.api_url, json=payload, timeout=self.timeout,
+                headers={"Authorization": f"Bearer {self.api_key}"},
+            )
+        except requests.RequestException as e:
+            logger.error(f"[delivery] SendGrid request failed: {e}")
+            return f"error:{str(e)[:100]}", None
+        # 202 = accepted; recipients may still be deferred later, which is normal
+        if 200 <= resp.status_code < 300:
+            return "sent", resp.headers.get("X-Message-Id")
+        if resp.status_code == 403:
+            logger.error("[delivery] 403 Forbidden — FROM_EMAIL is not a verified sender in SendGrid")
+        elif resp.status_code == 401:
+            logger.error("[delivery] 401 Unauthorized — SENDGRID_API_KEY is wrong or expired")
+        else:
+            logger.warning(f"[delivery] SendGrid returned {resp.status_code}: {resp.text[:200]}")
+        return f"failed:{resp.status_code}", None
+
+    def send(self, messages: Iterable[Dict[str, Any]], task_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Deliver messages in personalization batches and log every one of them.
+        Returns one {"provider_id", "recipient", "status", "message_id"} per message.
+        """
+        results = []
+        for batch in iter_batches(messages, self.batch_size):
+            self.limiter.acquire(len(batch))
+            status, message_id = self._post(build_payload(batch, self.from_email, task_id))
+            log_batch(batch, status, message_id, task_id)
+            results.extend({"provider_id": msg.get("provider_id"), "recipient": msg["recipient"],
+                            "status": status, "message_id": message_id} for msg in batch)
+            logger.info(f"[delivery] {len(batch)} recipients → {status}")
+        return results
+
+    def close(self):
+        self.session.close()
+
+
+_engine: Optional[SendGridDelivery] = None
+_engine_lock = threading.Lock()
+
+
+def get_delivery(api_key: str, from_email: str) -> SendGridDelivery:
+    """Process-wide engine, so every caller shares one connection pool."""
+    global _engine
+    with _engine_lock:
+        if _engine is None or (_engine.api_key, _engine.from_email) != (api_key, from_email):
+            _engine = SendGridDelivery(api_key, from_email)
+        return _engine
@@ -60,11 +60,8 @@ THE FIX (already applied below):
 """
 
 import os
-import datetime
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail
 from dotenv import load_dotenv
-from src.dbutils import log_outreach   # Centralised DB logging
+from src.delivery import get_delivery   # pooled, batched SendGrid client + bulk logging
 
 load_dotenv()
 
@@ -138,9 +135,18 @@ def build_email_body(provider_name: str, verification_link: str) -> str:
 # CORE SEND FUNCTION
 # ============================================================================
 
-def send_email_sendgrid(draft: dict, task_id: str = None) -> dict:
+# Default template with SendGrid substitution tags instead of per-provider
+# values, so every default-template email in a wave shares one request body.
+_TAG_NAME, _TAG_LINK, _TAG_BODY = "-provider_name-", "-verification_link-", "-body-"
+_DEFAULT_TEMPLATE = build_email_body(_TAG_NAME, _TAG_LINK)
+# SendGrid caps substitutions at 10,000 bytes per personalization
+_MAX_SUBSTITUTED_BODY = 9000
+
+
+def draft_to_message(draft: dict):
     """
-    Send a single outreach email via SendGrid and log the result.
+    Turn an outreach draft into a delivery message (see src/delivery.py),
+    or None if it has no usable recipient.
 
     draft dict must contain:
       provider_id  (int)  — used to build the verification link and for logging
@@ -148,83 +154,56 @@ def send_email_sendgrid(draft: dict, task_id: str = None) -> dict:
       subject      (str)  — email subject line
       name         (str)  — provider name for personalisation (optional)
       body         (str)  — HTML body (optional; if not given, template is built)
-
-    Returns: {'status': 'sent' | 'deferred' | 'bounced' | 'error:...' }
-
-    BUG FIX — Deferred handling:
-      Original code treated any non-2xx status as failure.
-      202 = SendGrid accepted and WILL deliver (may still be deferred by recipient).
-      Deferred is NOT an error — SendGrid retries automatically for 72 hours.
     """
     provider_id = draft.get("provider_id")
-    provider_name = draft.get("name", "Provider")
     recipient = draft.get("recipient", "")
-
     if not recipient or "@" not in recipient:
-        print(f"[WARN] Skipping provider {provider_id} — no valid email: '{recipient}'")
-        return {"status": "skipped:no_email"}
+        return None
 
     # Build verification link
     verification_link = f"{BASE_URL}/verify?provider_id={provider_id}" if provider_id else "#"
+    subject = draft.get("subject", "Please Verify Your Provider Information")
+    message = {"provider_id": provider_id, "recipient": recipient, "subject": subject}
+
+    if not draft.get("body"):
+        message["body"] = _DEFAULT_TEMPLATE
+        message["substitutions"] = {_TAG_NAME: draft.get("name", "Provider"),
+                                    _TAG_LINK: verification_link}
+        return message
 
-    # Use provided body or build from template
-    body = draft.get("body") or build_email_body(provider_name, verification_link)
     # Support legacy {{verification_link}} placeholder if body was pre-built
-    body = body.replace("{{verification_link}}", verification_link)
+    body = draft["body"].replace("{{verification_link}}", verification_link)
+    if len(body.encode("utf-8")) <= _MAX_SUBSTITUTED_BODY:
+        # pre-rendered bodies still batch: the whole body is the substitution
+        message["body"] = _TAG_BODY
+        message["substitutions"] = {_TAG_BODY: body}
+    else:
+        message["body"] = body
+    return message
 
-    subject = draft.get("subject", "Please Verify Your Provider Information")
 
-    message = Mail(
-        from_email=FROM_EMAIL,
-        to_emails=recipient,
-        subject=subject,
-        html_content=body
-    )
+def send_email_sendgrid(draft: dict, task_id: str = None) -> dict:
+    """
+    Send a single outreach email via SendGrid and log the result.
+    See draft_to_message for the draft keys.
 
-    send_status = "unknown"
-    try:
-        sg   = SendGridAPIClient(SENDGRID_API_KEY)
-        resp = sg.send(message)
+    Returns: {'status': 'sent' | 'failed:<code>' | 'error:...' | 'skipped:no_email' }
 
-        # BUG FIX: 202 is the standard SendGrid success response — treat it as sent
-        # The email may still be deferred by the recipient's server; that's normal.
-        if 200 <= resp.status_code < 300:
-            send_status = "sent"
-            print(f"[INFO] ✅ Email queued for {recipient} (provider {provider_id})")
-        else:
-            send_status = f"failed:{resp.status_code}"
-            print(f"[WARN] SendGrid returned {resp.status_code} for {recipient}")
-
-    except Exception as e:
-        error_str = str(e)
-        send_status = f"error:{error_str[:100]}"
-        print(f"[ERROR] Failed to send email to {recipient} (provider {provider_id}): {e}")
-
-        # Detect common setup errors and give helpful guidance
-        if "403" in error_str:
-            print(
-                "[HINT] 403 Forbidden — your FROM_EMAIL is not verified in SendGrid.\n"
-                "       Go to: SendGrid Dashboard → Settings → Sender Authentication\n"
-                "       → Single Sender Verification → verify your email address."
-            )
-        elif "401" in error_str:
-            print(
-                "[HINT] 401 Unauthorized — your SENDGRID_API_KEY is wrong or expired.\n"
-                "       Check: SendGrid Dashboard → Settings → API Keys"
-            )
-
-    # Always log — even failures, so we have a full audit trail
-    log_outreach({
-        "provider_id":    provider_id,
-        "subject":        subject,
-        "body":           body,
-        "recipient_email": recipient,
-        "send_status":    send_status,
-        "send_time":      datetime.datetime.utcnow().isoformat(),
-        "task_id":        task_id,
-    })
-
-    return {"status": send_status}
+    202 = SendGrid accepted and WILL deliver (may still be deferred by the
+    recipient). Deferred is NOT an error — SendGrid retries for 72 hours.
+
+    Goes through the shared delivery engine, so repeated calls reuse one
+    HTTP connection pool. For waves use send_bulk_outreach.
+    """
+    message = draft_to_message(draft)
+    if message is None:
+        print(f"[WARN] Skipping provider {draft.get('provider_id')} — no valid email: '{draft.get('recipient', '')}'")
+        return {"status": "skipped:no_email"}
+
+    result = get_delivery(SENDGRID_API_KEY, FROM_EMAIL).send([message], task_id=task_id)[0]
+    if result["status"] == "sent":
+        print(f"[INFO] ✅ Email queued for {message['recipient']} (provider {message['provider_id']})")
+    return {"status": result["status"], "message_id": result["message_id"]}
 
 
 # ============================================================================
@@ -239,6 +218,9 @@ def send_bulk_outreach(providers: list[dict], task_id: str = None) -> dict:
     Only sends to providers who have a valid email address.
     Skips providers who have already been verified.
 
+    Recipients go out as SendGrid personalization batches (up to 1000 per
+    request) at OUTREACH_SEND_RATE, and outreach_logs is written once per batch.
+
     Returns a summary dict with counts and per-provider results.
     """
     results = {
@@ -249,6 +231,7 @@ def send_bulk_outreach(providers: list[dict], task_id: str = None) -> dict:
         "details":   []
     }
 
+    drafts, messages = [], []
     for provider in providers:
         pid      = provider.get("id") or provider.get("rowid")
         name     = _unwrap(provider.get("name"), f"Provider {pid}")
@@ -261,9 +244,16 @@ def send_bulk_outreach(providers: list[dict], task_id: str = None) -> dict:
             "recipient":   email,
             "subject":     f"Action Required: Please Verify Your {specialty} Practice Information",
         }
+        drafts.append(draft)
+        message = draft_to_message(draft)
+        if message is not None:
+            messages.append(message)
+
+    sent = get_delivery(SENDGRID_API_KEY, FROM_EMAIL).send(messages, task_id=task_id) if messages else []
+    status_by_key = {(r["provider_id"], r["recipient"]): r["status"] for r in sent}
 
-        result = send_email_sendgrid(draft, task_id=task_id)
-        status = result["status"]
+    for draft in drafts:
+        status = status_by_key.get((draft["provider_id"], draft["recipient"]), "skipped:no_email")
 
         if status == "sent":
             results["sent"] += 1
@@ -273,9 +263,9 @@ def send_bulk_outreach(providers: list[dict], task_id: str = None) -> dict:
             results["failed"] += 1
 
         results["details"].append({
-            "id":        pid,
-            "name":      name,
-            "recipient": email,
+            "id":        draft["provider_id"],
+            "name":      draft["name"],
+            "recipient": draft["recipient"],
             "subject":   draft["subject"],
             "status":    status,
         })
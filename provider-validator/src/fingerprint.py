@@ -0,0 +1,64 @@
+# src/fingerprint.py
+"""
+Input-row fingerprints for incremental re-validation.
+
+A fingerprint is a sha256 over the normalized provider fields plus the
+content hash of the referenced scanned PDF. If neither the CSV row nor the
+PDF changed, the fingerprint is identical to last run's and the orchestrator
+can skip the row while its last validation is still fresh.
+"""
+
+import os
+import hashlib
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+# Fields that feed validation. `id` is deliberately excluded — it is the key,
+# not the content.
+FINGERPRINT_FIELDS = ("name", "npi", "phone", "email", "address", "website", "specialty")
+
+# PDFs are shared between rows, so cache their digest by (path, size, mtime)
+_pdf_cache: Dict[Tuple[str, int, int], str] = {}
+_pdf_cache_lock = threading.Lock()
+
+
+def _normalize(value: Any) -> str:
+    return " ".join(str(value or "").split()).lower()
+
+
+def pdf_digest(path: Optional[str]) -> str:
+    """
+    sha256 of a PDF's bytes; '' when the row has no PDF, and "missing:<path>"
+    when the file can't be read — so the fingerprint changes once it appears.
+    """
+    if not path:
+        return ""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return "missing:" + path
+    key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    with _pdf_cache_lock:
+        cached = _pdf_cache.get(key)
+    if cached:
+        return cached
+    h = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+    except OSError:
+        return "missing:" + path
+    digest = h.hexdigest()
+    with _pdf_cache_lock:
+        _pdf_cache[key] = digest
+    return digest
+
+
+def row_fingerprint(row: Dict[str, Any]) -> str:
+    h = hashlib.sha256()
+    for field in FINGERPRINT_FIELDS:
+        h.update(_normalize(row.get(field)).encode("utf-8"))
+        h.update(b"\x1f")
+    h.update(pdf_digest(row.get("scanned_pdf")).encode("utf-8"))   # path may be non-ASCII
+    return h.hexdigest()
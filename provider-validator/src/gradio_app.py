@@ -629,16 +629,15 @@ def send_outreach_emails():
             headers=get_headers(),
             timeout=30
         )
-        if response.status_code == 200:
+        if response.status_code in (200, 202):
             data = response.json()
-            emails_count = data.get("emails_generated", 0)
-            output = f"### 📧 Outreach Emails Generated\n\n**Total Queued:** {emails_count}\n\n"
-            if emails_count == 0:
-                output += "ℹ️ No providers need outreach — all records are above threshold."
-            else:
-                output += "**Email Preview (first 5):**\n\n"
-                for email in data.get("details", [])[:5]:
-                    output += f"---\n**ID:** {email.get('id','N/A')} | **Subject:** {email.get('subject','N/A')} | **To:** {email.get('recipient','N/A')}\n\n"
+            output = "### 📧 Outreach Wave Started\n\n"
+            output += f"**Job ID:** `{data.get('job_id', 'N/A')}`\n\n"
+            output += f"**Campaign:** `{data.get('campaign_id', 'N/A')}`\n\n"
+            output += (
+                "Drafts for every low-confidence / flagged provider are being queued "
+                f"in the outbox. Check progress at `{data.get('status_url', '')}`."
+            )
             return output
         else:
             return f"❌ Error: {response.json().get('detail', 'Unknown error')}"
@@ -0,0 +1,101 @@
+# src/idempotency.py
+"""
+Short-lived idempotency keys.
+
+claim(key, ttl) returns True for the first caller and False for every other
+caller until `ttl` seconds pass or the key is released. validate_provider_task
+uses this to fold repeated triggers for the same provider fingerprint into a
+single run.
+
+Backends follow src/progress.py:
+  redis   → SET key NX EX ttl, shared by all workers
+  memory  → per-process dict with expiry; used when Redis isn't reachable
+
+IDEMPOTENCY_BACKEND=redis|memory forces one. By default Redis is used if it
+answers a ping.
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL           = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+IDEMPOTENCY_BACKEND = os.getenv("IDEMPOTENCY_BACKEND", "auto")
+KEY_PREFIX          = "idem:"
+
+
+class InProcessKeys:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._expires: Dict[str, float] = {}
+
+    def claim(self, key: str, ttl: float) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            if self._expires.get(key, 0) > now:
+                return False
+            self._expires[key] = now + ttl
+            # drop expired keys now and then so the dict doesn't grow forever
+            if len(self._expires) > 10_000:
+                self._expires = {k: t for k, t in self._expires.items() if t > now}
+            return True
+
+    def release(self, key: str):
+        with self._lock:
+            self._expires.pop(key, None)
+
+
+class RedisKeys:
+    def __init__(self, url: str = REDIS_URL):
+        import redis
+        self._client = redis.Redis.from_url(url, socket_connect_timeout=2)
+
+    def claim(self, key: str, ttl: float) -> bool:
+        return bool(self._client.set(KEY_PREFIX + key, "1", nx=True, ex=max(int(ttl), 1)))
+
+    def release(self, key: str):
+        self._client.delete(KEY_PREFIX + key)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Return the process-wide key store (chosen once, on first use)."""
+    global _store
+    if _store is not None:
+        return _store
+    with _store_lock:
+        if _store is None:
+            _store = _make_store()
+    return _store
+
+
+def _make_store():
+    if IDEMPOTENCY_BACKEND == "memory":
+        return InProcessKeys()
+    try:
+        store = RedisKeys()
+        store._client.ping()
+        return store
+    except Exception as e:
+        if IDEMPOTENCY_BACKEND == "redis":
+            raise
+        logger.info(f"[idempotency] Redis unavailable ({e}) — using in-process keys")
+        return InProcessKeys()
+
+
+def claim(key: str, ttl: float) -> bool:
+    return get_store().claim(key, ttl)
+
+
+def release(key: str):
+    try:
+        get_store().release(key)
+    except Exception as e:
+        logger.warning(f"[idempotency] release failed for {key}: {e}")
@@ -0,0 +1,176 @@
+# src/jobs.py
+"""
+Batch job registry.
+
+Every run_batch call is recorded as a row in `batch_jobs`: which file it
+read (path + sha256), the parameters it ran with, and a committed_offset
+checkpoint — the number of input rows whose results are durably in the
+providers table. The checkpoint is written in the SAME transaction as the
+provider rows it covers (see orchestrator flush), so after a crash it
+never points past data that wasn't committed.
+
+Resuming creates a new job that starts from the previous job's checkpoint
+(and records it in resumed_from), as long as the input file hash matches.
+The previous job is marked 'resumed' in the same transaction, so it is
+never picked up again — its work now belongs to the new job.
+
+Celery runs tasks with acks_late, so a task whose worker died is delivered
+again under the SAME id. create_job() therefore takes over an existing row
+instead of inserting a second one: a 'failed' job, or a 'running' one that
+hasn't checkpointed for JOB_LEASE_SECONDS, is reopened and keeps its
+committed_offset. A 'running' job that checkpointed more recently still has
+a live worker (e.g. the broker's visibility timeout redelivered a long
+batch) and raises JobBusy, so the same job never runs twice at once.
+"""
+
+import os
+import json
+import hashlib
+import logging
+from typing import Any, Dict, Optional
+
+from sqlalchemy import text
+from src.db import engine, db_now
+
+logger = logging.getLogger(__name__)
+
+# A running job that hasn't checkpointed for this long has lost its worker.
+# Must be longer than the slowest chunk between two checkpoints.
+JOB_LEASE_SECONDS = float(os.getenv("BATCH_JOB_LEASE_SECONDS", "1800"))
+
+
+class JobBusy(RuntimeError):
+    """The job id belongs to a running job whose worker is still checkpointing."""
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _row_to_job(row) -> Dict[str, Any]:
+    job = dict(row._mapping)
+    for key in ("params", "stats"):
+        try:
+            job[key] = json.loads(job.get(key) or "{}")
+        except (TypeError, ValueError):
+            job[key] = {}
+    return job
+
+
+def create_job(job_id: str, input_path: str, input_hash: str, params: Dict[str, Any],
+               kind: str = "batch", committed_offset: int = 0,
+               resumed_from: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Register a new running job (superseding `resumed_from`) and return it.
+
+    If `job_id` already exists (a redelivered task), a failed or stale
+    running job is reopened as is — the caller continues from its
+    committed_offset — and a finished one is returned unchanged. Raises
+    JobBusy if another worker still holds the job.
+    """
+    with engine.begin() as conn:
+        inserted = conn.execute(text("""
+            INSERT INTO batch_jobs
+                (id, kind, input_path, input_hash, params, status,
+                 committed_offset, resumed_from)
+            VALUES
+                (:id, :kind, :input_path, :input_hash, :params, 'running',
+                 :offset, :resumed_from)
+            ON CONFLICT (id) DO NOTHING
+        """), {
+            "id":           job_id,
+            "kind":         kind,
+            "input_path":   input_path,
+            "input_hash":   input_hash,
+            "params":       json.dumps(params, default=str),
+            "offset":       committed_offset,
+            "resumed_from": resumed_from,
+        }).rowcount
+        if inserted and resumed_from:
+            conn.execute(text("""
+                UPDATE batch_jobs
+                SET status = 'resumed', updated_at = CURRENT_TIMESTAMP
+                WHERE id = :id
+            """), {"id": resumed_from})
+        elif not inserted:
+            reopened = conn.execute(text("""
+                UPDATE batch_jobs
+                SET status = 'running', error = NULL, updated_at = CURRENT_TIMESTAMP
+                WHERE id = :id
+                  AND (status = 'failed' OR (status = 'running' AND updated_at < :stale))
+            """), {"id": job_id, "stale": db_now(-JOB_LEASE_SECONDS)}).rowcount
+            if reopened:
+                logger.warning(f"[jobs] reopened job {job_id} (task redelivered)")
+            elif conn.execute(text("SELECT status FROM batch_jobs WHERE id = :id"),
+                              {"id": job_id}).scalar() == "running":
+                raise JobBusy(f"job {job_id} is still running on another worker")
+    return get_job(job_id)
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    with engine.connect() as conn:
+        row = conn.execute(text("SELECT * FROM batch_jobs WHERE id = :id"), {"id": job_id}).fetchone()
+    return _row_to_job(row) if row else None
+
+
+def find_resumable_job(input_path: str, kind: str = "batch",
+                       row_range=None) -> Optional[Dict[str, Any]]:
+    """
+    Latest unfinished (running/failed) job for this input file, if any.
+    For shard jobs, only a job over the same row_range qualifies. Jobs that
+    another job already resumed are skipped.
+    """
+    wanted = list(row_range) if row_range else None
+    with engine.connect() as conn:
+        rows = conn.execute(text("""
+            SELECT * FROM batch_jobs
+            WHERE input_path = :path AND kind = :kind
+              AND status IN ('running', 'failed')
+              AND NOT EXISTS (SELECT 1 FROM batch_jobs r WHERE r.resumed_from = batch_jobs.id)
+            ORDER BY created_at DESC, committed_offset DESC
+            LIMIT 50
+        """), {"path": input_path, "kind": kind}).fetchall()
+    for row in rows:
+        job = _row_to_job(row)
+        if job["params"].get("row_range") == wanted:
+            return job
+    return None
+
+
+def checkpoint(conn, job_id: str, committed_offset: int, stats: Dict[str, Any]):
+    """
+    Advance a job's checkpoint. Must be called with the connection of the
+    transaction that wrote the rows up to `committed_offset`.
+    """
+    conn.execute(text("""
+        UPDATE batch_jobs
+        SET committed_offset = :offset,
+            stats            = :stats,
+            updated_at       = CURRENT_TIMESTAMP
+        WHERE id = :id
+    """), {"offset": committed_offset, "stats": json.dumps(stats, default=str), "id": job_id})
+
+
+def finish_job(job_id: str, status: str, stats: Optional[Dict[str, Any]] = None,
+               error: Optional[str] = None):
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("""
+                UPDATE batch_jobs
+                SET status     = :status,
+                    stats      = COALESCE(:stats, stats),
+                    error      = :error,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = :id
+            """), {
+                "status": status,
+                "stats":  json.dumps(stats, default=str) if stats is not None else None,
+                "error":  error,
+                "id":     job_id,
+            })
+    except Exception as e:
+        logger.error(f"[jobs] finish_job failed for {job_id}: {e}")
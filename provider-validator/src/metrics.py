@@ -1,5 +1,9 @@
 # src/metrics.py
-from prometheus_client import Counter, Histogram, Gauge, generate_latest, CONTENT_TYPE_LATEST
+import os
+import time
+import functools
+from prometheus_client import (Counter, Histogram, Gauge, CollectorRegistry, generate_latest,
+                               CONTENT_TYPE_LATEST, multiprocess)
 
 
 
@@ -16,5 +20,57 @@ BATCH_TASKS_FAILED = Counter('batch_tasks_failed_total', 'Batch tasks failed')
 PROVIDERS_PROCESSED = Counter('providers_processed_total', 'Providers processed')
 PROVIDERS_CONFIDENCE_SUM = Gauge('providers_confidence_sum', 'Sum of provider confidence values')
 
+# Agent metrics — recorded for every BaseAgent.run call (see instrument_agent)
+AGENT_LATENCY = Histogram('agent_run_seconds', 'Agent run latency', ['agent', 'outcome'],
+                          buckets=(.001, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60))
+AGENT_IN_FLIGHT = Gauge('agent_runs_in_flight', 'Agent runs currently executing', ['agent'],
+                        multiprocess_mode='livesum')
+AGENT_ERRORS = Counter('agent_errors_total', 'Agent runs that raised', ['agent', 'error'])
+
+# Orchestrator metrics
+BATCH_QUEUE_DEPTH = Gauge('batch_rows_waiting', 'Rows waiting for a concurrency slot',
+                          multiprocess_mode='livesum')
+BATCH_ROWS = Counter('batch_rows_total', 'Batch rows by outcome', ['outcome'])
+BATCH_ROWS_PER_SECOND = Gauge('batch_rows_per_second', 'Throughput of the last processed chunk',
+                              multiprocess_mode='max')
+DB_FLUSH_LATENCY = Histogram('db_flush_seconds', 'Chunk flush (rows + checkpoint) latency',
+                             buckets=(.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10))
+
+
+def instrument_agent(run):
+    """Wrap an agent's async run() with latency / in-flight / error metrics."""
+    @functools.wraps(run)
+    async def wrapper(self, *args, **kwargs):
+        agent = getattr(self, "name", None) or type(self).__name__
+        in_flight = AGENT_IN_FLIGHT.labels(agent)
+        in_flight.inc()
+        start, outcome = time.perf_counter(), "ok"
+        try:
+            return await run(self, *args, **kwargs)
+        except Exception as e:
+            outcome = "error"
+            AGENT_ERRORS.labels(agent, type(e).__name__).inc()
+            raise
+        finally:
+            in_flight.dec()
+            AGENT_LATENCY.labels(agent, outcome).observe(time.perf_counter() - start)
+    wrapper.__instrumented__ = True
+    return wrapper
+
+
+def metrics_registry():
+    """
+    The registry to expose. Prefork Celery workers set PROMETHEUS_MULTIPROC_DIR
+    so the parent process can aggregate what its children recorded.
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return None
+
+
 def metrics_response():
-    return generate_latest(), CONTENT_TYPE_LATEST
+    registry = metrics_registry()
+    data = generate_latest(registry) if registry else generate_latest()
+    return data, CONTENT_TYPE_LATEST
@@ -5,8 +5,10 @@ import re
 
 
 import pytesseract
+from src.tracing import tracer
 
 pytesseract.pytesseract.tesseract_cmd = r"E:\tesse\tesseract.exe"
+@tracer.start_as_current_span("ocr.pdf_to_text")
 def pdf_to_text(pdf_path, dpi=200):
     pages = convert_from_path(pdf_path, dpi=dpi, poppler_path=r"D:\Downloads\Release-25.12.0-0\poppler-25.12.0\Library\bin")
     text = ""
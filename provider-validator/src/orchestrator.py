@@ -1,113 +1,341 @@
-# src/orchestrator.py
 import asyncio
 import csv
 import json
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
 import pandas as pd
 
-from src.db import init_db,insert_provider
+from src.db import init_db, insert_providers_bulk, fetch_fingerprints, fetch_source_json, engine
 from src.agents.validation_agent import ValidationAgent
 from src.agents.qa_agent import QAAgent
 from src.agents.enrichment_agent import EnrichmentAgent
 from src.agents.reconciliation_agent import ReconciliationAgent
 from src.agents.outreach_agent import OutreachAgent
-from src.utils import fuzzy_ratio
+from src.utils import fuzzy_ratio, parse_phones
+from src.progress import BatchProgress
+from src.fingerprint import row_fingerprint
+from src import jobs
+from src.tracing import tracer
+from opentelemetry import trace
+from src.metrics import (BATCH_QUEUE_DEPTH, BATCH_ROWS, BATCH_ROWS_PER_SECOND, DB_FLUSH_LATENCY,
+                         PROVIDERS_PROCESSED, PROVIDERS_CONFIDENCE_SUM)
 
+# Rows are validated in chunks of this size; each chunk is written to the DB
+# in one transaction together with the job checkpoint.
+FLUSH_SIZE = int(os.getenv("BATCH_FLUSH_SIZE", "200"))
+EXPORT_PATH = "data/validated_providers.csv"
+# Rows whose fingerprint is unchanged and whose last validation is younger than
+# this are skipped. 0 re-validates everything.
+FRESHNESS_HOURS = float(os.getenv("REVALIDATE_FRESHNESS_HOURS", "24"))
 
-async def run_batch(csv_path, concurrency=8, limit=None):
-    """Main orchestrator: runs all agents on CSV provider data concurrently."""
 
-    # ✅ Step 1: Initialize DB
-    init_db()
+def _count_rows(csv_path):
+    with open(csv_path, newline='') as f:
+        return max(sum(1 for _ in csv.reader(f)) - 1, 0)
+
 
-    # ✅ Step 2: Load CSV data
-    rows = []
+def _iter_chunks(csv_path, start, end, size):
+    """Yield (offset, rows) chunks of CSV rows [start, end); end=None reads to EOF."""
+    chunk, chunk_offset = [], start
     with open(csv_path, newline='') as f:
         reader = csv.DictReader(f)
         for i, row in enumerate(reader):
+            if end is not None and i >= end:
+                break
+            if i < start:
+                continue
             row['id'] = int(row.get('id', i + 1))
-            rows.append(row)
+            chunk.append(row)
+            if len(chunk) >= size:
+                yield chunk_offset, chunk
+                chunk_offset, chunk = chunk_offset + len(chunk), []
+    if chunk:
+        yield chunk_offset, chunk
+
+
+def _split_fresh(chunk, freshness_hours):
+    """Fingerprint a chunk; return (rows to process, rows skipped as fresh)."""
+    for row in chunk:
+        row["_fingerprint"] = row_fingerprint(row)
+    if not freshness_hours:
+        return chunk, []
+    known = fetch_fingerprints([r["id"] for r in chunk])
+    cutoff = datetime.utcnow() - timedelta(hours=freshness_hours)
+    todo, skipped = [], []
+    for row in chunk:
+        prev = known.get(row["id"])
+        if (prev and prev["fingerprint"] == row["_fingerprint"]
+                and prev["validated_at"] and prev["validated_at"] >= cutoff):
+            skipped.append(row)
+        else:
+            todo.append(row)
+    return todo, skipped
+
+
+def _stored_export_rows(rows):
+    """Export rows for skipped rows, rebuilt from the profile stored last run."""
+    stored = fetch_source_json([r["id"] for r in rows])
+    out = []
+    for row in rows:
+        try:
+            profile = json.loads(stored.get(row["id"]) or "{}").get("reconciliation", {}).get("profile", {})
+        except ValueError:
+            profile = {}
+        out.append({**{k: v for k, v in row.items() if k != "_fingerprint"}, **profile})
+    return out
+
+
+def plan_shards(csv_path, shards, limit=None):
+    """Split the CSV's data rows into `shards` contiguous [start, end) ranges."""
+    total = _count_rows(csv_path)
+    if limit:
+        total = min(total, limit)
+    shards = max(1, min(shards, total or 1))
+    size, extra = divmod(total, shards)
+    ranges, start = [], 0
+    for i in range(shards):
+        end = start + size + (1 if i < extra else 0)
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def merge_exports(part_paths, export_path=EXPORT_PATH):
+    """Concatenate per-shard CSV exports (in shard order) into one file."""
+    os.makedirs(os.path.dirname(export_path) or ".", exist_ok=True)
+    columns = None
+    with open(export_path, "w", newline='') as out:
+        for path in part_paths:
+            if not path or not os.path.isfile(path) or os.path.getsize(path) == 0:
+                continue
+            df = pd.read_csv(path)
+            if columns is None:
+                columns = list(df.columns)
+                df.to_csv(out, index=False)
+            else:
+                df.reindex(columns=columns).to_csv(out, index=False, header=False)
+    return export_path
+
+
+def build_agents():
+    """One instance of each agent in the chain, shared across rows."""
+    return {
+        "validation":     ValidationAgent(name="validation_agent"),
+        "qa":             QAAgent(name="qa_agent"),
+        "enrichment":     EnrichmentAgent(name="enrichment_agent"),
+        "reconciliation": ReconciliationAgent(name="reconciliation_agent"),
+        "outreach":       OutreachAgent(name="outreach_agent"),
+    }
+
+
+async def validate_row(agents, row, on_validated=None):
+    """
+    Run the agent chain for one provider row.
+
+    Returns (insert_row, export_row): the providers-table row (for
+    insert_providers_bulk) and the flattened profile for the CSV export.
+    Exceptions propagate — the caller decides whether a row failure is fatal.
+    """
+    # --- Phase 1: Validation ---
+    val_res = await agents["validation"].run(row)
+    if on_validated:
+        on_validated()
+
+    # --- Phase 2: Quality Assessment ---
+    qa_res = await agents["qa"].run({**row, "validation_result": val_res})
 
+    # --- Phase 3: Enrichment ---
+    enrich_res = await agents["enrichment"].run(row)
+
+    # --- Phase 4: Reconciliation ---
+    combined_res = {
+        **row,
+        "validation_result": val_res,
+        "qa": qa_res,
+        "enrichment": enrich_res,
+    }
+    recon_res = await agents["reconciliation"].run(combined_res)
+
+    # --- Phase 5: Outreach ---
+    outreach_res = await agents["outreach"].run(recon_res)
+
+    # --- Prepare DB entry ---
+    profile = recon_res.get("profile", {})
+    insert_row = {
+        "source_id": row.get("id"),
+        "name": profile.get("name", {}).get("value", row.get("name")),
+        "npi": row.get("npi"),
+        "phone": row.get("phone"),
+        "email": row.get("email"),
+        "address": row.get("address"),
+        "website": row.get("website"),
+        "specialty": row.get("specialty"),
+        "source_json": json.dumps({
+            "validation": val_res,
+            "qa": qa_res,
+            "enrichment": enrich_res,
+            "reconciliation": recon_res,
+            "outreach": outreach_res
+        }),
+        "confidence": profile.get("final_confidence", 0.0),
+        "flags": json.dumps(profile.get("flags", [])),
+        "status": "manual_review" if profile.get("flags") else "confirmed",
+        "fingerprint": row.get("_fingerprint"),
+    }
+    print(
+        f"[INFO] Processed id={row.get('id')} "
+        f"conf={profile.get('final_confidence', 0.0):.3f} "
+        f"flags={profile.get('flags', [])}"
+    )
+    export_row = {k: v for k, v in row.items() if k != "_fingerprint"}
+    return insert_row, {**export_row, **profile}
+
+
+async def run_batch(csv_path, concurrency=8, limit=None, job_id=None, resume=False,
+                    flush_size=None, freshness_hours=None, row_range=None,
+                    export_path=None, kind="batch"):
+    """
+    Main orchestrator: runs all agents on CSV provider data concurrently.
+
+    Progress counters are published under `job_id` (the Celery task id when
+    run from the worker) and can be followed via GET /batches/{job_id}/events.
+
+    The run is registered in batch_jobs. Rows are processed and written in
+    chunks; after each chunk the job's committed_offset is advanced in the
+    same transaction. With resume=True the run continues from the last
+    checkpoint of the previous unfinished job on the same (unchanged) file.
+
+    Incremental: every row is fingerprinted (normalized fields + scanned PDF
+    hash). Rows whose fingerprint matches the stored one and were validated
+    within `freshness_hours` are skipped and counted as "skipped"; the export
+    still gets a row for them, rebuilt from the profile stored last run.
+
+    Sharding: `row_range=(start, end)` restricts the run to that slice of data
+    rows (checkpoints stay absolute row offsets) and `export_path` sends the
+    CSV export to a per-shard file — see celery_app.run_batch_sharded_task.
+
+    Returns the final progress snapshot.
+    """
+    job_id = job_id or str(uuid.uuid4())
+    export_path = export_path or EXPORT_PATH
+    range_start, range_end = row_range if row_range else (0, None)
     if limit:
-        rows = rows[:limit]
+        range_end = min(range_end, range_start + limit) if range_end is not None else range_start + limit
+    flush_size = flush_size or FLUSH_SIZE
+    freshness_hours = FRESHNESS_HOURS if freshness_hours is None else freshness_hours
+    progress = BatchProgress(job_id)
+
+    # ✅ Step 1: Initialize DB + register the job
+    init_db()
+    input_hash = jobs.file_sha256(csv_path)
+    start_offset, resumed_from = range_start, None
+    # Already registered → Celery redelivered this task; create_job reopens it
+    redelivered = jobs.get_job(job_id) is not None
+    if resume and not redelivered:
+        previous = jobs.find_resumable_job(csv_path, kind=kind, row_range=row_range)
+        if previous and previous["input_hash"] == input_hash:
+            start_offset = max(previous["committed_offset"] or 0, range_start)
+            resumed_from = previous["id"]
+            print(f"[INFO] Resuming job {resumed_from} from row {start_offset}")
+        elif previous:
+            print(f"[WARN] {csv_path} changed since job {previous['id']} — starting from row 0")
+    job = jobs.create_job(
+        job_id, csv_path, input_hash,
+        params={"concurrency": concurrency, "limit": limit, "flush_size": flush_size,
+                "freshness_hours": freshness_hours,
+                "row_range": list(row_range) if row_range else None},
+        kind=kind, committed_offset=start_offset, resumed_from=resumed_from,
+    )
+    if job["status"] != "running":
+        print(f"[INFO] Job {job_id} is already {job['status']} — nothing to do")
+        return job["stats"]
+    if redelivered:
+        start_offset = max(job["committed_offset"] or 0, range_start)
+        print(f"[INFO] Continuing job {job_id} from its checkpoint at row {start_offset}")
 
-    # ✅ Step 3: Initialize all agents
-    val_agent = ValidationAgent(name="validation_agent")
-    qa_agent = QAAgent(name="qa_agent")
-    enrich_agent = EnrichmentAgent(name="enrichment_agent")
-    recon_agent = ReconciliationAgent(name="reconciliation_agent")
-    outreach_agent = OutreachAgent(name="outreach_agent")
+    total = range_end if range_end is not None else _count_rows(csv_path)
+    progress.set_total(max(total - start_offset, 0))
+
+    # ✅ Step 2: Initialize all agents
+    agents = build_agents()
 
     # ✅ Concurrency setup
     sem = asyncio.Semaphore(concurrency)
-    results = []
 
-    # ✅ Step 4: Define per-row pipeline
+    # ✅ Step 3: Per-row pipeline — returns (db row, export row) or None
     async def process(row):
+        BATCH_QUEUE_DEPTH.inc()
         async with sem:
+            BATCH_QUEUE_DEPTH.dec()
             try:
-                # --- Phase 1: Validation ---
-                val_res = await val_agent.run(row)
-
-                # --- Phase 2: Quality Assessment ---
-                qa_res = await qa_agent.run({**row, "validation_result": val_res})
-
-                # --- Phase 3: Enrichment ---
-                enrich_res = await enrich_agent.run(row)
-
-                # --- Phase 4: Reconciliation ---
-                combined_res = {
-                    **row,
-                    "validation_result": val_res,
-                    "qa": qa_res,
-                    "enrichment": enrich_res,
-                }
-                recon_res = await recon_agent.run(combined_res)
-
-                # --- Phase 5: Outreach ---
-                outreach_res = await outreach_agent.run(recon_res)
-
-                # --- Step 6: Prepare DB entry ---
-                profile = recon_res.get("profile", {})
-                insert_row = {
-                    "source_id": row.get("id"),
-                    "name": profile.get("name", {}).get("value", row.get("name")),
-                    "npi": row.get("npi"),
-                    "phone": row.get("phone"),
-                    "address": row.get("address"),
-                    "website": row.get("website"),
-                    "specialty": row.get("specialty"),
-                    "source_json": json.dumps({
-                        "validation": val_res,
-                        "qa": qa_res,
-                        "enrichment": enrich_res,
-                        "reconciliation": recon_res,
-                        "outreach": outreach_res
-                    }),
-                    "confidence": profile.get("final_confidence", 0.0),
-                    "flags": json.dumps(profile.get("flags", [])),
-                    "status": "manual_review" if profile.get("flags") else "confirmed"
-                }
-
-                # --- Step 7: Insert into DB ---
-                insert_provider(insert_row)
-
-                # --- Step 8: Collect results for CSV ---
-                results.append({**row, **profile})
-                print(
-                    f"[INFO] Processed id={row.get('id')} "
-                    f"conf={profile.get('final_confidence', 0.0):.3f} "
-                    f"flags={profile.get('flags', [])}"
-                )
-
+                with tracer.start_as_current_span("row", attributes={"provider.id": str(row.get("id"))}):
+                    outcome = await validate_row(agents, row, on_validated=lambda: progress.incr(validated=1))
             except Exception as e:
+                progress.incr(failed=1)
+                BATCH_ROWS.labels("failed").inc()
                 print(f"[ERROR] Failed processing row id={row.get('id')}: {e}")
+                return None
+            BATCH_ROWS.labels("validated").inc()
+            PROVIDERS_PROCESSED.inc()
+            PROVIDERS_CONFIDENCE_SUM.inc(outcome[0]["confidence"] or 0.0)
+            return outcome
+
+    # ✅ Step 4: Flush a chunk — rows + checkpoint in one transaction
+    def flush(insert_rows, committed_offset):
+        with tracer.start_as_current_span("db.flush", attributes={"rows": len(insert_rows)}), \
+                DB_FLUSH_LATENCY.time(), engine.begin() as conn:
+            insert_providers_bulk(insert_rows, conn=conn)
+            progress.incr(written=len(insert_rows))
+            jobs.checkpoint(conn, job_id, committed_offset, progress.snapshot())
+
+    # Resumed / redelivered runs append to the previous export instead of replacing it
+    export_mode = "a" if (resumed_from or redelivered) and os.path.isfile(export_path) else "w"
+    export_columns = None
+    os.makedirs(os.path.dirname(export_path) or ".", exist_ok=True)
+
+    batch_span = tracer.start_span("run_batch", attributes={
+        "job.id": job_id, "job.kind": kind, "concurrency": concurrency, "start_offset": start_offset})
+    try:
+        with trace.use_span(batch_span, end_on_exit=True), \
+                open(export_path, export_mode, newline='') as export_file:
+            for offset, chunk in _iter_chunks(csv_path, start_offset, range_end, flush_size):
+                chunk_started = time.perf_counter()
+                progress.incr(read=len(chunk))
+                todo, skipped = _split_fresh(chunk, freshness_hours)
+                # Parse each distinct phone of the chunk once; ValidationAgent then hits the cache
+                parse_phones([r.get("phone") for r in todo])
+                if skipped:
+                    progress.incr(skipped=len(skipped))
+                    BATCH_ROWS.labels("skipped").inc(len(skipped))
+
+                # ✅ Step 5: Run the chunk concurrently
+                outcomes = [o for o in await asyncio.gather(*[process(r) for r in todo]) if o]
+                insert_rows = [o[0] for o in outcomes]
+                flush(insert_rows, offset + len(chunk))
+                BATCH_ROWS_PER_SECOND.set(len(chunk) / max(time.perf_counter() - chunk_started, 1e-6))
 
-    # ✅ Step 9: Run all tasks concurrently
-    await asyncio.gather(*[process(r) for r in rows])
+                # ✅ Step 6: Append results to the CSV export (skipped rows keep last run's result)
+                export_rows = [o[1] for o in outcomes] + (_stored_export_rows(skipped) if skipped else [])
+                if export_rows:
+                    if export_columns is None:
+                        df = pd.DataFrame(export_rows)
+                        df.to_csv(export_file, index=False, header=(export_mode == "w"))
+                        export_columns = list(df.columns)
+                    else:
+                        pd.DataFrame(export_rows).reindex(columns=export_columns).to_csv(
+                            export_file, index=False, header=False)
+        print(f"[INFO] ✅ Results written to {export_path}")
+    except Exception as e:
+        progress.finish("failed", error=str(e))
+        jobs.finish_job(job_id, "failed", progress.snapshot(), error=str(e))
+        raise
 
-    # ✅ Step 10: Export final results to CSV
-    pd.DataFrame(results).to_csv("data/validated_providers.csv", index=False)
-    print("[INFO] ✅ Results written to data/validated_providers.csv")
+    progress.finish("completed")
+    stats = progress.snapshot()
+    jobs.finish_job(job_id, "completed", stats)
+    return stats
 
 
 # ✅ Entry point
@@ -117,5 +345,6 @@ if __name__ == "__main__":
     csv_path = sys.argv[1] if len(sys.argv) > 1 else "data/providers_sample.csv"
     concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 8
     limit = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    resume = "--resume" in sys.argv
 
-    asyncio.run(run_batch(csv_path, concurrency=concurrency, limit=limit))
+    asyncio.run(run_batch(csv_path, concurrency=concurrency, limit=limit, resume=resume))
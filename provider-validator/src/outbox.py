@@ -0,0 +1,212 @@
+# src/outbox.py
+"""
+Transactional outreach outbox.
+
+Outreach drafts are written to `outreach_outbox` before anything is sent.
+Each row is one email in one campaign:
+
+    pending ──claim──▶ sending ──▶ sent
+       ▲                  │
+       └── retry_later ◀──┤
+                          └──────▶ failed
+
+UNIQUE (campaign_id, provider_id) means re-running a wave never queues a
+provider twice. add() skips rows that are already there.
+
+claim() hands out a batch of ready pending rows to one sender. On Postgres
+this is `FOR UPDATE SKIP LOCKED`, so any number of dispatchers can drain
+the same campaign in parallel without sending a row twice. SQLite
+serialises writers, so a guarded UPDATE tagged with a claim token does the
+same job there. Rows left in 'sending' by a crashed sender are put back by
+requeue_stale().
+
+SqlOutbox implements the interface OutreachDispatcher expects
+(see src/outreach_dispatcher.py MemoryOutbox).
+"""
+
+import json
+import uuid
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import bindparam, text
+from src.db import engine, IS_POSTGRES, db_now
+
+logger = logging.getLogger(__name__)
+
+
+def _as_datetime(value) -> Optional[datetime]:
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value))
+
+
+def _row_to_item(row) -> Dict[str, Any]:
+    item = dict(row._mapping)
+    try:
+        item["substitutions"] = json.loads(item.get("substitutions") or "{}")
+    except (TypeError, ValueError):
+        item["substitutions"] = {}
+    return item
+
+
+class SqlOutbox:
+    """
+    Outbox over the outreach_outbox table. With campaign_id set, claim() and
+    counts() only see that campaign; add() always tags rows with it.
+    """
+
+    def __init__(self, campaign_id: Optional[str] = None, worker_id: Optional[str] = None):
+        self.campaign_id = campaign_id
+        self.worker_id   = worker_id or uuid.uuid4().hex[:12]
+
+    def _scope(self) -> str:
+        return " AND campaign_id = :campaign_id" if self.campaign_id else ""
+
+    # ------------------------------------------------------------------ enqueue
+    def add(self, messages: Iterable[Dict[str, Any]], campaign_id: Optional[str] = None,
+            conn=None) -> int:
+        """
+        Bulk-insert delivery messages as pending rows; duplicates of
+        (provider_id, campaign) are skipped. Returns the number of new rows.
+        """
+        campaign_id = campaign_id or self.campaign_id
+        if not campaign_id:
+            raise ValueError("outbox rows need a campaign_id")
+        params = [{
+            "campaign_id":   campaign_id,
+            "provider_id":   m.get("provider_id"),
+            "recipient":     m["recipient"],
+            "subject":       m.get("subject"),
+            "body":          m.get("body"),
+            "substitutions": json.dumps(m.get("substitutions") or {}),
+        } for m in messages]
+        if not params:
+            return 0
+        insert = text("""
+            INSERT INTO outreach_outbox
+                (campaign_id, provider_id, recipient, subject, body, substitutions)
+            VALUES
+                (:campaign_id, :provider_id, :recipient, :subject, :body, :substitutions)
+            ON CONFLICT (campaign_id, provider_id) DO NOTHING
+        """)
+        # rowcount isn't reliable for executemany on every driver, so count this
+        # batch's providers before and after (an index range on the unique key).
+        # Rows without a provider_id never conflict.
+        ids = sorted({p["provider_id"] for p in params if p["provider_id"] is not None})
+        no_id = sum(1 for p in params if p["provider_id"] is None)
+        count = text("""
+            SELECT COUNT(*) FROM outreach_outbox
+            WHERE campaign_id = :c AND provider_id IN :ids
+        """).bindparams(bindparam("ids", expanding=True))
+
+        def _run(c):
+            before = c.execute(count, {"c": campaign_id, "ids": ids}).scalar() if ids else 0
+            c.execute(insert, params)
+            after = c.execute(count, {"c": campaign_id, "ids": ids}).scalar() if ids else 0
+            return after - before + no_id
+
+        if conn is not None:
+            return _run(conn)
+        with engine.begin() as c:
+            return _run(c)
+
+    # ------------------------------------------------------------------ claim
+    def claim(self, limit: int) -> List[Dict[str, Any]]:
+        """Atomically move up to `limit` ready pending rows to 'sending' and return them."""
+        params = {"limit": limit, "now": db_now(), "token": f"{self.worker_id}:{uuid.uuid4().hex[:8]}",
+                  "campaign_id": self.campaign_id}
+        with engine.begin() as conn:
+            if IS_POSTGRES:
+                rows = conn.execute(text(f"""
+                    UPDATE outreach_outbox
+                    SET state = 'sending', attempts = attempts + 1,
+                        claimed_by = :token, claimed_at = :now, updated_at = :now
+                    WHERE id IN (
+                        SELECT id FROM outreach_outbox
+                        WHERE state = 'pending' AND available_at <= :now{self._scope()}
+                        ORDER BY id
+                        LIMIT :limit
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING *
+                """), params).fetchall()
+            else:
+                conn.execute(text(f"""
+                    UPDATE outreach_outbox
+                    SET state = 'sending', attempts = attempts + 1,
+                        claimed_by = :token, claimed_at = :now, updated_at = :now
+                    WHERE id IN (
+                        SELECT id FROM outreach_outbox
+                        WHERE state = 'pending' AND available_at <= :now{self._scope()}
+                        ORDER BY id
+                        LIMIT :limit
+                    ) AND state = 'pending'
+                """), params)
+                rows = conn.execute(text("""
+                    SELECT * FROM outreach_outbox
+                    WHERE claimed_by = :token AND state = 'sending'
+                """), {"token": params["token"]}).fetchall()
+        return sorted((_row_to_item(r) for r in rows), key=lambda i: i["id"])
+
+    # ------------------------------------------------------------------ outcomes
+    def _update(self, ids: List[int], sql_set: str, values: Dict[str, Any], conn=None):
+        if not ids:
+            return
+        stmt = text(f"UPDATE outreach_outbox SET {sql_set}, updated_at = :now WHERE id IN :ids") \
+            .bindparams(bindparam("ids", expanding=True))
+        params = {**values, "now": db_now(), "ids": list(ids)}
+        if conn is not None:
+            conn.execute(stmt, params)
+        else:
+            with engine.begin() as c:
+                c.execute(stmt, params)
+
+    def mark_sent(self, ids: List[int], message_id: Optional[str], conn=None):
+        self._update(ids, "state = 'sent', message_id = :message_id, error = NULL",
+                     {"message_id": message_id}, conn)
+
+    def mark_failed(self, ids: List[int], error: str, conn=None):
+        self._update(ids, "state = 'failed', error = :error", {"error": error}, conn)
+
+    def retry_later(self, ids: List[int], delay: float, error: str, conn=None):
+        self._update(ids, "state = 'pending', error = :error, available_at = :available_at",
+                     {"error": error, "available_at": db_now(delay)}, conn)
+
+    def requeue_stale(self, older_than_seconds: float = 900) -> int:
+        """Put rows stuck in 'sending' (sender died mid-batch) back to pending."""
+        with engine.begin() as conn:
+            result = conn.execute(text(f"""
+                UPDATE outreach_outbox
+                SET state = 'pending', claimed_by = NULL, updated_at = :now
+                WHERE state = 'sending' AND claimed_at < :cutoff{self._scope()}
+            """), {"now": db_now(), "cutoff": db_now(-older_than_seconds), "campaign_id": self.campaign_id})
+        if result.rowcount:
+            logger.warning(f"[outbox] requeued {result.rowcount} stale 'sending' rows")
+        return result.rowcount
+
+    # ------------------------------------------------------------------ status
+    def next_ready_in(self) -> Optional[float]:
+        """Seconds until the next pending row is claimable, or None if none are pending."""
+        with engine.connect() as conn:
+            earliest = conn.execute(text(f"""
+                SELECT MIN(available_at) FROM outreach_outbox
+                WHERE state = 'pending'{self._scope()}
+            """), {"campaign_id": self.campaign_id}).scalar()
+        earliest = _as_datetime(earliest)
+        if earliest is None:
+            return None
+        now = datetime.now(timezone.utc)
+        if earliest.tzinfo is None:
+            now = now.replace(tzinfo=None)
+        return max((earliest - now).total_seconds(), 0.0)
+
+    def counts(self) -> Dict[str, int]:
+        with engine.connect() as conn:
+            rows = conn.execute(text(f"""
+                SELECT state, COUNT(*) FROM outreach_outbox
+                WHERE 1 = 1{self._scope()}
+                GROUP BY state
+            """), {"campaign_id": self.campaign_id}).fetchall()
+        return {state: n for state, n in rows}
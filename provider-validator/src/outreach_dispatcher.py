@@ -0,0 +1,269 @@
+# src/outreach_dispatcher.py
+"""
+Async outreach dispatcher.
+
+The old path was one Celery task per provider: asyncio.run() the agent, make
+one blocking SendGrid call, and retry after a flat 60s. Throughput was
+bounded by task round trips. The dispatcher drains an outbox instead:
+
+  claim a batch of drafts → pack them into personalization batches
+  (src/delivery.py) → POST them concurrently over one aiohttp session
+
+A global token bucket (OUTREACH_SEND_RATE emails/sec, burst
+OUTREACH_SEND_BURST) keeps the combined rate at our SendGrid quota, so
+throughput tracks that rate and not the number of in-flight requests.
+
+POST /v3/mail/send is not idempotent, so only failures where SendGrid
+cannot have accepted anything are retried: a 429, or a connection that
+failed before the request was written (same rule as src/delivery.py). Those
+go back to the outbox with a jittered exponential delay ("full jitter":
+uniform(0, min(cap, base·2^n)), never less than a Retry-After header) and
+are marked failed after OUTREACH_MAX_ATTEMPTS. A 5xx, a timeout or a broken
+connection may follow a partial accept of the batch, so those are marked
+failed at once (and logged) rather than risk emailing anyone twice; so are
+other 4xx responses, since resending the same payload won't help.
+
+An outbox is anything with the MemoryOutbox methods; items are delivery
+messages plus "id" and "attempts".
+"""
+
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+import aiohttp
+
+from src.delivery import SENDGRID_API_URL, SENDGRID_BATCH_SIZE, OUTREACH_SEND_RATE, \
+    iter_batches, build_payload, log_batch
+
+logger = logging.getLogger(__name__)
+
+OUTREACH_SEND_BURST   = float(os.getenv("OUTREACH_SEND_BURST", "0")) or None   # default: 1s of rate
+OUTREACH_CONCURRENCY  = int(os.getenv("OUTREACH_CONCURRENCY", "8"))
+OUTREACH_CLAIM_SIZE   = int(os.getenv("OUTREACH_CLAIM_SIZE", "2000"))
+OUTREACH_MAX_ATTEMPTS = int(os.getenv("OUTREACH_MAX_ATTEMPTS", "5"))
+BACKOFF_BASE_SECONDS  = float(os.getenv("OUTREACH_BACKOFF_BASE", "2"))
+BACKOFF_CAP_SECONDS   = float(os.getenv("OUTREACH_BACKOFF_CAP", "300"))
+
+RETRYABLE_STATUS = (429,)
+
+
+def backoff_delay(attempt: int, base: float = BACKOFF_BASE_SECONDS, cap: float = BACKOFF_CAP_SECONDS,
+                  floor: float = 0.0) -> float:
+    """Full-jitter exponential backoff for the given (0-based) attempt number."""
+    return max(floor, random.uniform(0, min(cap, base * (2 ** attempt))))
+
+
+class TokenBucket:
+    """asyncio token bucket shared by every send coroutine in the dispatcher."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate   = rate
+        self.burst  = burst if burst is not None else max(rate, 1.0)
+        self.tokens = self.burst
+        self._stamp = time.monotonic()
+        self._lock  = asyncio.Lock()
+
+    async def acquire(self, n: float = 1.0):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            self.tokens -= n
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            # Sleep while holding the lock: callers queue up in FIFO order
+            # instead of all waking at once and overshooting the rate.
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Outbox
+# ─────────────────────────────────────────────────────────────────────────────
+class MemoryOutbox:
+    """In-process outbox — for one-off waves and tests."""
+
+    def __init__(self):
+        self._lock  = threading.Lock()
+        self._items: Dict[int, Dict[str, Any]] = {}
+        self._next_id = 1
+
+    def add(self, messages: Iterable[Dict[str, Any]]) -> int:
+        added = 0
+        with self._lock:
+            for msg in messages:
+                self._items[self._next_id] = {**msg, "id": self._next_id, "attempts": 0,
+                                              "state": "pending", "available_at": 0.0}
+                self._next_id += 1
+                added += 1
+        return added
+
+    def claim(self, limit: int) -> List[Dict[str, Any]]:
+        """Move up to `limit` ready pending items to 'sending' and return them."""
+        now, claimed = time.monotonic(), []
+        with self._lock:
+            for item in self._items.values():
+                if len(claimed) >= limit:
+                    break
+                if item["state"] == "pending" and item["available_at"] <= now:
+                    item["state"] = "sending"
+                    item["attempts"] += 1
+                    claimed.append(dict(item))
+        return claimed
+
+    def mark_sent(self, ids: List[int], message_id: Optional[str]):
+        self._set(ids, state="sent", message_id=message_id)
+
+    def mark_failed(self, ids: List[int], error: str):
+        self._set(ids, state="failed", error=error)
+
+    def retry_later(self, ids: List[int], delay: float, error: str):
+        self._set(ids, state="pending", error=error, available_at=time.monotonic() + delay)
+
+    def next_ready_in(self) -> Optional[float]:
+        """Seconds until the next pending item is claimable, or None if none are pending."""
+        now = time.monotonic()
+        with self._lock:
+            waits = [i["available_at"] - now for i in self._items.values() if i["state"] == "pending"]
+        return max(min(waits), 0.0) if waits else None
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            out: Dict[str, int] = {}
+            for item in self._items.values():
+                out[item["state"]] = out.get(item["state"], 0) + 1
+            return out
+
+    def _set(self, ids, **fields):
+        with self._lock:
+            for i in ids:
+                self._items[i].update(fields)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Dispatcher
+# ─────────────────────────────────────────────────────────────────────────────
+class OutreachDispatcher:
+
+    def __init__(self, outbox, api_key: Optional[str] = None, from_email: Optional[str] = None,
+                 api_url: str = SENDGRID_API_URL, rate: float = OUTREACH_SEND_RATE,
+                 burst: Optional[float] = OUTREACH_SEND_BURST, concurrency: int = OUTREACH_CONCURRENCY,
+                 batch_size: int = SENDGRID_BATCH_SIZE, claim_size: int = OUTREACH_CLAIM_SIZE,
+                 max_attempts: int = OUTREACH_MAX_ATTEMPTS, backoff_base: float = BACKOFF_BASE_SECONDS,
+                 backoff_cap: float = BACKOFF_CAP_SECONDS, task_id: Optional[str] = None,
+                 timeout: float = 30.0):
+        self.outbox       = outbox
+        self.api_key      = api_key or os.getenv("SENDGRID_API_KEY")
+        self.from_email   = from_email or os.getenv("FROM_EMAIL")
+        self.api_url      = api_url
+        self.bucket       = TokenBucket(rate, burst)
+        self.concurrency  = concurrency
+        self.batch_size   = batch_size
+        self.claim_size   = claim_size
+        self.max_attempts = max_attempts
+        self.backoff      = (backoff_base, backoff_cap)
+        self.task_id      = task_id
+        self.timeout      = aiohttp.ClientTimeout(total=timeout)
+        self.stats        = {"sent": 0, "failed": 0, "retried": 0, "requests": 0}
+
+    async def run(self) -> Dict[str, Any]:
+        """Drain the outbox (including scheduled retries) and return send stats."""
+        started = time.monotonic()
+        sem = asyncio.Semaphore(self.concurrency)
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        async with aiohttp.ClientSession(connector=connector, timeout=self.timeout,
+                                         headers={"Authorization": f"Bearer {self.api_key}"}) as session:
+            while True:
+                items = await asyncio.to_thread(self.outbox.claim, self.claim_size)
+                if not items:
+                    wait = await asyncio.to_thread(self.outbox.next_ready_in)
+                    if wait is None:
+                        break
+                    await asyncio.sleep(min(wait, 1.0) or 0.05)
+                    continue
+                await asyncio.gather(*[self._send(session, sem, batch)
+                                       for batch in iter_batches(items, self.batch_size)])
+
+        elapsed = max(time.monotonic() - started, 1e-6)
+        return {**self.stats, "elapsed_seconds": round(elapsed, 2),
+                "emails_per_sec": round(self.stats["sent"] / elapsed, 2)}
+
+    async def _send(self, session: aiohttp.ClientSession, sem: asyncio.Semaphore,
+                    batch: List[Dict[str, Any]]):
+        ids = [item["id"] for item in batch]
+        async with sem:
+            await self.bucket.acquire(len(batch))
+            status, message_id, retry_after = await self._post(session, build_payload(
+                batch, self.from_email, self.task_id))
+
+        if status == "sent":
+            await asyncio.to_thread(self._finish, batch, ids, status, message_id)
+            self.stats["sent"] += len(batch)
+            return
+
+        attempts = min(item["attempts"] for item in batch)
+        retryable = retry_after is not None
+        if retryable and attempts < self.max_attempts:
+            delay = backoff_delay(attempts - 1, *self.backoff, floor=retry_after)
+            await asyncio.to_thread(self.outbox.retry_later, ids, delay, status)
+            self.stats["retried"] += len(batch)
+            logger.info(f"[dispatcher] {len(batch)} recipients → {status}, retry in {delay:.1f}s")
+        else:
+            await asyncio.to_thread(self._finish, batch, ids, status, None)
+            self.stats["failed"] += len(batch)
+
+    async def _post(self, session: aiohttp.ClientSession, payload: Dict[str, Any]):
+        """
+        Returns (send_status, message_id, retry_after). retry_after is None
+        when the failure isn't worth retrying, else the minimum wait in seconds.
+        """
+        self.stats["requests"] += 1
+        try:
+            async with session.post(self.api_url, json=payload) as resp:
+                if 200 <= resp.status < 300:
+                    return "sent", resp.headers.get("X-Message-Id"), None
+                if resp.status in RETRYABLE_STATUS:
+                    try:
+                        retry_after = float(resp.headers.get("Retry-After", 0))
+                    except ValueError:
+                        retry_after = 0.0
+                    return f"failed:{resp.status}", None, retry_after
+                logger.warning(f"[dispatcher] SendGrid returned {resp.status}: {(await resp.text())[:200]}")
+                return f"failed:{resp.status}", None, None
+        except aiohttp.ClientConnectorError as e:
+            # never connected, so nothing was sent
+            return f"error:{str(e)[:100] or type(e).__name__}", None, 0.0
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning(f"[dispatcher] delivery unknown after {type(e).__name__}: {str(e)[:200]}")
+            return f"error:{str(e)[:100] or type(e).__name__}", None, None
+
+    def _finish(self, batch, ids, status, message_id):
+        """
+        Record a batch outcome. The outbox state goes first and on its own:
+        once SendGrid returned 2xx the rows must end up 'sent', whatever
+        happens to the logging afterwards — a row left in 'sending' would be
+        requeued by requeue_stale() and emailed again.
+        """
+        for attempt in range(3):
+            try:
+                if status == "sent":
+                    self.outbox.mark_sent(ids, message_id)
+                else:
+                    self.outbox.mark_failed(ids, status)
+                break
+            except Exception as e:
+                if attempt == 2:
+                    logger.error(f"[dispatcher] could not mark {len(ids)} outbox rows {status} "
+                                 f"(message_id={message_id}, ids={ids[:20]}): {e}")
+                    break
+                time.sleep(0.5 * (attempt + 1))
+        try:
+            log_batch(batch, status, message_id, self.task_id)
+        except Exception as e:
+            logger.error(f"[dispatcher] outreach log for {len(batch)} recipients ({status}) failed: {e}")
@@ -0,0 +1,213 @@
+# src/outreach_events.py
+"""
+Outreach event history and per-message state.
+
+outreach_logs holds one row per send, and the webhook overwrites its status
+with the latest event, so the history is lost. Every event now lands in two
+more places:
+
+  outreach_events          append-only, one row per SendGrid event (plus a
+                           'sent' row per message when the batch is accepted).
+                           Rows are never updated, and reads go by
+                           (message_id, event_time) or event_time, so the
+                           table can be range-partitioned on event_time
+                           without code changes.
+  outreach_message_state   one row per (X-Message-Id, recipient), folded
+                           incrementally from each event batch by an upsert.
+
+A message moves forward through
+
+    sent ──▶ delivered ──▶ opened ──▶ clicked
+      │          │
+      └──────────┴──▶ bounced / dropped          spamreport / unsubscribe
+
+and never moves back. An 'open' that arrives after the 'click' leaves the
+state at clicked. The first time of each milestone is kept in its own column
+(delivered_at, opened_at, …), so funnel() is a single COUNT(col) aggregate
+over the compact state table, narrowed by ix_outreach_message_state_campaign
+when a campaign is given.
+"""
+
+import logging
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import text
+from src.db import engine
+
+logger = logging.getLogger(__name__)
+
+# event → (state, rank). Higher rank wins; equal rank → the later batch wins.
+EVENT_STATES = {
+    "sent":              ("sent", 1),
+    "processed":         ("sent", 1),
+    "deferred":          ("deferred", 1),
+    "delivered":         ("delivered", 2),
+    "open":              ("opened", 3),
+    "click":             ("clicked", 4),
+    "bounce":            ("bounced", 5),
+    "dropped":           ("dropped", 5),
+    "spamreport":        ("spamreport", 6),
+    "unsubscribe":       ("unsubscribed", 6),
+    "group_unsubscribe": ("unsubscribed", 6),
+}
+
+# event → milestone column (first occurrence is kept)
+MILESTONES = {
+    "sent":              "sent_at",
+    "processed":         "sent_at",
+    "delivered":         "delivered_at",
+    "open":              "opened_at",
+    "click":             "clicked_at",
+    "bounce":            "bounced_at",
+    "dropped":           "bounced_at",
+    "spamreport":        "complained_at",
+    "unsubscribe":       "unsubscribed_at",
+    "group_unsubscribe": "unsubscribed_at",
+}
+MILESTONE_COLUMNS = ("sent_at", "delivered_at", "opened_at", "clicked_at",
+                     "bounced_at", "complained_at", "unsubscribed_at")
+
+_INSERT_EVENT = text("""
+    INSERT INTO outreach_events
+        (message_id, recipient_email, provider_id, campaign_id, event, event_time, sg_event_id, url)
+    VALUES
+        (:message_id, :email, :provider_id, :campaign_id, :event, :event_time, :sg_event_id, :url)
+""")
+
+
+def _earliest(col: str) -> str:
+    # keep the earlier of the stored and incoming milestone, whichever is set
+    return (f"{col} = COALESCE(CASE WHEN excluded.{col} < s.{col} THEN excluded.{col} END, "
+            f"s.{col}, excluded.{col})")
+
+
+_UPSERT_STATE = text(f"""
+    INSERT INTO outreach_message_state AS s
+        (message_id, recipient_email, provider_id, campaign_id, state, state_rank,
+         {", ".join(MILESTONE_COLUMNS)}, last_event, last_event_time, event_count)
+    VALUES
+        (:message_id, :email, :provider_id, :campaign_id, :state, :state_rank,
+         {", ".join(":" + c for c in MILESTONE_COLUMNS)}, :last_event, :last_event_time, :event_count)
+    ON CONFLICT (message_id, recipient_email) DO UPDATE SET
+        provider_id     = COALESCE(s.provider_id, excluded.provider_id),
+        campaign_id     = COALESCE(s.campaign_id, excluded.campaign_id),
+        state           = CASE WHEN excluded.state_rank >= s.state_rank
+                               THEN excluded.state ELSE s.state END,
+        state_rank      = CASE WHEN excluded.state_rank >= s.state_rank
+                               THEN excluded.state_rank ELSE s.state_rank END,
+        {", ".join(_earliest(c) for c in MILESTONE_COLUMNS)},
+        last_event      = CASE WHEN s.last_event_time IS NULL OR excluded.last_event_time >= s.last_event_time
+                               THEN excluded.last_event ELSE s.last_event END,
+        last_event_time = CASE WHEN s.last_event_time IS NULL OR excluded.last_event_time >= s.last_event_time
+                               THEN excluded.last_event_time ELSE s.last_event_time END,
+        event_count     = s.event_count + excluded.event_count
+""")
+
+
+def _fold(events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Collapse a batch into one state row per (message_id, email)."""
+    folded: Dict[tuple, Dict[str, Any]] = {}
+    for e in sorted(events, key=lambda e: e["ts"] or 0):
+        if not e["message_id"] or not e["email"]:
+            continue
+        key = (e["message_id"], e["email"])
+        row = folded.setdefault(key, {
+            "message_id": e["message_id"], "email": e["email"], "provider_id": None,
+            "campaign_id": None, "state": None, "state_rank": 0, "event_count": 0,
+            **{c: None for c in MILESTONE_COLUMNS},
+        })
+        row["provider_id"] = row["provider_id"] or e.get("provider_id")
+        row["campaign_id"] = row["campaign_id"] or e.get("campaign_id")
+        row["event_count"] += 1
+        row["last_event"], row["last_event_time"] = e["event"], e["event_time"]
+
+        state, rank = EVENT_STATES.get(e["event"], (None, 0))
+        if state and rank >= row["state_rank"]:
+            row["state"], row["state_rank"] = state, rank
+        col = MILESTONES.get(e["event"])
+        if col and row[col] is None:
+            row[col] = e["event_time"]
+
+    # a batch of only unknown event types still counts, without a state
+    for row in folded.values():
+        row["state"] = row["state"] or "unknown"
+    return list(folded.values())
+
+
+def record_events(conn, events: Iterable[Dict[str, Any]]) -> int:
+    """
+    Append normalized events (see webhook_events.normalize_event) to
+    outreach_events and fold them into outreach_message_state, on `conn`.
+    Returns the number of state rows touched.
+    """
+    events = list(events)
+    if not events:
+        return 0
+    conn.execute(_INSERT_EVENT, [{
+        "message_id":  e["message_id"],
+        "email":       e["email"] or None,
+        "provider_id": e.get("provider_id"),
+        "campaign_id": e.get("campaign_id"),
+        "event":       e["event"],
+        "event_time":  e["event_time"],
+        "sg_event_id": e.get("sg_event_id"),
+        "url":         e.get("url") or None,
+    } for e in events])
+    states = _fold(events)
+    if states:
+        conn.execute(_UPSERT_STATE, states)
+    return len(states)
+
+
+def record_sent(batch: List[Dict[str, Any]], message_id: Optional[str], sent_at: str,
+                campaign_id: Optional[str] = None, conn=None) -> int:
+    """A 'sent' event per message of a batch SendGrid accepted."""
+    if not message_id:
+        return 0
+    events = [{
+        "message_id": message_id, "email": msg["recipient"], "provider_id": msg.get("provider_id"),
+        "campaign_id": campaign_id, "event": "sent", "event_time": sent_at, "ts": 0,
+    } for msg in batch]
+    if conn is not None:
+        return record_events(conn, events)
+    with engine.begin() as c:
+        return record_events(c, events)
+
+
+def funnel(campaign_id: Optional[str] = None) -> Dict[str, Any]:
+    """sent → delivered → opened → clicked counts (plus failures) and rates."""
+    where = "WHERE campaign_id = :campaign_id" if campaign_id else ""
+    with engine.connect() as conn:
+        row = conn.execute(text(f"""
+            SELECT COUNT(*), {", ".join(f"COUNT({c})" for c in MILESTONE_COLUMNS)}
+            FROM outreach_message_state {where}
+        """), {"campaign_id": campaign_id}).fetchone()
+    messages, *counts = row
+    stages = dict(zip((c[:-3] for c in MILESTONE_COLUMNS), counts))
+
+    def rate(n, d):
+        return round(n / d, 4) if d else 0.0
+
+    return {
+        "campaign_id": campaign_id,
+        "messages":    messages,
+        **stages,
+        "rates": {
+            "delivered": rate(stages["delivered"], stages["sent"]),
+            "opened":    rate(stages["opened"], stages["delivered"]),
+            "clicked":   rate(stages["clicked"], stages["opened"]),
+            "bounced":   rate(stages["bounced"], stages["sent"]),
+        },
+    }
+
+
+def message_history(message_id: str, email: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Every stored event of one SendGrid message, oldest first."""
+    where = "message_id = :message_id" + (" AND recipient_email = :email" if email else "")
+    with engine.connect() as conn:
+        rows = conn.execute(text(f"""
+            SELECT recipient_email, provider_id, campaign_id, event, event_time, sg_event_id, url
+            FROM outreach_events WHERE {where}
+            ORDER BY event_time, id
+        """), {"message_id": message_id, "email": email})
+        return [dict(r._mapping) for r in rows]
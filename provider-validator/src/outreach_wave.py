@@ -0,0 +1,129 @@
+# src/outreach_wave.py
+"""
+Outreach wave job.
+
+/send-outreach used to load the first 500 merged providers and await the
+agent for each one inside the request. A wave now runs as a background job
+over the whole flagged set:
+
+  iter_flagged_providers()   keyset pages (id > last id) off the partial
+                             index ix_providers_needs_outreach
+  draft pool                 up to `workers` pages drafted at once in threads
+                             (template render + cached email checks; the DNS
+                             lookups are what actually overlap)
+  outbox                     each page's drafts bulk-inserted into
+                             outreach_outbox under the wave's campaign id
+
+Each wave is a batch_jobs row with kind='outreach'. committed_offset is the
+last provider id queued, so resume=True continues a wave that died.
+Progress goes out on the batch progress bus like any batch: read = providers
+scanned, written = drafts queued, skipped = no outreach needed, no usable
+email, or already queued in this campaign.
+"""
+
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional
+
+from sqlalchemy import text
+from src.db import engine, init_db, NEEDS_OUTREACH_SQL
+from src.agents.outreach_agent import OutreachAgent
+from src.email_sender import draft_to_message
+from src.outbox import SqlOutbox
+from src.progress import BatchProgress
+from src import jobs
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 1000
+
+
+def count_flagged_providers(after_id: int = 0) -> int:
+    with engine.connect() as conn:
+        return conn.execute(text(
+            f"SELECT COUNT(*) FROM providers WHERE {NEEDS_OUTREACH_SQL} AND id > :after"
+        ), {"after": after_id}).scalar() or 0
+
+
+def iter_flagged_providers(after_id: int = 0, page_size: int = PAGE_SIZE) -> Iterator[List[Dict[str, Any]]]:
+    """Yield pages of providers needing outreach, in id order, starting after `after_id`."""
+    query = text(f"""
+        SELECT * FROM providers
+        WHERE {NEEDS_OUTREACH_SQL} AND id > :after
+        ORDER BY id
+        LIMIT :limit
+    """)
+    while True:
+        with engine.connect() as conn:
+            result = conn.execute(query, {"after": after_id, "limit": page_size})
+            page = [dict(r._mapping) for r in result]
+        if not page:
+            return
+        yield page
+        after_id = page[-1]["id"]
+        if len(page) < page_size:
+            return
+
+
+def _draft_page(agent: OutreachAgent, page: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [m for m in map(draft_to_message, agent.iter_drafts(page)) if m]
+
+
+async def run_outreach_wave(job_id: str, campaign_id: Optional[str] = None, workers: int = 4,
+                            page_size: int = PAGE_SIZE, resume: bool = False) -> Dict[str, Any]:
+    """
+    Draft and queue outreach for every flagged provider. Returns the final
+    progress snapshot plus the campaign id.
+    """
+    campaign_id = campaign_id or job_id
+    init_db()
+
+    start_after, resumed_from = 0, None
+    redelivered = jobs.get_job(job_id) is not None      # see jobs.create_job
+    if resume and not redelivered:
+        previous = jobs.find_resumable_job("providers", kind="outreach")
+        if previous and previous["params"].get("campaign_id") == campaign_id:
+            start_after, resumed_from = previous["committed_offset"] or 0, previous["id"]
+    job = jobs.create_job(job_id, "providers", "", kind="outreach", committed_offset=start_after,
+                          resumed_from=resumed_from,
+                          params={"campaign_id": campaign_id, "workers": workers, "page_size": page_size})
+    if job["status"] != "running":
+        return {"written": 0, **job["stats"], "campaign_id": campaign_id}
+    if redelivered:
+        start_after = job["committed_offset"] or 0
+
+    progress = BatchProgress(job_id)
+    progress.set_total(count_flagged_providers(start_after))
+    agent, outbox = OutreachAgent(name="outreach_agent"), SqlOutbox(campaign_id)
+    loop = asyncio.get_running_loop()
+
+    def queue(page, messages):
+        # queueing + checkpoint in one transaction, like an orchestrator flush
+        with engine.begin() as conn:
+            queued = outbox.add(messages, conn=conn) if messages else 0
+            progress.incr(written=queued, skipped=len(page) - queued, drafted=len(messages))
+            jobs.checkpoint(conn, job_id, page[-1]["id"], progress.snapshot())
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="outreach-draft") as pool:
+            in_flight = []
+            for page in iter_flagged_providers(start_after, page_size):
+                progress.incr(read=len(page))
+                in_flight.append((page, loop.run_in_executor(pool, _draft_page, agent, page)))
+                # pages are queued in order so the checkpoint never skips one
+                while len(in_flight) >= workers or (in_flight and in_flight[0][1].done()):
+                    done_page, fut = in_flight.pop(0)
+                    await asyncio.to_thread(queue, done_page, await fut)
+            for done_page, fut in in_flight:
+                await asyncio.to_thread(queue, done_page, await fut)
+    except Exception as e:
+        progress.finish("failed", error=str(e))
+        jobs.finish_job(job_id, "failed", progress.snapshot(), error=str(e))
+        raise
+
+    progress.finish("completed")
+    stats = {**progress.snapshot(), "campaign_id": campaign_id}
+    jobs.finish_job(job_id, "completed", stats)
+    logger.info(f"[outreach] wave {job_id} queued {stats['written']} drafts into campaign {campaign_id}")
+    return stats
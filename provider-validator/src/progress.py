@@ -0,0 +1,228 @@
+# src/progress.py
+"""
+Batch progress pub/sub.
+
+The orchestrator publishes running counters for a batch (rows read /
+validated / written / failed / skipped, rows/sec, ETA) and the API streams them to
+the dashboard as Server-Sent Events — see GET /batches/{task_id}/events.
+
+Two backends:
+  redis   → Redis pub/sub + a "last snapshot" key, so the Celery worker and
+            the API process can talk and late subscribers see current state
+  memory  → in-process queues; used when Redis isn't reachable (dev, tests,
+            the thread-fallback batch path)
+
+PROGRESS_BACKEND=redis|memory forces one; by default Redis is used if it
+answers a ping.
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL        = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+PROGRESS_BACKEND = os.getenv("PROGRESS_BACKEND", "auto")
+CHANNEL_PREFIX   = "batch-progress:"
+SNAPSHOT_TTL     = 24 * 3600          # keep the last snapshot around for a day
+TERMINAL_STATES  = ("completed", "failed")
+# In-process bus: final snapshots kept for late subscribers, oldest dropped first
+FINISHED_SNAPSHOTS = int(os.getenv("PROGRESS_FINISHED_SNAPSHOTS", "1000"))
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Backends
+# ─────────────────────────────────────────────────────────────────────────────
+class InProcessBus:
+    """Pub/sub inside one process. publish() is safe to call from any thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: Dict[str, List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+        self._last: Dict[str, Dict[str, Any]] = {}
+        self._finished: "OrderedDict[str, None]" = OrderedDict()
+
+    def publish(self, job_id: str, event: Dict[str, Any]):
+        with self._lock:
+            self._last[job_id] = event
+            if event.get("state") in TERMINAL_STATES:
+                self._finished[job_id] = None
+                self._finished.move_to_end(job_id)
+                while len(self._finished) > FINISHED_SNAPSHOTS:
+                    self._last.pop(self._finished.popitem(last=False)[0], None)
+            else:
+                self._finished.pop(job_id, None)
+            subscribers = list(self._subscribers.get(job_id, []))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+            except RuntimeError:
+                pass   # subscriber's loop already closed
+
+    def last(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._last.get(job_id)
+
+    async def subscribe(self, job_id: str, timeout: float = 15.0) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """Yield events for job_id; yields None after `timeout` idle seconds (keepalive)."""
+        queue: asyncio.Queue = asyncio.Queue()
+        entry = (asyncio.get_running_loop(), queue)
+        with self._lock:
+            self._subscribers.setdefault(job_id, []).append(entry)
+            last = self._last.get(job_id)
+        try:
+            if last is not None:
+                yield last
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            with self._lock:
+                subs = self._subscribers.get(job_id, [])
+                if entry in subs:
+                    subs.remove(entry)
+                if not subs:
+                    self._subscribers.pop(job_id, None)
+
+
+class RedisBus:
+    """Pub/sub over Redis so worker processes can reach API subscribers."""
+
+    def __init__(self, url: str = REDIS_URL):
+        import redis
+        self.url = url
+        self._client = redis.Redis.from_url(url, socket_connect_timeout=2)
+
+    def publish(self, job_id: str, event: Dict[str, Any]):
+        payload = json.dumps(event, default=str)
+        try:
+            pipe = self._client.pipeline(transaction=False)
+            pipe.set(f"{CHANNEL_PREFIX}last:{job_id}", payload, ex=SNAPSHOT_TTL)
+            pipe.publish(f"{CHANNEL_PREFIX}{job_id}", payload)
+            pipe.execute()
+        except Exception as e:
+            # progress is best-effort — never fail a batch over it
+            logger.warning(f"[progress] publish failed for {job_id}: {e}")
+
+    def last(self, job_id: str) -> Optional[Dict[str, Any]]:
+        raw = self._client.get(f"{CHANNEL_PREFIX}last:{job_id}")
+        return json.loads(raw) if raw else None
+
+    async def subscribe(self, job_id: str, timeout: float = 15.0) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        import redis.asyncio as aioredis
+        client = aioredis.Redis.from_url(self.url)
+        pubsub = client.pubsub()
+        await pubsub.subscribe(f"{CHANNEL_PREFIX}{job_id}")
+        try:
+            # subscribe first, then read the snapshot, so nothing falls in between
+            raw = await client.get(f"{CHANNEL_PREFIX}last:{job_id}")
+            if raw:
+                yield json.loads(raw)
+            while True:
+                msg = await pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+                yield json.loads(msg["data"]) if msg else None
+        finally:
+            await pubsub.unsubscribe()
+            await pubsub.close()
+            await client.close()
+
+
+_bus = None
+_bus_lock = threading.Lock()
+
+
+def get_bus():
+    """Return the process-wide progress bus (chosen once, on first use)."""
+    global _bus
+    if _bus is not None:
+        return _bus
+    with _bus_lock:
+        if _bus is None:
+            _bus = _make_bus()
+    return _bus
+
+
+def _make_bus():
+    if PROGRESS_BACKEND == "memory":
+        return InProcessBus()
+    try:
+        bus = RedisBus()
+        bus._client.ping()
+        return bus
+    except Exception as e:
+        if PROGRESS_BACKEND == "redis":
+            raise
+        logger.info(f"[progress] Redis unavailable ({e}) — using in-process bus")
+        return InProcessBus()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Counters published by the orchestrator
+# ─────────────────────────────────────────────────────────────────────────────
+class BatchProgress:
+    """
+    Running counters for one batch job.
+
+    incr() is cheap; a snapshot is published at most every `min_interval`
+    seconds (plus once at start and once at finish), so per-row calls don't
+    turn into per-row Redis round trips.
+    """
+
+    COUNTERS = ("read", "validated", "written", "failed", "skipped")
+
+    def __init__(self, job_id: str, total: Optional[int] = None, bus=None, min_interval: float = 0.5):
+        self.job_id       = job_id
+        self.total        = total
+        self.bus          = bus if bus is not None else get_bus()
+        self.min_interval = min_interval
+        self.counts       = {k: 0 for k in self.COUNTERS}
+        self.state        = "running"
+        self.started_at   = time.time()
+        self._last_publish = 0.0
+
+    def set_total(self, total: int):
+        self.total = total
+        self.publish(force=True)
+
+    def incr(self, **counts: int):
+        for key, n in counts.items():
+            self.counts[key] = self.counts.get(key, 0) + n
+        self.publish()
+
+    def finish(self, state: str = "completed", error: Optional[str] = None):
+        self.state = state
+        self.publish(force=True, error=error)
+
+    def snapshot(self) -> Dict[str, Any]:
+        elapsed = max(time.time() - self.started_at, 1e-6)
+        done    = self.counts["written"] + self.counts["failed"] + self.counts["skipped"]
+        rate    = done / elapsed
+        eta     = None
+        if self.total is not None and rate > 0 and self.state == "running":
+            eta = round(max(self.total - done, 0) / rate, 1)
+        return {
+            "job_id":          self.job_id,
+            "state":           self.state,
+            "total":           self.total,
+            **self.counts,
+            "elapsed_seconds": round(elapsed, 2),
+            "rows_per_sec":    round(rate, 2),
+            "eta_seconds":     eta,
+        }
+
+    def publish(self, force: bool = False, **extra):
+        now = time.monotonic()
+        if not force and now - self._last_publish < self.min_interval:
+            return
+        self._last_publish = now
+        event = self.snapshot()
+        event.update({k: v for k, v in extra.items() if v is not None})
+        self.bus.publish(self.job_id, event)
@@ -0,0 +1,200 @@
+# src/scoring.py
+"""
+Confidence scoring and QA rules, for one row or for a whole batch at once.
+
+ValidationAgent (weighted score), QAAgent (flags + status) and
+utils.score_combined all use the weights and thresholds defined here. The
+per-row helpers are plain Python. The *_batch helpers take NumPy columns
+(name_score, phone_valid, address_score) and give the same answers for
+every row of a chunk in a few array operations. They do no I/O.
+
+phone_valid is a float column: 1.0 valid, 0.0 invalid, NaN unknown. As in
+QAAgent, an unknown phone counts as 0 in the score but is not flagged
+invalid_phone.
+
+rescore() re-applies the math to rows already in the providers table, with
+the current or overridden weights and thresholds. It reads the validation
+matches from source_json, computes each chunk in one pass and writes back
+only the rows whose confidence, flags or status changed. confidence and
+final_confidence get the same value, as when the batch first wrote the row
+(the API, the UI and outreach selection read final_confidence). Rows a reviewer has
+already decided (any status other than pending / confirmed / manual_review)
+are not touched.
+
+    python -m src.scoring --weights name=0.5,phone=0.25,address=0.25 --dry-run
+    python -m src.scoring --low-confidence 0.6
+"""
+
+import argparse
+import json
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import bindparam, text
+
+logger = logging.getLogger(__name__)
+
+WEIGHTS = {"name": 0.4, "phone": 0.3, "address": 0.3}
+LOW_CONFIDENCE = 0.5          # score below → low_confidence
+NAME_MISMATCH = 0.6           # name_score below → name_mismatch
+
+# Flag order is also the bit order of the masks returned by qa_batch
+FLAGS = ("low_confidence", "invalid_phone", "name_mismatch")
+AUTO_STATUSES = ("pending", "confirmed", "manual_review")
+
+# mask → flags list / JSON, precomputed for every combination
+_FLAG_LISTS = [[f for bit, f in enumerate(FLAGS) if mask >> bit & 1] for mask in range(1 << len(FLAGS))]
+_FLAG_JSON = [json.dumps(flags) for flags in _FLAG_LISTS]
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Per row
+# ─────────────────────────────────────────────────────────────────────────────
+def score_row(name_score: float, phone_valid: Optional[bool], address_score: float,
+              weights: Optional[Dict[str, float]] = None) -> float:
+    w = weights or WEIGHTS
+    return (w["name"] * name_score + w["phone"] * (1.0 if phone_valid else 0.0)
+            + w["address"] * address_score)
+
+
+def qa_row(score: float, phone_valid: Optional[bool], name_score: float,
+           low_confidence: float = LOW_CONFIDENCE, name_mismatch: float = NAME_MISMATCH
+           ) -> Tuple[List[str], str]:
+    """(flags, status) for one row. phone_valid=None means unknown (not flagged)."""
+    flags = []
+    if score < low_confidence:
+        flags.append("low_confidence")
+    if phone_valid is False:
+        flags.append("invalid_phone")
+    if name_score < name_mismatch:
+        flags.append("name_mismatch")
+    return flags, "manual_review" if flags else "confirmed"
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Per batch
+# ─────────────────────────────────────────────────────────────────────────────
+def score_batch(name_score, phone_valid, address_score,
+                weights: Optional[Dict[str, float]] = None) -> np.ndarray:
+    w = weights or WEIGHTS
+    phone = np.nan_to_num(np.asarray(phone_valid, dtype=np.float64), nan=0.0)
+    return (w["name"] * np.asarray(name_score, dtype=np.float64) + w["phone"] * phone
+            + w["address"] * np.asarray(address_score, dtype=np.float64))
+
+
+def qa_batch(score, phone_valid, name_score, low_confidence: float = LOW_CONFIDENCE,
+             name_mismatch: float = NAME_MISMATCH) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (flag_mask, needs_review) arrays. Bit i of flag_mask is FLAGS[i];
+    needs_review is True where status is manual_review.
+    """
+    mask = (np.asarray(score) < low_confidence).astype(np.uint8)
+    mask |= (np.asarray(phone_valid, dtype=np.float64) == 0.0).astype(np.uint8) << 1   # NaN ≠ 0
+    mask |= (np.asarray(name_score) < name_mismatch).astype(np.uint8) << 2
+    return mask, mask != 0
+
+
+def flag_lists(mask: Sequence[int]) -> List[List[str]]:
+    return [_FLAG_LISTS[m] for m in np.asarray(mask).tolist()]
+
+
+def matches_to_columns(matches: Sequence[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """validation_result["matches"] dicts → (name_score, phone_valid, address_score) columns."""
+    n = len(matches)
+    name = np.fromiter((m.get("name_score") or 0.0 for m in matches), np.float64, n)
+    phone = np.fromiter((np.nan if m.get("phone_valid") is None else float(m["phone_valid"])
+                         for m in matches), np.float64, n)
+    addr = np.fromiter((m.get("address_score") or 0.0 for m in matches), np.float64, n)
+    return name, phone, addr
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Bulk re-score of stored rows
+# ─────────────────────────────────────────────────────────────────────────────
+def _stored_matches(source_json: Optional[str]) -> Optional[Dict[str, Any]]:
+    try:
+        return json.loads(source_json or "{}").get("validation", {}).get("matches")
+    except (ValueError, AttributeError):
+        return None
+
+
+def rescore(weights: Optional[Dict[str, float]] = None, low_confidence: float = LOW_CONFIDENCE,
+            name_mismatch: float = NAME_MISMATCH, chunk_size: int = 20_000,
+            dry_run: bool = False) -> Dict[str, int]:
+    """
+    Recompute (final_)confidence / flags / status for every auto-scored provider
+    from its stored validation matches. Returns
+    {scanned, scored, changed, updated, confirmed, manual_review}.
+    """
+    from src.db import engine
+
+    select = text(
+        "SELECT id, source_json, confidence, final_confidence, flags, status FROM providers "
+        "WHERE id > :after AND status IN :statuses ORDER BY id LIMIT :n"
+    ).bindparams(bindparam("statuses", expanding=True))
+    update = text("UPDATE providers SET confidence = :confidence, final_confidence = :confidence, "
+                  "flags = :flags, status = :status WHERE id = :id")
+    stats = {"scanned": 0, "scored": 0, "changed": 0, "updated": 0, "confirmed": 0, "manual_review": 0}
+    after = 0
+    while True:
+        with engine.connect() as conn:
+            rows = conn.execute(select, {"after": after, "statuses": list(AUTO_STATUSES),
+                                         "n": chunk_size}).fetchall()
+        if not rows:
+            break
+        after = rows[-1][0]
+        stats["scanned"] += len(rows)
+
+        keep, matches = [], []
+        for row in rows:
+            m = _stored_matches(row[1])
+            if m:
+                keep.append(row)
+                matches.append(m)
+        if not keep:
+            continue
+        name, phone, addr = matches_to_columns(matches)
+        score = np.round(score_batch(name, phone, addr, weights), 3)
+        mask, review = qa_batch(score, phone, name, low_confidence, name_mismatch)
+
+        changes = []
+        for row, conf, m, r in zip(keep, score.tolist(), mask.tolist(), review.tolist()):
+            status = "manual_review" if r else "confirmed"
+            if (any(c is None or abs(c - conf) > 1e-9 for c in (row[2], row[3]))
+                    or row[4] != _FLAG_JSON[m] or row[5] != status):
+                changes.append({"id": row[0], "confidence": conf, "flags": _FLAG_JSON[m], "status": status})
+        stats["scored"] += len(keep)
+        stats["manual_review"] += int(review.sum())
+        stats["confirmed"] += len(keep) - int(review.sum())
+        stats["changed"] += len(changes)
+        if changes and not dry_run:
+            with engine.begin() as conn:
+                conn.execute(update, changes)
+            stats["updated"] += len(changes)
+    logger.info("rescore_finished", extra={**stats, "dry_run": dry_run})
+    return stats
+
+
+def _parse_weights(spec: str) -> Dict[str, float]:
+    weights = dict(WEIGHTS)
+    for part in spec.split(","):
+        key, _, value = part.partition("=")
+        if key.strip() not in WEIGHTS:
+            raise argparse.ArgumentTypeError(f"unknown weight {key!r} (name, phone, address)")
+        weights[key.strip()] = float(value)
+    return weights
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(prog="python -m src.scoring",
+                                 description="Re-score stored providers with new weights / thresholds")
+    ap.add_argument("--weights", type=_parse_weights, default=None,
+                    help="e.g. name=0.5,phone=0.25,address=0.25 (unlisted keep their default)")
+    ap.add_argument("--low-confidence", type=float, default=LOW_CONFIDENCE)
+    ap.add_argument("--name-mismatch", type=float, default=NAME_MISMATCH)
+    ap.add_argument("--chunk-size", type=int, default=20_000)
+    ap.add_argument("--dry-run", action="store_true", help="count changes without writing them")
+    args = ap.parse_args()
+    result = rescore(args.weights, args.low_confidence, args.name_mismatch, args.chunk_size, args.dry_run)
+    print(f"[INFO] rescore {'(dry run) ' if args.dry_run else ''}{result}")
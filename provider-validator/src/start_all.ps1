@@ -69,7 +69,7 @@ try {
     $celeryJob = Start-Job -ScriptBlock {
         Set-Location $using:PWD
         & "$using:PWD\venv\Scripts\Activate.ps1"
-        celery -A src.celery_app.celery_app worker --loglevel=info --pool=solo
+        celery -A src.celery_app.celery_app worker --loglevel=info --pool=solo -Q ocr,fetch,db,outreach
     }
     
     Start-Sleep -Seconds 5
@@ -2,6 +2,7 @@ from src.celery_app import celery_app
 from src.orchestrator import run_batch
 from src.agents.outreach_agent import OutreachAgent
 from src.email_sender import send_email_sendgrid
+from src.outreach_dispatcher import backoff_delay
 import asyncio
 
 @celery_app.task
@@ -14,13 +15,17 @@ def run_batch_task(limit=50, concurrency=6):
 
 
 
-@celery_app.task(name="send_outreach_task", bind=True, max_retries=3, default_retry_delay=60)
+# Single-provider send. Waves should use src.celery_app.dispatch_outreach_task,
+# which batches and rate-limits the whole set from one task.
+@celery_app.task(name="send_outreach_task", bind=True, max_retries=3)
 def send_outreach_task(self, provider_payload):
     try:
         agent = OutreachAgent("outreach")
         draft = asyncio.run(agent.run(provider_payload))
-        if not draft.get("recipient"):
+        if not draft or not draft.get("recipient"):
             return {"status": "no_valid_email"}
         return send_email_sendgrid(draft, task_id=self.request.id)
     except Exception as exc:
-        raise self.retry(exc=exc)
\ No newline at end of file
+        # jittered exponential backoff instead of a flat 60s, so a burst of
+        # failures doesn't come back as a synchronized burst of retries
+        raise self.retry(exc=exc, countdown=backoff_delay(self.request.retries, floor=1.0))
\ No newline at end of file
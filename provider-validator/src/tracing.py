@@ -1,19 +1,121 @@
 # src/tracing.py
+"""
+OpenTelemetry setup for the API and the Celery workers.
+
+Spans are exported from a BatchSpanProcessor. Ended spans go into an
+in-memory queue, and a background thread ships them in batches. The request
+path never waits on the exporter, and a full queue drops spans instead of
+blocking. The queue and batch sizes come from the standard OTEL_BSP_* env
+vars (OTEL_BSP_MAX_QUEUE_SIZE, OTEL_BSP_SCHEDULE_DELAY,
+OTEL_BSP_MAX_EXPORT_BATCH_SIZE).
+
+  TRACING_EXPORTER       console (default) | otlp | file | none
+  TRACING_SAMPLE_RATIO   head sampling ratio for new traces (default 0.1);
+                         child spans follow their parent's decision, so a
+                         batch is traced completely or not at all
+  TRACING_FILE           JSON-lines output for the file exporter
+                         (default data/traces.jsonl)
+  OTEL_EXPORTER_OTLP_ENDPOINT   collector for the otlp exporter
+                         (needs opentelemetry-exporter-otlp-proto-http)
+
+Pipeline spans: run_batch → row → agent.<name> (→ ocr.pdf_to_text /
+http.fetch) and db.flush per chunk.
+"""
+
+import os
+import json
+import logging
+import functools
+import threading
+from typing import Optional, Sequence
+
 from opentelemetry import trace
 from opentelemetry.sdk.resources import Resource
-from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import SimpleSpanProcessor, ConsoleSpanExporter
+from opentelemetry.sdk.trace import TracerProvider, ReadableSpan
+from opentelemetry.sdk.trace.export import (BatchSpanProcessor, ConsoleSpanExporter,
+                                            SpanExporter, SpanExportResult)
+from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
 from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
 from opentelemetry.instrumentation.requests import RequestsInstrumentor
 RequestsInstrumentor().instrument()
 
+logger = logging.getLogger(__name__)
 
-def init_tracing(app):
-    resource = Resource.create({"service.name": "provider-validator-api"})
-    provider = TracerProvider(resource=resource)
+TRACING_EXPORTER     = os.getenv("TRACING_EXPORTER", "console").lower()
+TRACING_SAMPLE_RATIO = float(os.getenv("TRACING_SAMPLE_RATIO", "0.1"))
+TRACING_FILE         = os.getenv("TRACING_FILE", "data/traces.jsonl")
+
+tracer = trace.get_tracer("provider_validator")
+
+_provider: Optional[TracerProvider] = None
+
+
+class JsonFileSpanExporter(SpanExporter):
+    """Append finished spans to a file, one JSON object per line."""
+
+    def __init__(self, path: str = TRACING_FILE):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        lines = "".join(json.dumps(json.loads(s.to_json()), separators=(",", ":")) + "\n" for s in spans)
+        with self._lock:
+            self._file.write(lines)
+            self._file.flush()
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        with self._lock:
+            self._file.close()
+
+
+def _make_exporter(kind: str) -> Optional[SpanExporter]:
+    if kind == "none":
+        return None
+    if kind == "file":
+        return JsonFileSpanExporter()
+    if kind == "otlp":
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        except ImportError:
+            logger.warning("TRACING_EXPORTER=otlp but opentelemetry-exporter-otlp-proto-http "
+                           "is not installed — spans will not be exported")
+            return None
+        return OTLPSpanExporter()
+    return ConsoleSpanExporter()
+
+
+def setup_tracing(service_name: str, exporter: Optional[str] = None,
+                  sample_ratio: Optional[float] = None) -> TracerProvider:
+    """Install the global tracer provider once per process; later calls return it."""
+    global _provider
+    if _provider is not None:
+        return _provider
+    ratio = TRACING_SAMPLE_RATIO if sample_ratio is None else sample_ratio
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": service_name}),
+        sampler=ParentBased(TraceIdRatioBased(ratio)),
+    )
+    span_exporter = _make_exporter(exporter or TRACING_EXPORTER)
+    if span_exporter is not None:
+        provider.add_span_processor(BatchSpanProcessor(span_exporter))
     trace.set_tracer_provider(provider)
-    # Console exporter for local debugging
-    console_exporter = ConsoleSpanExporter()
-    provider.add_span_processor(SimpleSpanProcessor(console_exporter))
+    _provider = provider
+    return provider
+
+
+def init_tracing(app):
+    provider = setup_tracing("provider-validator-api")
     # instrument FastAPI
     FastAPIInstrumentor.instrument_app(app, tracer_provider=provider)
+
+
+def trace_agent(run):
+    """Wrap an agent's async run() in an agent.<name> span."""
+    @functools.wraps(run)
+    async def wrapper(self, *args, **kwargs):
+        agent = getattr(self, "name", None) or type(self).__name__
+        with tracer.start_as_current_span(f"agent.{agent}", attributes={"agent.name": agent}):
+            return await run(self, *args, **kwargs)
+    return wrapper
@@ -1,27 +1,112 @@
 # src/utils.py
-from Levenshtein import ratio
+import os
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+import numpy as np
 import phonenumbers
+from rapidfuzz import fuzz, process
+from src.scoring import WEIGHTS
+
+# Scorers for fuzzy_scores / fuzzy_matrix. "ratio" is the plain normalized
+# edit similarity (what fuzzy_ratio returns); the token scorers ignore word
+# order ("Smith John" vs "John Smith") and, for token_set, extra words
+# ("100 Main St Suite 4" vs "100 Main St").
+SCORERS = {
+    "ratio":      fuzz.ratio,
+    "token_sort": fuzz.token_sort_ratio,
+    "token_set":  fuzz.token_set_ratio,
+}
+FUZZY_WORKERS = int(os.getenv("FUZZY_WORKERS", "1"))   # -1 = all cores
+
 
-def fuzzy_ratio(a: str, b: str) -> float:
+def _prep(value) -> str:
+    return str(value).lower() if value else ""
+
+
+def fuzzy_ratio(a: str, b: str, scorer: str = "ratio") -> float:
     if not a or not b:
         return 0.0
+    return SCORERS[scorer](_prep(a), _prep(b)) / 100.0
+
+
+def fuzzy_scores(claimed, observed, scorer: str = "ratio", workers: int = None) -> np.ndarray:
+    """
+    Pairwise fuzzy_ratio for two equal-length sequences, in one call:
+    out[i] = fuzzy_ratio(claimed[i], observed[i]). Empty/None on either side
+    scores 0.0, like fuzzy_ratio.
+    """
+    a, b = [_prep(x) for x in claimed], [_prep(x) for x in observed]
+    if len(a) != len(b):
+        raise ValueError(f"fuzzy_scores needs equal lengths, got {len(a)} and {len(b)}")
+    if not a:
+        return np.zeros(0)
+    scores = process.cpdist(a, b, scorer=SCORERS[scorer], dtype=np.float64,
+                            workers=FUZZY_WORKERS if workers is None else workers) / 100.0
+    scores[[not x or not y for x, y in zip(a, b)]] = 0.0
+    return scores
+
+
+def fuzzy_matrix(queries, choices, scorer: str = "ratio", workers: int = None,
+                 score_cutoff: float = 0.0) -> np.ndarray:
+    """
+    All-pairs scores, shape (len(queries), len(choices)), for candidate
+    search within a chunk. Scores below score_cutoff come back as 0.0.
+    """
+    q, c = [_prep(x) for x in queries], [_prep(x) for x in choices]
+    if not q or not c:
+        return np.zeros((len(q), len(c)))
+    scores = process.cdist(q, c, scorer=SCORERS[scorer], dtype=np.float64,
+                           score_cutoff=score_cutoff * 100.0,
+                           workers=FUZZY_WORKERS if workers is None else workers) / 100.0
+    scores[[not x for x in q], :] = 0.0
+    scores[:, [not x for x in c]] = 0.0
+    return scores
+
+_PHONE_TYPES = {v: k for k, v in vars(phonenumbers.PhoneNumberType).items()
+                if not k.startswith("_") and isinstance(v, int)}
+
+
+@lru_cache(maxsize=int(os.getenv("PHONE_CACHE_SIZE", "200000")))
+def _parse_phone(phone: str, region: str) -> Tuple[Optional[str], bool, Optional[str]]:
     try:
-        return ratio(str(a).lower(), str(b).lower())
-    except:
-        return 0.0
+        pn = phonenumbers.parse(phone, region)
+    except phonenumbers.NumberParseException:
+        return phone, False, None
+    if phonenumbers.is_valid_number(pn):
+        return (phonenumbers.format_number(pn, phonenumbers.PhoneNumberFormat.E164), True,
+                _PHONE_TYPES.get(phonenumbers.number_type(pn)))
+    return phonenumbers.format_number(pn, phonenumbers.PhoneNumberFormat.INTERNATIONAL), False, None
 
-def normalize_phone(phone: str, default_region="US"):
+
+def parse_phone(phone, default_region="US") -> Tuple[Optional[str], bool, Optional[str]]:
+    """
+    (normalized, valid, type) for one phone, memoized per (phone, region):
+    group practices share numbers, so each distinct string is parsed once
+    per process (PHONE_CACHE_SIZE entries, LRU).
+
+    normalized is E164 for valid numbers, INTERNATIONAL for parseable but
+    invalid ones and the input unchanged when it cannot be parsed; type is
+    the phonenumbers.PhoneNumberType name (e.g. "FIXED_LINE_OR_MOBILE").
+    """
     if not phone:
-        return None
-    try:
-        pn = phonenumbers.parse(phone, default_region)
-        if phonenumbers.is_valid_number(pn):
-            return phonenumbers.format_number(pn, phonenumbers.PhoneNumberFormat.E164)
-        else:
-            return phonenumbers.format_number(pn, phonenumbers.PhoneNumberFormat.INTERNATIONAL)
-    except:
-        return phone
+        return None, False, None
+    return _parse_phone(str(phone), default_region)
+
+
+def parse_phones(phones, default_region="US") -> List[Tuple[Optional[str], bool, Optional[str]]]:
+    """parse_phone for a whole chunk; duplicates within it are looked up once."""
+    seen = {}
+    for p in phones:
+        if p not in seen:
+            seen[p] = parse_phone(p, default_region)
+    return [seen[p] for p in phones]
+
+
+def normalize_phone(phone: str, default_region="US"):
+    return parse_phone(phone, default_region)[0]
+
 
 def score_combined(name_score: float, phone_score: float, address_score: float) -> float:
-    # element weights: name 0.4, phone 0.3, address 0.3
-    return 0.4 * name_score + 0.3 * phone_score + 0.3 * address_score
+    # element weights: src.scoring.WEIGHTS (name 0.4, phone 0.3, address 0.3)
+    return WEIGHTS["name"] * name_score + WEIGHTS["phone"] * phone_score + WEIGHTS["address"] * address_score
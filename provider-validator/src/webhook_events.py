@@ -0,0 +1,390 @@
+# src/webhook_events.py
+"""
+SendGrid event processing.
+
+SendGrid posts arrays of up to 1000 events. apply_events() handles a whole
+array in ONE transaction on the shared engine:
+
+  1. normalize    pull email / event / time / message id / provider_id out of
+                  each event (custom_args come back as top-level keys)
+  2. resolve      one set-based query over ix_outreach_logs_recipient maps
+                  every (email, X-Message-Id) to the outreach_logs row it
+                  belongs to; if the message id is unknown, the newest row
+                  for that email is used
+  3. coalesce     several events for one row in a POST → keep the latest
+  4. write        executemany UPDATE for matched rows, executemany INSERT for
+                  webhook-only events, one set-based UPDATE for verification
+                  link clicks
+
+Every event (before coalescing) is also appended to outreach_events and
+folded into outreach_message_state — see src/outreach_events.py.
+
+The webhook route itself only validates a POST and appends it to
+webhook_inbox. consume_inbox() (Celery beat, every few seconds) drains the
+inbox: it drops retried events by sg_event_id, keeps only the latest event
+per message, and applies everything claimed in one transaction. If that
+transaction fails, the claimed batches are applied again one per
+transaction, so a single bad POST cannot hold back the others. A batch that
+fails on its own goes back to pending with an exponential backoff and is
+marked 'failed' after WEBHOOK_MAX_ATTEMPTS tries.
+
+sg_message_id looks like "<X-Message-Id>.filterdrecv-…"; the part before the
+first dot is the X-Message-Id we stored in provider_response_id at send time.
+"""
+
+import os
+import json
+import uuid
+import logging
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from sqlalchemy import bindparam, text
+from src.db import engine, IS_POSTGRES, db_now
+from src.dbutils import mark_providers_verified_bulk
+from src.outreach_events import record_events
+
+logger = logging.getLogger(__name__)
+
+
+def _extract_provider_id_from_url(url: str) -> Optional[int]:
+    """
+    Extract the provider_id query parameter from a URL like:
+      http://localhost:8000/verify?provider_id=42
+    Returns the integer id, or None if not found.
+    """
+    try:
+        pid_list = parse_qs(urlparse(url).query).get("provider_id", [])
+        if pid_list:
+            return int(pid_list[0])
+    except Exception:
+        pass
+    return None
+
+
+def _as_int(value) -> Optional[int]:
+    try:
+        return int(value) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def normalize_event(event: Dict[str, Any]) -> Dict[str, Any]:
+    timestamp = event.get("timestamp")
+    try:
+        ts = float(timestamp) if timestamp is not None else None
+    except (TypeError, ValueError):
+        ts = None
+    sg_msg_id = event.get("sg_message_id") or ""
+    return {
+        "email":        (event.get("email") or "").strip(),
+        "event":        event.get("event") or "unknown",
+        "ts":           ts,
+        # Unix timestamp → naive UTC ISO string, the same clock as record_sent's utcnow()
+        "event_time":   (datetime.fromtimestamp(ts, tz=timezone.utc).replace(tzinfo=None) if ts
+                         else datetime.utcnow()).isoformat(),
+        "sg_event_id":  event.get("sg_event_id"),
+        "sg_message_id": sg_msg_id,
+        "message_id":   sg_msg_id.split(".", 1)[0] or None,
+        "url":          event.get("url") or "",     # Only present on 'click' events
+        # custom_args set at send time (src/delivery.py build_payload)
+        "provider_id":  _as_int(event.get("provider_id")),
+        "campaign_id":  event.get("task_id") or None,
+    }
+
+
+def _resolve_log_ids(conn, events: List[Dict[str, Any]]) -> Dict[int, int]:
+    """Map event index → outreach_logs.id with a single indexed query."""
+    emails = sorted({e["email"] for e in events if e["email"]})
+    if not emails:
+        return {}
+    rows = conn.execute(text("""
+        SELECT recipient_email, provider_response_id, MAX(id)
+        FROM outreach_logs
+        WHERE recipient_email IN :emails
+        GROUP BY recipient_email, provider_response_id
+    """).bindparams(bindparam("emails", expanding=True)), {"emails": emails}).fetchall()
+
+    by_message: Dict[tuple, int] = {}
+    newest: Dict[str, int] = {}
+    for email, response_id, log_id in rows:
+        by_message[(email, response_id)] = log_id
+        newest[email] = max(log_id, newest.get(email, 0))
+
+    resolved = {}
+    for i, e in enumerate(events):
+        log_id = by_message.get((e["email"], e["message_id"])) or newest.get(e["email"])
+        if log_id:
+            resolved[i] = log_id
+    return resolved
+
+
+def apply_events(raw_events: Iterable[Dict[str, Any]], conn=None) -> Dict[str, Any]:
+    """Apply a batch of SendGrid events; returns counts. See module docstring."""
+    events = [normalize_event(e) for e in raw_events if isinstance(e, dict)]
+    if conn is None:
+        with engine.begin() as c:
+            record_events(c, events)
+            return _apply(c, events)
+    record_events(conn, events)
+    return _apply(conn, events)
+
+
+def _apply(conn, events: List[Dict[str, Any]]) -> Dict[str, Any]:
+    resolved = _resolve_log_ids(conn, events)
+
+    # Latest event per log row wins; arrival order breaks timestamp ties
+    latest: Dict[int, Dict[str, Any]] = {}
+    unmatched = []
+    for i, e in enumerate(events):
+        log_id = resolved.get(i)
+        if log_id is None:
+            unmatched.append(e)
+        elif log_id not in latest or (e["ts"] or 0) >= (latest[log_id]["ts"] or 0):
+            latest[log_id] = e
+
+    if latest:
+        conn.execute(text("""
+            UPDATE outreach_logs
+            SET send_status = :status,
+                send_time   = :event_time
+            WHERE id = :id
+        """), [{"id": log_id, "status": e["event"], "event_time": e["event_time"]}
+               for log_id, e in latest.items()])
+
+    if unmatched:
+        # No existing row — keep a webhook-only log entry
+        conn.execute(text("""
+            INSERT INTO outreach_logs
+                (recipient_email, send_status, send_time, provider_response_id)
+            VALUES
+                (:email, :status, :event_time, :message_id)
+        """), [{"email": e["email"], "status": e["event"], "event_time": e["event_time"],
+                "message_id": e["sg_message_id"][:100] or None} for e in unmatched])
+
+    # ── Special handling for specific event types ──────────────────────────
+    # A click on the verification link verifies the provider
+    verified_ids = sorted({
+        pid for pid in (_extract_provider_id_from_url(e["url"])
+                        for e in events if e["event"] == "click" and "verify" in e["url"])
+        if pid
+    })
+    verified = mark_providers_verified_bulk(verified_ids, source="email_link_click", conn=conn)
+
+    by_type = Counter(e["event"] for e in events)
+    if by_type.get("bounce"):
+        logger.warning(f"[webhook] ❌ {by_type['bounce']} bounces — permanent delivery failures")
+    if by_type.get("spamreport"):
+        logger.warning(f"[webhook] ⚠️ {by_type['spamreport']} spam reports — consider suppressing")
+    # deferred is normal — SendGrid retries on its own, nothing to do
+
+    return {"processed": len(events), "updated": len(latest), "inserted": len(unmatched),
+            "verified": verified, "by_type": dict(by_type)}
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Inbox — the webhook route only stores batches; a consumer applies them
+# ─────────────────────────────────────────────────────────────────────────────
+# SendGrid retries for up to 24h; remember event ids a bit longer than that
+EVENT_ID_RETENTION_HOURS = float(os.getenv("WEBHOOK_EVENT_ID_RETENTION_HOURS", "72"))
+INBOX_RETENTION_HOURS    = float(os.getenv("WEBHOOK_INBOX_RETENTION_HOURS", "168"))
+MAX_EVENTS_PER_POST      = int(os.getenv("WEBHOOK_MAX_EVENTS", "10000"))
+MAX_ATTEMPTS             = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "5"))
+RETRY_BACKOFF_SECONDS    = float(os.getenv("WEBHOOK_RETRY_BACKOFF_SECONDS", "30"))
+
+
+def validate_batch(payload: Any) -> List[Dict[str, Any]]:
+    """The POSTed body as a list of event dicts; ValueError if it isn't one."""
+    events = payload if isinstance(payload, list) else [payload]
+    if len(events) > MAX_EVENTS_PER_POST:
+        raise ValueError(f"too many events in one POST ({len(events)} > {MAX_EVENTS_PER_POST})")
+    for i, event in enumerate(events):
+        if not isinstance(event, dict) or not event.get("event"):
+            raise ValueError(f"event {i} is not an object with an 'event' field")
+    return events
+
+
+def enqueue_batch(events: List[Dict[str, Any]], source: str = "sendgrid") -> int:
+    """Append one raw POST to webhook_inbox; returns the inbox row id."""
+    with engine.begin() as conn:
+        row = conn.execute(text("""
+            INSERT INTO webhook_inbox (source, payload, event_count)
+            VALUES (:source, :payload, :n)
+            RETURNING id
+        """), {"source": source, "payload": json.dumps(events), "n": len(events)}).fetchone()
+    return row[0]
+
+
+def _claim_inbox(limit: int, worker_id: str) -> List[Any]:
+    params = {"limit": limit, "now": db_now(), "token": f"{worker_id}:{uuid.uuid4().hex[:8]}"}
+    with engine.begin() as conn:
+        if IS_POSTGRES:
+            return conn.execute(text("""
+                UPDATE webhook_inbox
+                SET state = 'processing', claimed_by = :token, claimed_at = :now
+                WHERE id IN (
+                    SELECT id FROM webhook_inbox
+                    WHERE state = 'pending' AND (available_at IS NULL OR available_at <= :now)
+                    ORDER BY id
+                    LIMIT :limit
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING id, payload, attempts
+            """), params).fetchall()
+        conn.execute(text("""
+            UPDATE webhook_inbox
+            SET state = 'processing', claimed_by = :token, claimed_at = :now
+            WHERE id IN (
+                SELECT id FROM webhook_inbox
+                WHERE state = 'pending' AND (available_at IS NULL OR available_at <= :now)
+                ORDER BY id LIMIT :limit
+            ) AND state = 'pending'
+        """), params)
+        return conn.execute(text("""
+            SELECT id, payload, attempts FROM webhook_inbox
+            WHERE claimed_by = :token AND state = 'processing' ORDER BY id
+        """), {"token": params["token"]}).fetchall()
+
+
+def dedupe_events(conn, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Drop events whose sg_event_id was already applied (SendGrid retries) or
+    repeats within this batch, and remember the new ids. Events without an
+    id are kept.
+    """
+    ids = sorted({e["sg_event_id"] for e in events if e.get("sg_event_id")})
+    seen = set()
+    if ids:
+        seen = set(conn.execute(text(
+            "SELECT sg_event_id FROM webhook_event_ids WHERE sg_event_id IN :ids"
+        ).bindparams(bindparam("ids", expanding=True)), {"ids": ids}).scalars())
+        new_ids = [i for i in ids if i not in seen]
+        if new_ids:
+            conn.execute(text("""
+                INSERT INTO webhook_event_ids (sg_event_id, seen_at) VALUES (:id, :now)
+                ON CONFLICT (sg_event_id) DO NOTHING
+            """), [{"id": i, "now": db_now()} for i in new_ids])
+    out = []
+    for e in events:
+        eid = e.get("sg_event_id")
+        if eid:
+            if eid in seen:
+                continue
+            seen.add(eid)
+        out.append(e)
+    return out
+
+
+def coalesce_events(events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Keep only the latest event per (email, message). Verification-link
+    clicks are always kept because they trigger their own update.
+    """
+    latest: Dict[tuple, Dict[str, Any]] = {}
+    keep = []
+    for e in events:
+        key = (e["email"], e["message_id"])
+        if key not in latest or (e["ts"] or 0) >= (latest[key]["ts"] or 0):
+            latest[key] = e
+        if e["event"] == "click" and "verify" in e["url"]:
+            keep.append(e)
+    chosen = list(latest.values())
+    chosen_ids = {id(e) for e in chosen}
+    return chosen + [e for e in keep if id(e) not in chosen_ids]
+
+
+def _apply_inbox_rows(rows: List[Any]) -> Dict[str, int]:
+    """dedupe → coalesce → apply_events → mark done, for `rows` in ONE transaction."""
+    raw = [e for r in rows for e in json.loads(r[1])]
+    events = [normalize_event(e) for e in raw if isinstance(e, dict)]
+    with engine.begin() as conn:
+        fresh = dedupe_events(conn, events)
+        record_events(conn, fresh)          # full history before coalescing
+        coalesced = coalesce_events(fresh)
+        result = _apply(conn, coalesced)
+        conn.execute(text("""
+            UPDATE webhook_inbox SET state = 'done', processed_at = :now, error = NULL
+            WHERE id IN :ids
+        """).bindparams(bindparam("ids", expanding=True)), {"now": db_now(), "ids": [r[0] for r in rows]})
+    return {"events": len(events), "duplicates": len(events) - len(fresh), "applied": len(coalesced),
+            **{k: result[k] for k in ("updated", "inserted", "verified")}}
+
+
+def _fail_inbox_row(inbox_id: int, attempts: int, error: Exception) -> str:
+    """
+    Put a batch that failed on its own back to pending after a backoff of
+    RETRY_BACKOFF_SECONDS · 2^(attempts-1); after MAX_ATTEMPTS mark it
+    'failed'. Returns the new state.
+    """
+    attempts += 1
+    state = "failed" if attempts >= MAX_ATTEMPTS else "pending"
+    with engine.begin() as conn:
+        conn.execute(text("""
+            UPDATE webhook_inbox
+            SET state = :state, attempts = :attempts, available_at = :available_at,
+                claimed_by = NULL, processed_at = :processed_at, error = :error
+            WHERE id = :id
+        """), {"id": inbox_id, "state": state, "attempts": attempts,
+               "available_at": db_now(RETRY_BACKOFF_SECONDS * 2 ** (attempts - 1)),
+               "processed_at": db_now() if state == "failed" else None, "error": str(error)[:500]})
+    if state == "failed":
+        logger.error(f"[webhook] inbox row {inbox_id} failed {attempts} times, giving up: {error}")
+    else:
+        logger.warning(f"[webhook] inbox row {inbox_id} failed (attempt {attempts}), will retry: {error}")
+    return state
+
+
+def consume_inbox(max_rows: int = 50, worker_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Claim up to `max_rows` pending inbox batches and apply them in ONE
+    transaction. If that fails, apply each batch in its own transaction and
+    send the ones that still fail to _fail_inbox_row. Returns stats
+    (batches=0 means the inbox was empty; retried / failed count batches).
+    """
+    worker_id = worker_id or uuid.uuid4().hex[:12]
+    rows = _claim_inbox(max_rows, worker_id)
+    stats = {"batches": len(rows), "events": 0, "duplicates": 0, "applied": 0,
+             "updated": 0, "inserted": 0, "verified": 0, "retried": 0, "failed": 0}
+    if not rows:
+        return stats
+
+    try:
+        results = [_apply_inbox_rows(rows)]
+    except Exception as e:
+        logger.warning(f"[webhook] applying inbox rows {[r[0] for r in rows]} failed: {e}; "
+                       f"applying them one at a time")
+        results = []
+        for row in rows:
+            try:
+                results.append(_apply_inbox_rows([row]))
+            except Exception as row_error:
+                state = _fail_inbox_row(row[0], row[2] or 0, row_error)
+                stats["failed" if state == "failed" else "retried"] += 1
+    for result in results:
+        for k, v in result.items():
+            stats[k] += v
+    return stats
+
+
+def requeue_stale_inbox(older_than_seconds: float = 300) -> int:
+    """Put batches left in 'processing' by a consumer that died back to pending."""
+    with engine.begin() as conn:
+        result = conn.execute(text("""
+            UPDATE webhook_inbox SET state = 'pending', claimed_by = NULL
+            WHERE state = 'processing' AND claimed_at < :cutoff
+        """), {"cutoff": db_now(-older_than_seconds)})
+    if result.rowcount:
+        logger.warning(f"[webhook] requeued {result.rowcount} stale inbox batches")
+    return result.rowcount
+
+
+def prune_webhook_tables() -> Dict[str, int]:
+    """Forget old event ids and delete processed inbox batches past retention."""
+    with engine.begin() as conn:
+        ids = conn.execute(text("DELETE FROM webhook_event_ids WHERE seen_at < :cutoff"),
+                           {"cutoff": db_now(-EVENT_ID_RETENTION_HOURS * 3600)}).rowcount
+        inbox = conn.execute(text("DELETE FROM webhook_inbox WHERE state = 'done' AND received_at < :cutoff"),
+                             {"cutoff": db_now(-INBOX_RETENTION_HOURS * 3600)}).rowcount
+    return {"event_ids": ids, "inbox": inbox}
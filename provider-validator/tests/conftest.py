@@ -10,3 +10,21 @@ if SRC_DIR not in sys.path:
     sys.path.insert(0, SRC_DIR)
 if ROOT_DIR not in sys.path:
     sys.path.insert(0, ROOT_DIR)
+
+# Test defaults — real values come from .env in dev/prod.
+# src.email_sender refuses to import without SendGrid settings, and progress
+# events / idempotency keys should stay in-process rather than probing for a
+# local Redis.
+os.environ.setdefault("FROM_EMAIL", "tests@example.com")
+os.environ.setdefault("SENDGRID_API_KEY", "SG.test-key")
+os.environ.setdefault("PROGRESS_BACKEND", "memory")
+os.environ.setdefault("IDEMPOTENCY_BACKEND", "memory")
+# Spans are recorded (every trace sampled) but not exported anywhere
+os.environ.setdefault("TRACING_EXPORTER", "none")
+os.environ.setdefault("TRACING_SAMPLE_RATIO", "1.0")
+
+# Keep test writes out of data/providers.db
+import tempfile
+os.environ.setdefault(
+    "DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="pv-tests-"), "providers.db")
+)
@@ -49,3 +49,84 @@ async def test_validation_agent_handles_missing_fields(monkeypatch):
 
     assert "score" in result
     assert result["matches"]["phone_valid"] is False
+
+
+@pytest.mark.asyncio
+async def test_outreach_agent_run_many_matches_run(monkeypatch):
+    from src.agents import outreach_agent
+    from src.agents.outreach_agent import OutreachAgent
+
+    monkeypatch.setattr(outreach_agent, "CHECK_DELIVERABILITY", False)
+    outreach_agent._email_syntax_ok.cache_clear()
+
+    profiles = [
+        {"id": i, "name": f"Dr {i}", "final_confidence": 0.3 if i % 2 else 0.9,
+         "email": "shared@clinic.org" if i % 3 else "not-an-email"}
+        for i in range(1, 9)
+    ]
+    agent = OutreachAgent(name="outreach_agent")
+
+    drafts = await agent.run_many(iter(profiles), chunk_size=3)
+    one_by_one = [d for d in [await agent.run(p) for p in profiles] if d]
+
+    assert drafts == one_by_one
+    assert [d["provider_id"] for d in drafts] == [1, 3, 5, 7]
+    assert drafts[0]["recipient"] == "shared@clinic.org" and "Dr 1" in drafts[0]["body"]
+    assert drafts[1]["recipient"] is None                     # id 3 → invalid address
+    # 8 profiles, 2 distinct addresses → 2 validations
+    assert outreach_agent._email_syntax_ok.cache_info().misses == 2
+
+
+def test_deliverability_caches_only_definitive_dns_answers(monkeypatch):
+    import dns.resolver
+    from email_validator import EmailUndeliverableError
+    from src.agents import outreach_agent
+
+    calls = []
+
+    def fake_deliverability(domain, domain_i18n):
+        calls.append(domain)
+        if domain == "gone.org":
+            raise EmailUndeliverableError("does not exist") from dns.resolver.NXDOMAIN()
+        if domain == "slow.org":
+            return {"unknown-deliverability": "timeout"}
+        if domain == "flaky.org" and calls.count(domain) == 1:
+            raise EmailUndeliverableError("error while checking") from RuntimeError("SERVFAIL")
+        return {"mx": [(10, "mx." + domain)]}
+
+    monkeypatch.setattr(outreach_agent, "validate_email_deliverability", fake_deliverability)
+    outreach_agent._domain_verdict.cache_clear()
+
+    for _ in range(2):
+        assert outreach_agent._domain_deliverable("gone.org") is False
+        assert outreach_agent._domain_deliverable("slow.org") is True
+    assert outreach_agent._domain_deliverable("flaky.org") is False      # resolver error
+    assert outreach_agent._domain_deliverable("flaky.org") is True       # asked again, now resolves
+    assert outreach_agent._domain_deliverable("flaky.org") is True
+    assert sorted(calls) == ["flaky.org", "flaky.org", "gone.org", "slow.org", "slow.org"]
+    outreach_agent._domain_verdict.cache_clear()
+
+
+@pytest.mark.asyncio
+async def test_agent_runs_are_instrumented():
+    from prometheus_client import REGISTRY
+    from src.agents.base_agent import BaseAgent
+
+    class FlakyAgent(BaseAgent):
+        async def run(self, payload):
+            if payload.get("fail"):
+                raise ValueError("boom")
+            return {"ok": True}
+
+    def sample(name, **labels):
+        return REGISTRY.get_sample_value(name, {"agent": "flaky", **labels}) or 0
+
+    agent = FlakyAgent(name="flaky")
+    assert await agent.run({}) == {"ok": True}
+    with pytest.raises(ValueError):
+        await agent.run({"fail": True})
+
+    assert sample("agent_run_seconds_count", outcome="ok") == 1
+    assert sample("agent_run_seconds_count", outcome="error") == 1
+    assert sample("agent_errors_total", error="ValueError") == 1
+    assert sample("agent_runs_in_flight") == 0
@@ -32,3 +32,45 @@ async def test_provider_review_patch():
         body = {"edited_fields": {"phone": "999999"}, "action": "save", "notes": "test"}
         resp = await client.patch("/providers/1/review", json=body)
         assert resp.status_code in (200, 201, 204)
+
+
+@pytest.mark.asyncio
+async def test_run_batch_passes_limit_to_sharded_task(monkeypatch):
+    from src.api import app as app_module
+
+    sent = {}
+    monkeypatch.setattr(app_module, "run_batch_sharded_task",
+                        SimpleNamespace(delay=lambda **kw: sent.update(kw) or SimpleNamespace(id="t-1")))
+    monkeypatch.setitem(app.dependency_overrides, get_current_active_user, fake_current_active_user)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://testserver") as client:
+        resp = await client.post("/run-batch", params={"limit": 10, "shards": 2})
+    assert resp.status_code == 200
+    assert sent["limit"] == 10 and sent["shards"] == 2
+
+
+@pytest.mark.asyncio
+async def test_job_and_outreach_endpoints_require_auth_and_sending_requires_admin(monkeypatch):
+    from src.api import app as app_module
+    from src.db import init_db
+
+    init_db()
+    queued = []
+    monkeypatch.setattr(app_module, "outreach_wave_task",
+                        SimpleNamespace(delay=lambda **kw: queued.append(kw) or SimpleNamespace(id="w-1")))
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://testserver") as client:
+        monkeypatch.delitem(app.dependency_overrides, get_current_active_user, raising=False)
+        for method, url in (("POST", "/send-outreach"), ("GET", "/outreach/jobs/w-1"),
+                            ("GET", "/batches/w-1"),
+                            ("GET", "/outreach/outbox"), ("GET", "/outreach/funnel"),
+                            ("GET", "/outreach/messages/m-1/events")):
+            assert (await client.request(method, url)).status_code == 401, url
+
+        monkeypatch.setitem(app.dependency_overrides, get_current_active_user,
+                            lambda: SimpleNamespace(username="rev", role="reviewer"))
+        assert (await client.post("/send-outreach", params={"dispatch": True})).status_code == 403
+        assert (await client.get("/outreach/outbox")).status_code == 200
+
+        monkeypatch.setitem(app.dependency_overrides, get_current_active_user, fake_current_active_user)
+        resp = await client.post("/send-outreach")
+    assert resp.status_code == 202 and resp.json()["started_by"] == "testuser"
+    assert len(queued) == 1
@@ -0,0 +1,64 @@
+# tests/test_auth.py
+import pytest
+
+
+class FakeCryptContext:
+    """Stand-in for passlib so tests don't pay (or depend on) real bcrypt."""
+
+    def hash(self, password):
+        return "fake$" + password
+
+    def verify(self, password, hashed):
+        return hashed == "fake$" + password
+
+
+@pytest.fixture
+def auth(monkeypatch, tmp_path):
+    from src import auth as auth_module
+
+    monkeypatch.setattr(auth_module, "USER_DB_PATH", str(tmp_path / "users.db"))
+    monkeypatch.setattr(auth_module, "_schema_ready", False)
+    monkeypatch.setattr(auth_module, "pwd_context", FakeCryptContext())
+    auth_module.invalidate_user_cache()
+    yield auth_module
+    auth_module.invalidate_user_cache()
+
+
+def test_user_lookup_is_cached(monkeypatch, auth):
+    auth.create_user_db("alice", "secret", "admin")
+
+    calls = []
+    real_conn = auth.get_db_conn
+    monkeypatch.setattr(auth, "get_db_conn", lambda: calls.append(1) or real_conn())
+
+    assert auth.get_user_from_db("alice").role == "admin"
+    assert auth.get_user_from_db("alice").role == "admin"
+    assert len(calls) == 1
+
+
+def test_disable_and_create_invalidate_cache(auth):
+    assert auth.get_user_from_db("bob") is None
+    auth.create_user_db("bob", "pw")
+    assert auth.get_user_from_db("bob") is not None
+
+    assert auth.set_user_disabled("bob") is True
+    assert auth.get_user_from_db("bob").disabled is True
+
+
+def test_user_cache_skips_misses_and_is_bounded(monkeypatch, auth):
+    monkeypatch.setattr(auth, "USER_CACHE_SIZE", 2)
+    for name in ("u1", "u2", "u3"):
+        auth.create_user_db(name, "pw")
+    for i in range(50):
+        assert auth.get_user_from_db(f"nobody-{i}") is None
+    assert not auth._user_cache
+
+    for name in ("u1", "u2", "u1", "u3"):
+        auth.get_user_from_db(name)
+    assert list(auth._user_cache) == ["u1", "u3"]
+
+
+async def test_authenticate_user_async(auth):
+    auth.create_user_db("carol", "pw")
+    assert (await auth.authenticate_user_async("carol", "pw")).username == "carol"
+    assert await auth.authenticate_user_async("carol", "wrong") is False
@@ -0,0 +1,13 @@
+# tests/test_bench.py
+def test_bench_measures_and_flags_regressions():
+    from bench.runner import Benchmark, measure, compare
+
+    stats = measure(Benchmark("noop", lambda: ((lambda: sum(range(100))), 10), rounds=3, round_time=0.01))
+    assert stats["ops"] == 10 and stats["number"] >= 1
+    assert 0 < stats["min"] <= stats["median"] and stats["ops_per_sec"] > 0
+
+    baseline = {"benchmarks": {"a": {"median": 1.0}, "b": {"median": 1.0}, "c": {"median": 1.0}}}
+    current = {"benchmarks": {"a": {"median": 1.05}, "b": {"median": 1.5}, "c": {"median": 0.5},
+                              "new": {"median": 1.0}}}
+    rows = {r["name"]: r["status"] for r in compare(current, baseline, threshold=0.10)}
+    assert rows == {"a": "same", "b": "regression", "c": "improved"}
@@ -0,0 +1,78 @@
+# tests/test_delivery.py
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from sqlalchemy import text
+
+
+@pytest.fixture
+def sendgrid_standin():
+    """Local stand-in for POST /v3/mail/send that records every payload."""
+    received = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            received.append({"auth": self.headers.get("Authorization"), "payload": json.loads(body)})
+            self.send_response(202)
+            self.send_header("X-Message-Id", f"msg-{len(received)}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/v3/mail/send", received
+    server.shutdown()
+
+
+def test_delivery_packs_personalizations_and_logs_in_bulk(sendgrid_standin):
+    from src.db import init_db, engine
+    from src.delivery import SendGridDelivery
+    from src.email_sender import draft_to_message
+
+    init_db()
+    url, received = sendgrid_standin
+    drafts = [{"provider_id": 900 + i, "recipient": f"p{i}@ex.com", "name": f"Dr {i}",
+               "subject": "Verify"} for i in range(5)]
+    messages = [draft_to_message(d) for d in drafts]
+
+    engine_ = SendGridDelivery("SG.key", "from@ex.com", api_url=url, batch_size=2, rate=0)
+    results = engine_.send(messages, task_id="wave-1")
+    engine_.close()
+
+    # 5 recipients at 2 per request → 3 requests, one connection pool
+    assert [len(r["payload"]["personalizations"]) for r in received] == [2, 2, 1]
+    assert received[0]["auth"] == "Bearer SG.key"
+    first = received[0]["payload"]["personalizations"][0]
+    assert first["to"] == [{"email": "p0@ex.com"}]
+    assert first["substitutions"]["-provider_name-"] == "Dr 0"
+    assert first["custom_args"] == {"provider_id": "900", "task_id": "wave-1"}
+    assert all(r["status"] == "sent" for r in results)
+
+    with engine.connect() as conn:
+        rows = conn.execute(text("""
+            SELECT provider_id, provider_response_id, body FROM outreach_logs
+            WHERE task_id = 'wave-1' ORDER BY provider_id
+        """)).fetchall()
+    assert [r[1] for r in rows] == ["msg-1", "msg-1", "msg-2", "msg-2", "msg-3"]
+    assert "Dr 4" in rows[4][2] and "-provider_name-" not in rows[4][2]
+
+
+def test_session_does_not_retry_5xx_on_send():
+    """A 5xx may follow a partial accept, so the send is never repeated."""
+    from bench.standin_farm import FarmConfig, FarmThread, ServiceConfig
+    from src.delivery import _make_session
+
+    config = FarmConfig(sendgrid=ServiceConfig("fixed:0ms", error_rate=1.0))
+    with FarmThread(config) as base_url:
+        session = _make_session(pool_size=1)
+        resp = session.post(f"{base_url}/v3/mail/send", json={"personalizations": []})
+        stats = session.get(f"{base_url}/__stats").json()
+    assert resp.status_code == 500
+    assert stats["sendgrid"]["requests"] == 1
@@ -0,0 +1,53 @@
+# tests/test_loadtest.py
+import pytest
+from httpx import ASGITransport
+
+from bench.loadtest import format_report, parse_mix, percentile, run_load
+
+
+class FakeCryptContext:
+    def hash(self, password):
+        return "fake$" + password
+
+    def verify(self, password, hashed):
+        return hashed == "fake$" + password
+
+
+def test_percentile_nearest_rank():
+    values = [i / 100 for i in range(1, 101)]
+    assert percentile(values, 50) == 0.50
+    assert percentile(values, 95) == 0.95
+    assert percentile(values, 99) == 0.99
+    assert percentile([], 95) == 0.0
+    with pytest.raises(ValueError):
+        parse_mix("providers=1,nope=2")
+
+
+@pytest.mark.asyncio
+async def test_run_load_logs_in_and_reports_per_route(monkeypatch, tmp_path):
+    from src import auth
+    from src.api.app import app
+    from src.db import init_db
+
+    init_db()
+
+    monkeypatch.setattr(auth, "USER_DB_PATH", str(tmp_path / "users.db"))
+    monkeypatch.setattr(auth, "_schema_ready", False)
+    monkeypatch.setattr(auth, "pwd_context", FakeCryptContext())
+    auth.invalidate_user_cache()
+    auth.create_user_db("lt-user", "pw", "admin")
+
+    ctx = {"providers": 10, "page_size": 5, "webhook_batch": 3, "username": "lt-user",
+           "password": "pw", "timeout": 10, "seed": 7}
+    summary = await run_load("http://test", parse_mix("providers=2,flags=1,token=1"), users=2,
+                             duration=0.5, warmup=0, ctx=ctx, transport=ASGITransport(app=app))
+    auth.invalidate_user_cache()
+
+    routes = summary["routes"]
+    # no webhook route here: its inbox rows would leak into test_webhooks' consume counts
+    assert set(routes) <= {"GET /providers", "GET /providers/flags", "POST /token"}
+    assert routes["GET /providers"]["requests"] > 0
+    assert summary["total"]["errors"] == 0
+    assert summary["total"]["requests"] == sum(r["requests"] for r in routes.values())
+    assert summary["total"]["p50"] <= summary["total"]["p99"] <= summary["total"]["max"]
+    assert "TOTAL" in format_report(summary)
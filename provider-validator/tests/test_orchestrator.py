@@ -52,3 +52,264 @@ def test_orchestrator_run_batch(monkeypatch, small_csv):
         pytest.fail(f"run_batch raised unexpected exception: {e}")
 
     assert out is not None
+
+
+def _write_csv(path, n):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["id", "name", "phone", "address", "email"])
+        writer.writeheader()
+        for i in range(1, n + 1):
+            writer.writerow({"id": i, "name": f"Dr {i}", "phone": "212-555-0101",
+                             "address": f"{i} Main St", "email": f"d{i}@ex.com"})
+
+
+async def test_run_batch_resumes_from_checkpoint(monkeypatch, tmp_path):
+    from src import orchestrator, jobs
+    from src.agents.validation_agent import ValidationAgent
+
+    monkeypatch.chdir(tmp_path)
+    csv_path = str(tmp_path / "providers.csv")
+    _write_csv(csv_path, 5)
+
+    seen = []
+    real_run = ValidationAgent.run
+
+    async def tracking_run(self, payload):
+        seen.append(payload["id"])
+        return await real_run(self, payload)
+
+    monkeypatch.setattr(ValidationAgent, "run", tracking_run)
+
+    # Simulate the worker dying on the second flush
+    real_bulk = orchestrator.insert_providers_bulk
+    calls = {"n": 0}
+
+    def flaky_bulk(rows, conn=None):
+        calls["n"] += 1
+        if calls["n"] == 2:
+            raise RuntimeError("worker died")
+        return real_bulk(rows, conn=conn)
+
+    monkeypatch.setattr(orchestrator, "insert_providers_bulk", flaky_bulk)
+    with pytest.raises(RuntimeError):
+        await orchestrator.run_batch(csv_path, job_id="first", flush_size=2)
+    assert jobs.get_job("first")["committed_offset"] == 2
+    assert jobs.get_job("first")["status"] == "failed"
+
+    seen.clear()
+    stats = await orchestrator.run_batch(csv_path, job_id="second", flush_size=2, resume=True)
+    assert seen == [3, 4, 5]
+    assert stats["written"] == 3
+    job = jobs.get_job("second")
+    assert job["resumed_from"] == "first"
+    assert job["committed_offset"] == 5
+    assert job["status"] == "completed"
+    assert jobs.get_job("first")["status"] == "resumed"
+
+    # Nothing left to resume: a third run starts from row 0 as a fresh job
+    assert jobs.find_resumable_job(csv_path) is None
+
+
+async def test_run_batch_skips_unchanged_rows(monkeypatch, tmp_path):
+    from src import orchestrator
+
+    monkeypatch.chdir(tmp_path)
+    csv_path = str(tmp_path / "incremental.csv")
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["id", "name", "phone", "address"])
+        writer.writeheader()
+        for i in range(101, 104):
+            writer.writerow({"id": i, "name": f"Dr {i}", "phone": "212-555-0101", "address": "1 Main"})
+
+    first = await orchestrator.run_batch(csv_path, job_id="inc-1", freshness_hours=24)
+    assert first["written"] == 3 and first["skipped"] == 0
+
+    second = await orchestrator.run_batch(csv_path, job_id="inc-2", freshness_hours=24,
+                                          export_path=str(tmp_path / "second.csv"))
+    assert second["written"] == 0 and second["skipped"] == 3
+    # skipped rows still reach the export, with last run's profile
+    with open(tmp_path / "second.csv", newline="") as f:
+        exported = list(csv.DictReader(f))
+    assert sorted(int(r["id"]) for r in exported) == [101, 102, 103]
+    assert all(r["final_confidence"] for r in exported)
+
+    # editing one row invalidates only that row's fingerprint
+    text = Path(csv_path).read_text().replace("Dr 102", "Dr 102 Jr")
+    Path(csv_path).write_text(text)
+    third = await orchestrator.run_batch(csv_path, job_id="inc-3", freshness_hours=24)
+    assert third["written"] == 1 and third["skipped"] == 2
+
+    forced = await orchestrator.run_batch(csv_path, job_id="inc-4", freshness_hours=0)
+    assert forced["written"] == 3 and forced["skipped"] == 0
+
+
+async def test_run_batch_emits_stage_spans(tmp_path, monkeypatch):
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+    from src import orchestrator
+    from src.tracing import setup_tracing
+
+    exporter = InMemorySpanExporter()
+    setup_tracing("provider-validator-tests").add_span_processor(SimpleSpanProcessor(exporter))
+
+    monkeypatch.chdir(tmp_path)
+    csv_path = str(tmp_path / "traced.csv")
+    _write_csv(csv_path, 3)
+    await orchestrator.run_batch(csv_path, job_id="traced", flush_size=2, freshness_hours=0)
+
+    spans = exporter.get_finished_spans()
+    by_name = {}
+    for span in spans:
+        by_name.setdefault(span.name, []).append(span)
+    root = by_name["run_batch"][0]
+    assert len(by_name["row"]) == 3 and len(by_name["db.flush"]) == 2
+    assert len(by_name["agent.validation_agent"]) == 3
+    # one trace: rows hang off the batch, agent stages off their row
+    assert {s.context.trace_id for s in spans if s.name != "run_batch" or s is root} == {root.context.trace_id}
+    row_ids = {s.context.span_id for s in by_name["row"]}
+    assert all(s.parent.span_id == root.context.span_id for s in by_name["row"])
+    assert all(s.parent.span_id in row_ids for s in by_name["agent.qa_agent"])
+
+
+def test_plan_shards_covers_every_row(tmp_path):
+    from src.orchestrator import plan_shards
+
+    csv_path = str(tmp_path / "plan.csv")
+    _write_csv(csv_path, 10)
+    assert plan_shards(csv_path, 3) == [(0, 4), (4, 7), (7, 10)]
+    assert plan_shards(csv_path, 4, limit=2) == [(0, 1), (1, 2)]
+
+
+def test_redelivered_batch_task_continues_its_own_job(monkeypatch, tmp_path):
+    from src import orchestrator, jobs
+    from src.agents.validation_agent import ValidationAgent
+    from src.celery_app import run_batch_task
+
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data").mkdir()
+    _write_csv(str(tmp_path / "data" / "providers_sample.csv"), 5)
+    monkeypatch.setattr(orchestrator, "FLUSH_SIZE", 2)
+
+    seen = []
+    real_run = ValidationAgent.run
+
+    async def tracking_run(self, payload):
+        seen.append(payload["id"])
+        return await real_run(self, payload)
+
+    monkeypatch.setattr(ValidationAgent, "run", tracking_run)
+    real_bulk = orchestrator.insert_providers_bulk
+    calls = {"n": 0}
+
+    def flaky_bulk(rows, conn=None):
+        calls["n"] += 1
+        if calls["n"] == 2:
+            raise RuntimeError("worker died")
+        return real_bulk(rows, conn=conn)
+
+    monkeypatch.setattr(orchestrator, "insert_providers_bulk", flaky_bulk)
+    kwargs = {"freshness_hours": 0}       # acks_late redelivers the same message...
+    assert run_batch_task.apply(kwargs=kwargs, task_id="redeliver-1").failed()
+    assert jobs.get_job("redeliver-1")["committed_offset"] == 2
+
+    seen.clear()                          # ...under the same task id, still resume=False
+    result = run_batch_task.apply(kwargs=kwargs, task_id="redeliver-1").get()
+    assert seen == [3, 4, 5] and result["stats"]["written"] == 3
+    job = jobs.get_job("redeliver-1")
+    assert job["status"] == "completed" and job["committed_offset"] == 5
+    with open(tmp_path / "data" / "validated_providers.csv") as f:
+        assert [int(r["id"]) for r in csv.DictReader(f)] == [1, 2, 3, 4, 5]
+
+    seen.clear()
+    run_batch_task.apply(kwargs=kwargs, task_id="redeliver-1").get()
+    assert seen == []
+
+
+def test_create_job_refuses_a_job_that_is_still_checkpointing():
+    from sqlalchemy import text
+    from src import jobs
+    from src.db import engine, init_db
+
+    init_db()
+    jobs.create_job("live-1", "in.csv", "h", params={}, committed_offset=3)
+    with pytest.raises(jobs.JobBusy):
+        jobs.create_job("live-1", "in.csv", "h", params={})
+
+    with engine.begin() as conn:           # no checkpoint for longer than the lease
+        conn.execute(text("UPDATE batch_jobs SET updated_at = '2000-01-01 00:00:00' WHERE id = 'live-1'"))
+    job = jobs.create_job("live-1", "in.csv", "h", params={})
+    assert job["status"] == "running" and job["committed_offset"] == 3
+
+
+def test_batch_task_passes_limit(monkeypatch):
+    from src import orchestrator
+    from src.celery_app import run_batch_task
+
+    calls = []
+
+    async def fake_run_batch(csv_path, concurrency=8, **kwargs):
+        calls.append(kwargs)
+        return {"written": 0}
+
+    monkeypatch.setattr(orchestrator, "run_batch", fake_run_batch)
+    run_batch_task.apply(kwargs={"limit": 7}, task_id="limited-1").get()
+    assert calls[0]["limit"] == 7 and calls[0]["job_id"] == "limited-1"
+
+
+def test_sharded_batch_aggregates_shards(monkeypatch, tmp_path):
+    from src.celery_app import celery_app, run_batch_sharded_task
+    from src import jobs
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(celery_app.conf, "task_always_eager", True)
+    csv_path = str(tmp_path / "sharded.csv")
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["id", "name", "phone"])
+        writer.writeheader()
+        for i in range(201, 208):
+            writer.writerow({"id": i, "name": f"Dr {i}", "phone": "212-555-0101"})
+
+    result = run_batch_sharded_task.apply(
+        kwargs={"shards": 3, "csv_path": csv_path, "freshness_hours": 0}, task_id="sharded-1"
+    ).get()
+    assert result["shards"] == 3
+
+    parent = jobs.get_job("sharded-1")
+    assert parent["status"] == "completed"
+    assert parent["stats"]["written"] == 7
+    assert jobs.get_job("sharded-1:2")["committed_offset"] == 7
+
+    with open(tmp_path / "data" / "validated_providers.csv") as f:
+        assert len(list(csv.DictReader(f))) == 7
+
+
+def test_validate_provider_task_dedupes_by_fingerprint(monkeypatch):
+    from src.celery_app import validate_provider_task
+    from src.db import fetch_fingerprints
+
+    provider = {"id": 301, "name": "Dr Solo", "phone": "212-555-0101", "address": "1 Main St"}
+
+    first = validate_provider_task.apply(args=[provider]).get()
+    assert first["status"] == "validated"
+    assert fetch_fingerprints([301])[301]["fingerprint"] == first["fingerprint"]
+
+    # same content again inside the window → collapsed
+    assert validate_provider_task.apply(args=[provider]).get()["status"] == "duplicate"
+
+    # an edit changes the fingerprint → runs again
+    edited = validate_provider_task.apply(args=[{**provider, "phone": "212-555-0199"}]).get()
+    assert edited["status"] == "validated"
+    assert edited["fingerprint"] != first["fingerprint"]
+
+
+def test_row_fingerprint_handles_missing_non_ascii_pdf(tmp_path):
+    from src.fingerprint import pdf_digest, row_fingerprint
+
+    missing = str(tmp_path / "scans" / "Dr Núñez.pdf")
+    assert pdf_digest(missing) == "missing:" + missing
+    assert pdf_digest("") == ""
+    before = row_fingerprint({"name": "Dr Núñez", "scanned_pdf": missing})
+
+    (tmp_path / "scans").mkdir()
+    Path(missing).write_bytes(b"%PDF-1.4")
+    assert row_fingerprint({"name": "Dr Núñez", "scanned_pdf": missing}) != before
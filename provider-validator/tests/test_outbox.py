@@ -0,0 +1,73 @@
+# tests/test_outbox.py
+
+
+def _messages(ids):
+    return [{"provider_id": i, "recipient": f"p{i}@ex.com", "subject": "Verify",
+             "body": "-body-", "substitutions": {"-body-": f"hello {i}"}} for i in ids]
+
+
+def test_outbox_dedupes_per_campaign_and_claims_disjoint_batches():
+    from src.db import init_db
+    from src.outbox import SqlOutbox
+
+    init_db()
+    outbox = SqlOutbox("camp-1")
+    assert outbox.add(_messages(range(1, 6))) == 5
+    # re-running the wave queues nothing new; another campaign is independent
+    assert outbox.add(_messages(range(1, 8))) == 2
+    assert SqlOutbox("camp-2").add(_messages([1])) == 1
+
+    a, b = SqlOutbox("camp-1"), SqlOutbox("camp-1")
+    first, second = a.claim(4), b.claim(4)
+    assert [i["provider_id"] for i in first] == [1, 2, 3, 4]
+    assert [i["provider_id"] for i in second] == [5, 6, 7]
+    assert first[0]["substitutions"] == {"-body-": "hello 1"}
+    assert a.claim(4) == []
+
+    a.mark_sent([i["id"] for i in first], "msg-1")
+    b.retry_later([second[0]["id"]], delay=3600, error="failed:429")
+    b.mark_failed([i["id"] for i in second[1:]], "failed:400")
+    assert outbox.counts() == {"sent": 4, "pending": 1, "failed": 2}
+    # the retried row isn't claimable until its backoff passes
+    assert outbox.claim(10) == []
+    assert 3500 < outbox.next_ready_in() <= 3600
+
+
+async def test_outreach_wave_queues_flagged_providers_once(monkeypatch):
+    from sqlalchemy import text
+    from src.db import init_db, insert_providers_bulk, engine
+    from src.agents import outreach_agent
+    from src.outreach_wave import run_outreach_wave
+    from src.outbox import SqlOutbox
+    from src import jobs
+
+    monkeypatch.setattr(outreach_agent, "CHECK_DELIVERABILITY", False)
+    init_db()
+    insert_providers_bulk([
+        {"source_id": 5001, "name": "Ok",      "email": "ok@clinic.org",   "confidence": 0.9},
+        {"source_id": 5002, "name": "Flagged", "email": "fl@clinic.org",   "confidence": 0.9,
+         "flags": ["phone_mismatch"]},
+        {"source_id": 5003, "name": "Low",     "email": "low@clinic.org",  "confidence": 0.2},
+        {"source_id": 5004, "name": "NoMail",  "email": "nope",            "confidence": 0.2},
+        {"source_id": 5005, "name": "Fine",    "email": "fine@clinic.org", "confidence": 0.8},
+    ])
+
+    stats = await run_outreach_wave("wave-job-1", "wave-test", workers=2, page_size=2)
+    assert stats["state"] == "completed"
+    assert stats["read"] == stats["written"] + stats["skipped"]
+
+    with engine.connect() as conn:
+        queued = conn.execute(text("""
+            SELECT p.source_id FROM outreach_outbox o JOIN providers p ON p.id = o.provider_id
+            WHERE o.campaign_id = 'wave-test' AND p.source_id BETWEEN 5001 AND 5005
+            ORDER BY p.source_id
+        """)).scalars().all()
+    assert queued == [5002, 5003]
+
+    job = jobs.get_job("wave-job-1")
+    assert job["kind"] == "outreach" and job["status"] == "completed"
+    assert job["stats"]["written"] == SqlOutbox("wave-test").counts()["pending"]
+
+    # a second wave for the same campaign finds everything already queued
+    again = await run_outreach_wave("wave-job-2", "wave-test", workers=2, page_size=2)
+    assert again["written"] == 0 and again["read"] == stats["read"]
@@ -0,0 +1,146 @@
+# tests/test_outreach_dispatcher.py
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+
+@pytest.fixture
+def flaky_sendgrid():
+    """SendGrid stand-in that rate-limits the first request, then accepts."""
+    received = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            received.append(body)
+            if len(received) == 1:
+                self.send_response(429)
+                self.send_header("Retry-After", "0")
+            else:
+                self.send_response(202)
+                self.send_header("X-Message-Id", f"msg-{len(received)}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}/v3/mail/send", received
+    server.shutdown()
+
+
+async def test_dispatcher_drains_outbox_and_retries_throttled_batches(flaky_sendgrid):
+    from src.db import init_db
+    from src.outreach_dispatcher import MemoryOutbox, OutreachDispatcher
+
+    init_db()
+    url, received = flaky_sendgrid
+    outbox = MemoryOutbox()
+    outbox.add({"provider_id": 700 + i, "recipient": f"r{i}@ex.com", "subject": "Verify",
+                "body": "-body-", "substitutions": {"-body-": f"hi {i}"}} for i in range(5))
+
+    dispatcher = OutreachDispatcher(outbox, api_key="SG.key", from_email="from@ex.com", api_url=url,
+                                    rate=0, concurrency=1, batch_size=2, backoff_base=0.01,
+                                    task_id="dispatch-1")
+    stats = await dispatcher.run()
+
+    assert stats["sent"] == 5 and stats["failed"] == 0
+    assert stats["retried"] == 2                      # the 429'd batch came back once
+    assert stats["requests"] == 4
+    assert outbox.counts() == {"sent": 5}
+    sent_to = sorted(p["to"][0]["email"] for body in received[1:] for p in body["personalizations"])
+    assert sent_to == [f"r{i}@ex.com" for i in range(5)]
+
+
+async def test_token_bucket_paces_to_rate():
+    import time
+    from src.outreach_dispatcher import TokenBucket
+
+    bucket = TokenBucket(rate=200, burst=10)
+    started = time.monotonic()
+    for _ in range(5):
+        await bucket.acquire(10)
+    # 10 burst tokens up front, the remaining 40 at 200/s ≈ 0.2s
+    assert 0.15 <= time.monotonic() - started < 1.0
+
+
+async def test_accepted_batch_stays_sent_when_logging_fails(flaky_sendgrid, monkeypatch):
+    from src import outreach_dispatcher
+    from src.outreach_dispatcher import MemoryOutbox, OutreachDispatcher
+
+    url, received = flaky_sendgrid
+    received.append("skip the 429")              # every request is accepted
+    monkeypatch.setattr(outreach_dispatcher, "log_batch",
+                        lambda *a, **kw: (_ for _ in ()).throw(RuntimeError("db down")))
+    outbox = MemoryOutbox()
+    real_mark_sent, blips = outbox.mark_sent, []
+
+    def mark_sent_blips_once(ids, message_id):
+        if not blips:
+            blips.append(1)
+            raise RuntimeError("deadlock detected")
+        real_mark_sent(ids, message_id)
+
+    outbox.mark_sent = mark_sent_blips_once
+    outbox.add({"provider_id": 800 + i, "recipient": f"s{i}@ex.com", "subject": "Verify",
+                "body": "-body-", "substitutions": {"-body-": "hi"}} for i in range(3))
+
+    stats = await OutreachDispatcher(outbox, api_key="SG.key", from_email="from@ex.com", api_url=url,
+                                     rate=0).run()
+    assert stats["sent"] == 3 and stats["retried"] == 0
+    assert outbox.counts() == {"sent": 3}
+    assert len(received) == 2                    # one real request, no resend
+
+
+@pytest.mark.parametrize("reply", ["503", "timeout"])
+async def test_possibly_accepted_batch_is_failed_not_resent(reply):
+    import time
+    from src.outreach_dispatcher import MemoryOutbox, OutreachDispatcher
+
+    received = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            received.append(self.rfile.read(int(self.headers["Content-Length"])))
+            if reply == "timeout":
+                time.sleep(0.5)                   # accepted, but the answer never arrives in time
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    outbox = MemoryOutbox()
+    outbox.add({"provider_id": 900 + i, "recipient": f"t{i}@ex.com", "subject": "Verify",
+                "body": "hi"} for i in range(2))
+    try:
+        stats = await OutreachDispatcher(outbox, api_key="SG.key", from_email="from@ex.com",
+                                         api_url=f"http://127.0.0.1:{server.server_port}/v3/mail/send",
+                                         rate=0, backoff_base=0.01, timeout=0.2).run()
+    finally:
+        server.shutdown()
+    assert len(received) == 1 and stats["retried"] == 0
+    assert stats["failed"] == 2 and outbox.counts() == {"failed": 2}
+
+
+async def test_refused_connection_is_retried():
+    import socket
+    from src.outreach_dispatcher import MemoryOutbox, OutreachDispatcher
+
+    # nothing listening: the request was never written, so it is retried up to max_attempts
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        closed_port = sock.getsockname()[1]
+    outbox = MemoryOutbox()
+    outbox.add([{"provider_id": 950, "recipient": "u@ex.com", "subject": "Verify", "body": "hi"}])
+    stats = await OutreachDispatcher(outbox, api_key="SG.key", from_email="from@ex.com",
+                                     api_url=f"http://127.0.0.1:{closed_port}/v3/mail/send",
+                                     rate=0, backoff_base=0.01, max_attempts=3).run()
+    assert stats["requests"] == 3 and stats["retried"] == 2 and outbox.counts() == {"failed": 1}
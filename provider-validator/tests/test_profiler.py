@@ -0,0 +1,66 @@
+# tests/test_profiler.py
+import threading
+import time
+
+import pytest
+from httpx import AsyncClient, ASGITransport
+
+
+def _busy_loop(stop):
+    while not stop.is_set():
+        sum(i * i for i in range(1000))
+
+
+def test_sampler_sees_busy_thread_in_collapsed_format():
+    from src import profiler
+
+    stop = threading.Event()
+    worker = threading.Thread(target=_busy_loop, args=(stop,), name="busy-worker")
+    worker.start()
+    try:
+        out = profiler.profile(0.3, interval=0.005)
+    finally:
+        stop.set()
+        worker.join()
+
+    lines = out.strip().splitlines()
+    assert lines and all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    busy = [l for l in lines if l.startswith("busy-worker;")]
+    assert busy and "_busy_loop (test_profiler.py:" in busy[0]
+    # the sampler never profiles itself
+    assert "sample_stacks" not in out
+
+
+def test_only_one_profile_at_a_time():
+    from src import profiler
+
+    t = threading.Thread(target=profiler.profile, args=(0.3,))
+    t.start()
+    time.sleep(0.05)
+    try:
+        with pytest.raises(profiler.ProfilerBusy):
+            profiler.profile(0.1)
+    finally:
+        t.join()
+
+
+@pytest.mark.asyncio
+async def test_debug_profile_is_admin_only():
+    from src.api.app import app
+    from src.auth import get_current_active_user, UserInDB
+
+    def as_role(role):
+        return lambda: UserInDB(username=role, hashed_password="x", role=role, disabled=False)
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://testserver") as client:
+        try:
+            app.dependency_overrides[get_current_active_user] = as_role("reviewer")
+            assert (await client.get("/debug/profile", params={"seconds": 0.1})).status_code == 403
+
+            app.dependency_overrides[get_current_active_user] = as_role("admin")
+            resp = await client.get("/debug/profile", params={"seconds": 0.1, "interval_ms": 5})
+        finally:
+            app.dependency_overrides.clear()
+    assert resp.status_code == 200
+    assert resp.headers["content-disposition"].endswith('.collapsed"')
+    assert resp.text.strip()
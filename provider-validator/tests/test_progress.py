@@ -0,0 +1,70 @@
+# tests/test_progress.py
+import asyncio
+import json
+import pytest
+from httpx import AsyncClient, ASGITransport
+
+
+async def test_subscriber_gets_snapshot_then_updates():
+    from src.progress import InProcessBus, BatchProgress
+
+    bus = InProcessBus()
+    progress = BatchProgress("job-1", bus=bus, min_interval=0)
+    progress.set_total(2)
+
+    events = []
+
+    async def consume():
+        async for event in bus.subscribe("job-1", timeout=1):
+            events.append(event)
+            if event and event["state"] == "completed":
+                break
+
+    consumer = asyncio.create_task(consume())
+    await asyncio.sleep(0)
+    progress.incr(read=2, validated=2, written=2)
+    progress.finish()
+    await asyncio.wait_for(consumer, 2)
+
+    assert events[0]["total"] == 2
+    assert events[-1]["state"] == "completed"
+    assert events[-1]["written"] == 2
+    assert events[-1]["eta_seconds"] is None
+
+
+async def test_finished_snapshots_are_bounded(monkeypatch):
+    from src import progress as progress_module
+
+    monkeypatch.setattr(progress_module, "FINISHED_SNAPSHOTS", 2)
+    bus = progress_module.InProcessBus()
+    for job in ("a", "b", "c"):
+        bus.publish(job, {"state": "running"})
+    bus.publish("a", {"state": "completed"})
+    bus.publish("b", {"state": "failed"})
+    bus.publish("c", {"state": "completed"})
+    assert bus.last("a") is None
+    assert bus.last("b")["state"] == "failed" and bus.last("c")["state"] == "completed"
+
+
+async def test_batch_events_endpoint_streams_sse(monkeypatch):
+    from types import SimpleNamespace
+    from src.api.app import app
+    from src.auth import get_current_active_user
+    from src.progress import BatchProgress, get_bus
+
+    progress = BatchProgress("job-sse", bus=get_bus())
+    progress.set_total(1)
+    progress.incr(read=1, written=1)
+    progress.finish()
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://testserver") as client:
+        monkeypatch.delitem(app.dependency_overrides, get_current_active_user, raising=False)
+        assert (await client.get("/batches/job-sse/events")).status_code == 401
+        monkeypatch.setitem(app.dependency_overrides, get_current_active_user,
+                            lambda: SimpleNamespace(username="viewer", role="reviewer"))
+        resp = await client.get("/batches/job-sse/events")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/event-stream")
+    data = [json.loads(line[len("data: "):]) for line in resp.text.splitlines() if line.startswith("data: ")]
+    assert data[-1]["state"] == "completed"
@@ -0,0 +1,58 @@
+# tests/test_scoring.py
+import json
+import random
+
+from src import scoring
+
+
+def test_batch_matches_per_row_rules():
+    rng = random.Random(5)
+    matches = [{"name_score": rng.random(), "address_score": rng.random(),
+                "phone_valid": rng.choice([True, False, None])} for _ in range(500)]
+    name, phone, addr = scoring.matches_to_columns(matches)
+    scores = scoring.score_batch(name, phone, addr)
+    mask, review = scoring.qa_batch(scores, phone, name)
+
+    for m, score, flags, r in zip(matches, scores, scoring.flag_lists(mask), review):
+        expected = scoring.score_row(m["name_score"], m["phone_valid"], m["address_score"])
+        assert abs(score - expected) < 1e-12
+        assert (flags, "manual_review" if r else "confirmed") == scoring.qa_row(
+            expected, m["phone_valid"], m["name_score"])
+
+
+def test_rescore_updates_only_auto_scored_rows_that_change():
+    from src.db import engine, init_db, insert_providers_bulk
+    from sqlalchemy import text
+
+    init_db()
+    base = random.Random().randint(10**8, 2 * 10**8)
+
+    def row(i, matches, status, confidence):
+        return {"source_id": base + i, "name": f"Dr R{i}", "status": status, "confidence": confidence,
+                "flags": "[]", "source_json": json.dumps({"validation": {"matches": matches}})}
+
+    good = {"name_score": 0.9, "phone_valid": True, "address_score": 0.6}
+    insert_providers_bulk([
+        row(1, good, "confirmed", 0.9),                                          # 0.84 → changed
+        row(2, {"name_score": 0.2, "phone_valid": False, "address_score": 0.1}, "confirmed", 0.9),
+        row(3, good, "approved", 0.9),                                           # reviewer decision
+        row(4, good, "confirmed", 0.84),                                         # already current
+    ])
+
+    before = scoring.rescore(dry_run=True)
+    assert before["changed"] >= 2 and before["updated"] == 0
+
+    scoring.rescore()
+    with engine.connect() as conn:
+        got = {r[0] - base: r[1:] for r in conn.execute(text(
+            "SELECT source_id, confidence, final_confidence, flags, status FROM providers "
+            "WHERE source_id > :lo AND source_id < :hi"),
+            {"lo": base, "hi": base + 10})}
+    assert got[1] == (0.84, 0.84, "[]", "confirmed")          # final_confidence follows
+    assert got[2][:2] == (0.11, 0.11) and json.loads(got[2][2]) == list(scoring.FLAGS)
+    assert got[2][3] == "manual_review"
+    assert got[3] == (0.9, 0.9, "[]", "approved")
+    assert scoring.rescore()["changed"] == 0
+
+    heavier = scoring.rescore(weights={"name": 0.1, "phone": 0.1, "address": 0.1}, dry_run=True)
+    assert heavier["changed"] > 0 and heavier["updated"] == 0
@@ -0,0 +1,52 @@
+# tests/test_standin_farm.py
+import aiohttp
+import pytest
+
+
+@pytest.mark.asyncio
+async def test_farm_serves_sites_enrichment_and_throttles_sendgrid(monkeypatch):
+    from bench.standin_farm import FarmConfig, ServiceConfig, start_farm
+    from src.agents import enrichment_agent, validation_agent
+    from src.agents.enrichment_agent import EnrichmentAgent
+    from src.agents.validation_agent import ValidationAgent
+
+    config = FarmConfig(site=ServiceConfig("fixed:1ms"), enrich=ServiceConfig("fixed:0ms"),
+                        sendgrid=ServiceConfig("fixed:0ms", rps=1, burst=2), page_kb=2)
+    runner, base = await start_farm(config)
+    try:
+        monkeypatch.setattr(validation_agent, "WEBSITE_BASE_URL", f"{base}/site")
+        monkeypatch.setattr(enrichment_agent, "ENRICHMENT_API_URL", f"{base}/enrich")
+
+        result = await ValidationAgent().run({"id": 1, "name": "Dr A", "website": "https://dr-a.example/x"})
+        assert "Dr A" in result["sources"]["website"]["text_preview"]
+        enriched = await EnrichmentAgent(name="enrichment_agent").run({"id": 7})
+        assert enriched["enrichment"]["certifications"]
+
+        async with aiohttp.ClientSession() as session:
+            statuses = []
+            for _ in range(4):
+                async with session.post(f"{base}/v3/mail/send",
+                                        json={"personalizations": [{"to": [{"email": "x@y.org"}]}]}) as r:
+                    statuses.append((r.status, r.headers.get("X-Message-Id"), r.headers.get("Retry-After")))
+            async with session.get(f"{base}/__stats") as r:
+                stats = await r.json()
+    finally:
+        await runner.cleanup()
+
+    assert [s[0] for s in statuses] == [202, 202, 429, 429]
+    assert statuses[0][1] and statuses[2][2] == "1"
+    assert stats["site"]["200"] == 1 and stats["enrich"]["200"] == 1
+    assert stats["sendgrid"] == {"requests": 4, "202": 2, "429": 2, "recipients": 2}
+
+
+def test_latency_specs():
+    import random
+    from bench.standin_farm import parse_latency
+
+    rng = random.Random(0)
+    assert parse_latency("fixed:20ms")(rng) == pytest.approx(0.02)
+    assert all(0.01 <= parse_latency("uniform:10ms,80ms")(rng) <= 0.08 for _ in range(100))
+    samples = sorted(parse_latency("lognormal:40ms,0.5")(rng) for _ in range(2001))
+    assert samples[1000] == pytest.approx(0.04, rel=0.1)
+    with pytest.raises(ValueError):
+        parse_latency("pareto:1")
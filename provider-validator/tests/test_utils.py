@@ -0,0 +1,42 @@
+# tests/test_utils.py
+import pytest
+
+from src import utils
+
+
+def test_fuzzy_scores_match_fuzzy_ratio_pairwise():
+    claimed = ["Dr John Smith", "100 Main St", "", None, "Maria Garcia"]
+    observed = ["dr jon smith", "100 Main Street", "x", "y", "Garcia Maria"]
+    scores = utils.fuzzy_scores(claimed, observed)
+    assert scores.tolist() == [utils.fuzzy_ratio(a, b) for a, b in zip(claimed, observed)]
+    assert scores[2] == scores[3] == 0.0
+    assert utils.fuzzy_ratio("abc", "abd") == pytest.approx(2 / 3)
+
+    reordered = utils.fuzzy_scores(claimed[4:], observed[4:], scorer="token_sort")
+    assert reordered[0] == 1.0 > scores[4]
+    with pytest.raises(ValueError):
+        utils.fuzzy_scores(["a"], ["a", "b"])
+
+
+def test_fuzzy_matrix_scores_all_pairs_with_cutoff():
+    queries = ["100 Main St Suite 4", "5 Oak Ave", ""]
+    choices = ["100 Main St", "5 Oak Avenue", "77 Elm Rd"]
+    m = utils.fuzzy_matrix(queries, choices, scorer="token_set", score_cutoff=0.8)
+    assert m.shape == (3, 3)
+    assert m[0, 0] == 1.0 and m[0].argmax() == 0 and m[1].argmax() == 1
+    assert m[0, 2] == 0.0 and not m[2].any()
+
+
+def test_parse_phone_is_memoized_and_bulk_dedupes(monkeypatch):
+    calls = []
+    real_parse = utils.phonenumbers.parse
+    monkeypatch.setattr(utils.phonenumbers, "parse", lambda *a: calls.append(a) or real_parse(*a))
+    utils._parse_phone.cache_clear()
+
+    shared = "(650) 253-0000"
+    results = utils.parse_phones([shared, None, shared, "n/a", shared])
+    assert results[0] == results[2] == ("+16502530000", True, "FIXED_LINE_OR_MOBILE")
+    assert results[1] == (None, False, None) and results[3] == ("n/a", False, None)
+    assert utils.parse_phone(shared) == results[0]
+    assert utils.normalize_phone(shared) == "+16502530000"
+    assert len(calls) == 2            # shared + "n/a", each parsed once
@@ -0,0 +1,208 @@
+# tests/test_webhooks.py
+import pytest
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy import text
+
+
+@pytest.mark.asyncio
+async def test_sendgrid_webhook_resolves_and_updates_in_bulk():
+    from src.api.app import app
+    from src.db import init_db, engine
+    from src.dbutils import log_outreach_bulk
+    from src.webhook_events import consume_inbox
+
+    init_db()
+    # one send batch (shared X-Message-Id) to two recipients, plus an older send to a
+    log_outreach_bulk([
+        {"provider_id": 8101, "recipient_email": "a@wh.org", "send_status": "sent",
+         "provider_response_id": "old-msg"},
+        {"provider_id": 8101, "recipient_email": "a@wh.org", "send_status": "sent",
+         "provider_response_id": "batch-1"},
+        {"provider_id": 8102, "recipient_email": "b@wh.org", "send_status": "sent",
+         "provider_response_id": "batch-1"},
+    ])
+    events = [
+        {"email": "a@wh.org", "event": "delivered", "timestamp": 1700000000,
+         "sg_message_id": "old-msg.filter0001", "sg_event_id": "e1"},
+        {"email": "b@wh.org", "event": "open", "timestamp": 1700000100,
+         "sg_message_id": "batch-1.filter0002", "sg_event_id": "e2"},
+        {"email": "b@wh.org", "event": "delivered", "timestamp": 1700000050,
+         "sg_message_id": "batch-1.filter0002", "sg_event_id": "e3"},
+        {"email": "b@wh.org", "event": "click", "timestamp": 1700000200,
+         "sg_message_id": "batch-1.filter0002", "sg_event_id": "e4",
+         "url": "http://localhost:8000/verify?provider_id=8102"},
+        {"email": "stranger@wh.org", "event": "bounce", "timestamp": 1700000000,
+         "sg_message_id": "unknown.filter", "sg_event_id": "e5"},
+    ]
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://testserver") as client:
+        resp = await client.post("/webhooks/sendgrid", json=events)
+    assert resp.status_code == 200
+    assert resp.json()["status"] == "queued" and resp.json()["received"] == 5
+
+    stats = consume_inbox()
+    assert stats["events"] == 5 and stats["duplicates"] == 0
+    assert stats["updated"] == 2 and stats["inserted"] == 1 and stats["verified"] == 1
+
+    with engine.connect() as conn:
+        rows = conn.execute(text("""
+            SELECT recipient_email, provider_response_id, send_status FROM outreach_logs
+            WHERE recipient_email IN ('a@wh.org', 'b@wh.org', 'stranger@wh.org') ORDER BY id
+        """)).fetchall()
+    # the event for the older message lands on the older row, not the newest one
+    assert [tuple(r) for r in rows] == [
+        ("a@wh.org", "old-msg", "delivered"),
+        ("a@wh.org", "batch-1", "sent"),
+        ("b@wh.org", "email_link_click", "verified"),
+        ("stranger@wh.org", "unknown.filter", "bounce"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_sendgrid_webhook_retries_are_deduplicated():
+    from src.api.app import app
+    from src.db import init_db, engine
+    from src.dbutils import log_outreach_bulk
+    from src.webhook_events import consume_inbox
+
+    init_db()
+    log_outreach_bulk([{"provider_id": 8201, "recipient_email": "c@wh.org", "send_status": "sent",
+                        "provider_response_id": "batch-2"}])
+    first = [
+        {"email": "c@wh.org", "event": "delivered", "timestamp": 1700000000,
+         "sg_message_id": "batch-2.f1", "sg_event_id": "dup-1"},
+        {"email": "c@wh.org", "event": "open", "timestamp": 1700000100,
+         "sg_message_id": "batch-2.f1", "sg_event_id": "dup-2"},
+    ]
+    # SendGrid retried the first POST (same sg_event_ids) and sent one new event
+    retry = first + [{"email": "late@wh.org", "event": "bounce", "timestamp": 1700000300,
+                      "sg_message_id": "x.f9", "sg_event_id": "dup-3"}]
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://testserver") as client:
+        assert (await client.post("/webhooks/sendgrid", json=first)).status_code == 200
+        assert (await client.post("/webhooks/sendgrid", json=retry)).status_code == 200
+        assert (await client.post("/webhooks/sendgrid", json=[{"no": "event"}])).status_code == 400
+
+    stats = consume_inbox()
+    assert stats["batches"] == 2 and stats["events"] == 5 and stats["duplicates"] == 2
+    assert consume_inbox()["batches"] == 0
+    # a later redelivery of an already-applied batch changes nothing
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://testserver") as client:
+        await client.post("/webhooks/sendgrid", json=retry)
+    assert consume_inbox()["applied"] == 0
+
+    with engine.connect() as conn:
+        assert conn.execute(text(
+            "SELECT send_status FROM outreach_logs WHERE recipient_email = 'c@wh.org'")).scalar() == "open"
+        assert conn.execute(text(
+            "SELECT COUNT(*) FROM outreach_logs WHERE recipient_email = 'late@wh.org'")).scalar() == 1
+        assert conn.execute(text(
+            "SELECT COUNT(*) FROM webhook_inbox WHERE state = 'pending'")).scalar() == 0
+
+
+@pytest.mark.asyncio
+async def test_message_state_machine_and_funnel(monkeypatch):
+    from types import SimpleNamespace
+    from src.api.app import app
+    from src.auth import get_current_active_user
+    from src.db import init_db, engine
+    from src.outreach_events import record_sent
+    from src.webhook_events import consume_inbox
+
+    init_db()
+    monkeypatch.setitem(app.dependency_overrides, get_current_active_user,
+                        lambda: SimpleNamespace(username="viewer", role="reviewer"))
+    batch = [{"recipient": "x@funnel.org", "provider_id": 8301},
+             {"recipient": "y@funnel.org", "provider_id": 8302}]
+    record_sent(batch, "m-40", "2023-11-14T22:00:00", campaign_id="camp-40")
+
+    def ev(email, event, ts, eid):
+        return {"email": email, "event": event, "timestamp": ts, "sg_message_id": "m-40.f1",
+                "sg_event_id": eid, "task_id": "camp-40"}
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://testserver") as client:
+        await client.post("/webhooks/sendgrid", json=[
+            ev("x@funnel.org", "delivered", 1700000000, "f1"),
+            ev("x@funnel.org", "click", 1700000200, "f2"),
+            ev("x@funnel.org", "open", 1700000300, "f3"),     # late open can't undo the click
+            ev("y@funnel.org", "bounce", 1700000000, "f4"),
+        ])
+        consume_inbox()
+        resp = await client.get("/outreach/funnel", params={"campaign_id": "camp-40"})
+        assert resp.status_code == 200
+        funnel = resp.json()
+        assert (funnel["messages"], funnel["sent"], funnel["delivered"], funnel["opened"],
+                funnel["clicked"], funnel["bounced"]) == (2, 2, 1, 1, 1, 1)
+        assert funnel["rates"]["delivered"] == 0.5
+
+        # a later batch updates the state incrementally
+        await client.post("/webhooks/sendgrid", json=[ev("x@funnel.org", "spamreport", 1700000400, "f5")])
+        consume_inbox()
+        history = (await client.get("/outreach/messages/m-40/events",
+                                    params={"email": "x@funnel.org"})).json()["events"]
+
+    assert [e["event"] for e in history] == ["sent", "delivered", "click", "open", "spamreport"]
+    with engine.connect() as conn:
+        row = conn.execute(text("""
+            SELECT state, clicked_at IS NOT NULL, complained_at IS NOT NULL, event_count
+            FROM outreach_message_state WHERE message_id = 'm-40' AND recipient_email = 'x@funnel.org'
+        """)).fetchone()
+    assert tuple(row) == ("spamreport", 1, 1, 5)
+
+
+def test_event_time_is_utc_regardless_of_host_timezone(monkeypatch):
+    import time
+    from src.webhook_events import normalize_event
+
+    monkeypatch.setenv("TZ", "America/New_York")
+    time.tzset()
+    try:
+        event = normalize_event({"email": "tz@ex.org", "event": "open", "timestamp": 1700000000})
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+    assert event["event_time"] == "2023-11-14T22:13:20"
+
+
+def test_poison_batch_is_retried_alone_and_good_batches_apply(monkeypatch):
+    from src import webhook_events
+    from src.db import init_db, engine
+    from src.dbutils import log_outreach_bulk
+
+    init_db()
+    log_outreach_bulk([{"provider_id": 8301, "recipient_email": "ok@wh.org", "send_status": "sent",
+                        "provider_response_id": "batch-3"}])
+    real_apply = webhook_events._apply
+
+    def apply(conn, events):
+        if any(e["email"] == "poison@wh.org" for e in events):
+            raise RuntimeError("bad payload")
+        return real_apply(conn, events)
+
+    monkeypatch.setattr(webhook_events, "_apply", apply)
+    monkeypatch.setattr(webhook_events, "MAX_ATTEMPTS", 2)
+    good = webhook_events.enqueue_batch([{"email": "ok@wh.org", "event": "delivered",
+                                          "timestamp": 1700000000, "sg_message_id": "batch-3.f1"}])
+    poison = webhook_events.enqueue_batch([{"email": "poison@wh.org", "event": "open",
+                                            "timestamp": 1700000000, "sg_message_id": "p.f1"}])
+    later = webhook_events.enqueue_batch([{"email": "ok@wh.org", "event": "open",
+                                           "timestamp": 1700000100, "sg_message_id": "batch-3.f1"}])
+
+    def inbox(inbox_id):
+        with engine.connect() as conn:
+            return tuple(conn.execute(text("SELECT state, attempts FROM webhook_inbox WHERE id = :id"),
+                                      {"id": inbox_id}).one())
+
+    stats = webhook_events.consume_inbox()
+    assert stats["retried"] == 1 and stats["failed"] == 0 and stats["applied"] >= 2
+    assert inbox(good) == inbox(later) == ("done", 0)
+    assert inbox(poison) == ("pending", 1)
+    with engine.connect() as conn:
+        assert conn.execute(text(
+            "SELECT send_status FROM outreach_logs WHERE recipient_email = 'ok@wh.org'")).scalar() == "open"
+
+    assert webhook_events.consume_inbox()["batches"] == 0        # still backing off
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE webhook_inbox SET available_at = NULL WHERE id = :id"), {"id": poison})
+    assert webhook_events.consume_inbox()["failed"] == 1
+    assert inbox(poison) == ("failed", 2)